@@ -0,0 +1,164 @@
+import argparse
+import itertools
+import multiprocessing
+import time
+
+import numpy as np
+
+from farm_policy import LUSD_MIN_EMERGENCY_PRICE
+from liquity_helper import MCR, CCR
+
+MIN_PERIOD_BEFORE_EMERGENCY_RECOVER_SECS = 6 * 60 * 60
+
+# Price series columns (one row per evaluation step):
+PRICE_COLUMNS = ('ts', 'eth_price', 'oracle_eth_price', 'lusd_price')
+# System snapshot columns (rows may be sparser than prices, a snapshot holds until the next one):
+SNAPSHOT_COLUMNS = ('ts', 'total_coll', 'total_debt', 'lowest_trove_coll', 'lowest_trove_debt')
+
+
+# Loads columns from ".npz" archive or ".csv" file with a header row
+def load_columns(path, columns):
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            return {name: np.asarray(data[name], dtype=np.float64) for name in columns}
+    data = np.genfromtxt(path, delimiter=",", names=True, dtype=np.float64)
+    return {name: np.atleast_1d(data[name]) for name in columns}
+
+
+def save_columns(path, columns):
+    np.savez_compressed(path, **columns)
+
+
+# Aligns system snapshots to price timestamps (the latest snapshot at or before each price row)
+def align_snapshots(prices, snapshots):
+    order = np.argsort(snapshots['ts'], kind='stable')
+    snapshot_ts = snapshots['ts'][order]
+    assert snapshot_ts[0] <= prices['ts'][0], "no system snapshot before the first price"
+    idx = np.searchsorted(snapshot_ts, prices['ts'], side='right') - 1
+    series = dict(prices)
+    for name in SNAPSHOT_COLUMNS[1:]:
+        series[name] = snapshots[name][order][idx]
+    return series
+
+
+def load_series(prices_path, snapshots_path):
+    prices = load_columns(prices_path, PRICE_COLUMNS)
+    assert np.all(np.diff(prices['ts']) > 0), "price timestamps must be increasing"
+    return align_snapshots(prices, load_columns(snapshots_path, SNAPSHOT_COLUMNS))
+
+
+class PolicyParams:
+    def __init__(self, mcr=MCR, ccr=CCR, lusd_min_emergency_price=LUSD_MIN_EMERGENCY_PRICE,
+                 min_period_before_emergency_recover_secs=MIN_PERIOD_BEFORE_EMERGENCY_RECOVER_SECS):
+        self.mcr = mcr
+        self.ccr = ccr
+        self.lusd_min_emergency_price = lusd_min_emergency_price
+        self.min_period_before_emergency_recover_secs = min_period_before_emergency_recover_secs
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+# Evaluates FarmPolicy emergency rules (see farm_policy.py) at every row of "series":
+# - condition arrays are computed for all rows at once
+# - farm state only changes at withdraw/recover transitions, which are found by searching
+#   the next row where the opposite action is allowed (a loop per transition, not per row)
+def backtest(series, params=None):
+    params = params or PolicyParams()
+    ts = series['ts']
+    # Emergency conditions as of oracle price and new (market) price:
+    trove_ratio = series['lowest_trove_coll'] / series['lowest_trove_debt']
+    system_ratio = series['total_coll'] / series['total_debt']
+    is_liquidatable = trove_ratio * series['oracle_eth_price'] < params.mcr
+    is_emergency_oracle = is_liquidatable | (system_ratio * series['oracle_eth_price'] < params.ccr)
+    is_emergency_new = ((trove_ratio * series['eth_price'] < params.mcr) | (system_ratio * series['eth_price'] < params.ccr)) & \
+        (series['lusd_price'] >= params.lusd_min_emergency_price)
+    # Timestamp of the last emergency condition (policy starts with "now"):
+    last_emergency_condition_ts = np.maximum.accumulate(
+        np.where(is_emergency_oracle | is_emergency_new, ts, -np.inf)
+    )
+    last_emergency_condition_ts = np.maximum(last_emergency_condition_ts, ts[0])
+    # Rows where withdraw (when not in emergency) and recover (when in emergency) would be decided:
+    withdraw_rows = np.flatnonzero(is_emergency_new & ~is_emergency_oracle)
+    recover_rows = np.flatnonzero(ts - last_emergency_condition_ts >= params.min_period_before_emergency_recover_secs)
+    (withdraws, recovers) = ([], [])
+    row = 0
+    while True:
+        i = np.searchsorted(withdraw_rows, row)
+        if i == len(withdraw_rows):
+            break
+        withdraws.append(withdraw_rows[i])
+        j = np.searchsorted(recover_rows, withdraw_rows[i] + 1)
+        if j == len(recover_rows):
+            break
+        recovers.append(recover_rows[j])
+        row = recover_rows[j] + 1
+    # Farm emergency state per row (action takes effect at the row it is decided):
+    transitions = np.zeros(len(ts) + 1, dtype=np.int8)
+    transitions[withdraws] += 1
+    transitions[recovers] -= 1
+    in_emergency = np.cumsum(transitions[:-1]) > 0
+    dt = np.diff(ts, append=ts[-1])
+    # Liquidations: rows where lowest trove becomes liquidatable at oracle price
+    liquidation_rows = is_liquidatable & ~np.concatenate(([False], is_liquidatable[:-1]))
+    return {
+        **params.to_dict(),
+        'steps': len(ts),
+        'emergency_withdraws': len(withdraws),
+        'emergency_recovers': len(recovers),
+        'emergency_time_pct': float(100 * dt[in_emergency].sum() / (ts[-1] - ts[0])) if len(ts) > 1 else 0.0,
+        'liquidations': int(liquidation_rows.sum()),
+        'missed_liquidations': int((liquidation_rows & ~in_emergency).sum()),
+    }
+
+
+# --- Parameter sweep ---
+
+_series = None
+
+
+def _init_worker(series):
+    global _series
+    _series = series
+
+
+def _backtest_worker(params):
+    return backtest(_series, params)
+
+
+# Builds parameter grid from lists of values per PolicyParams argument
+def build_param_grid(**values):
+    names = list(values.keys())
+    return [PolicyParams(**dict(zip(names, combination))) for combination in itertools.product(*values.values())]
+
+
+# Backtests all "params_grid" entries in parallel (series is passed to each worker process once)
+def sweep(series, params_grid, processes=None):
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(series,)) as pool:
+        return pool.map(_backtest_worker, params_grid)
+
+
+def parse_values(text):
+    return [float(value) for value in text.split(",")]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("prices", help="Price series (.csv/.npz) with columns: " + ", ".join(PRICE_COLUMNS))
+    parser.add_argument("snapshots", help="System snapshots (.csv/.npz) with columns: " + ", ".join(SNAPSHOT_COLUMNS))
+    parser.add_argument("--mcr", type=parse_values, default=[MCR])
+    parser.add_argument("--ccr", type=parse_values, default=[CCR])
+    parser.add_argument("--lusd-min-emergency-price", type=parse_values, default=[LUSD_MIN_EMERGENCY_PRICE])
+    parser.add_argument("--recover-delay-secs", type=parse_values, default=[MIN_PERIOD_BEFORE_EMERGENCY_RECOVER_SECS])
+    parser.add_argument("--processes", type=int, default=None, help="Sweep worker processes (default: CPU count)")
+    args = parser.parse_args()
+    start_ts = time.perf_counter()
+    series = load_series(args.prices, args.snapshots)
+    params_grid = build_param_grid(
+        mcr=args.mcr, ccr=args.ccr, lusd_min_emergency_price=args.lusd_min_emergency_price,
+        min_period_before_emergency_recover_secs=args.recover_delay_secs,
+    )
+    results = sweep(series, params_grid, args.processes) if len(params_grid) > 1 else [backtest(series, params_grid[0])]
+    for result in results:
+        print(", ".join(f"{name}={value:.4g}" if isinstance(value, float) else f"{name}={value}" for (name, value) in result.items()))
+    print(f"Backtested {len(params_grid)} parameter sets over {len(series['ts'])} steps in {time.perf_counter() - start_ts:.1f}s")
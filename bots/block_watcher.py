@@ -0,0 +1,65 @@
+import time
+
+from web3.datastructures import AttributeDict
+
+from deadline import DeadlineExceeded, get_timeout
+
+MAX_BLOCKS_PER_POLL = 8
+
+
+class BlockWatcher:
+    def __init__(self, w3, poll_interval=1, log=print):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.log = log
+        self.last_block = None
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    @property
+    def last_block_number(self):
+        return self.last_block.number if self.last_block is not None else None
+
+    # Fetches blocks mined since last poll and notifies listeners, returns list of new blocks
+    def poll(self):
+        block_number = self.w3.eth.block_number
+        last_block_number = self.last_block_number
+        if last_block_number is not None and block_number <= last_block_number:
+            return []
+        from_block_number = block_number if last_block_number is None else \
+            max(last_block_number + 1, block_number - MAX_BLOCKS_PER_POLL + 1)
+        new_blocks = []
+        for number in range(from_block_number, block_number + 1):
+            block = self.w3.eth.get_block(number)
+            self.last_block = block
+            new_blocks.append(block)
+            for listener in self.listeners:
+                try:
+                    listener(block)
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    self.log(f"Block listener failed on block {number}: {e}")
+        return new_blocks
+
+    # Waits until at least one new block is mined, returns list of new blocks (empty on timeout)
+    # (timeout is capped by current deadline)
+    def wait_for_new_blocks(self, timeout):
+        end_ts = time.time() + get_timeout(timeout)
+        while True:
+            new_blocks = self.poll()
+            if new_blocks or time.time() + self.poll_interval > end_ts:
+                return new_blocks
+            time.sleep(self.poll_interval)
+
+    # (listeners are not notified of restored block, next poll continues after it)
+    def to_checkpoint(self):
+        if self.last_block is None:
+            return None
+        return {'number': self.last_block.number, 'hash': self.last_block.hash, 'timestamp': self.last_block.timestamp}
+
+    def restore_checkpoint(self, state):
+        if state is not None:
+            self.last_block = AttributeDict(state)
@@ -0,0 +1,109 @@
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_MAX_AGE_SECS = 24 * 60 * 60
+LOG_BACKUP_COUNT = 10
+LOG_FLUSH_INTERVAL_SECS = 1
+LOG_BATCH_SIZE = 256
+LOG_MAX_QUEUE_SIZE = 100000
+
+
+class BotLogger:
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, max_age_secs=LOG_MAX_AGE_SECS, backup_count=LOG_BACKUP_COUNT,
+                 flush_interval=LOG_FLUSH_INTERVAL_SECS, batch_size=LOG_BATCH_SIZE, max_queue_size=LOG_MAX_QUEUE_SIZE, echo=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_secs = max_age_secs
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.echo = echo
+        self.context = {'block': None, 'iteration': None, 'farm': None}
+        self.dropped_records = 0
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.file = None
+        self.file_opened_ts = None
+        self.thread = threading.Thread(target=self._run, name="BotLogger", daemon=True)
+        self.thread.start()
+
+    # Context (e.g. block number, iteration id and farm in multi-farm mode) is attached to every following record
+    def set_context(self, **context):
+        self.context = {**self.context, **context}
+
+    # Never blocks: record is only enqueued (formatting and I/O happen on writer thread), dropped if queue is full
+    def log(self, *args, **fields):
+        try:
+            self.queue.put_nowait((time.time(), args, fields, self.context))
+        except queue.Full:
+            self.dropped_records += 1
+
+    def close(self, timeout=5):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    # --- Writer thread ---
+
+    def _run(self):
+        is_closed = False
+        while not is_closed:
+            records = []
+            try:
+                records.append(self.queue.get(timeout=self.flush_interval))
+                while len(records) < self.batch_size:
+                    records.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in records:
+                records = records[:records.index(None)]
+                is_closed = True
+            if records:
+                try:
+                    self._write_records(records)
+                except Exception as e:
+                    print(f"Failed to write {len(records)} log records: {e}", file=sys.stderr)
+        if self.file is not None:
+            self.file.close()
+
+    def _write_records(self, records):
+        self._rotate_if_needed()
+        if self.dropped_records:
+            (dropped_records, self.dropped_records) = (self.dropped_records, 0)
+            records = [(time.time(), (f"Dropped {dropped_records} log records",), {}, self.context)] + records
+        lines = []
+        for (ts, args, fields, context) in records:
+            message = ' '.join(str(arg) for arg in args)
+            if fields:
+                message += (' | ' if message else '') + ', '.join(f"{k}={v}" for (k, v) in fields.items())
+            record = {
+                'ts': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)),
+                'block': context['block'],
+                'iteration': context['iteration'],
+                'msg': message,
+            }
+            if context['farm'] is not None:
+                record['farm'] = context['farm']
+            record |= {k: v for (k, v) in fields.items() if k not in record}
+            lines.append(json.dumps(record, default=str))
+            if self.echo:
+                print(time.strftime('[%Y-%m-%d %H:%M:%S] ', time.localtime(ts)) + message)
+        self.file.write('\n'.join(lines) + '\n')
+        self.file.flush()
+
+    def _rotate_if_needed(self):
+        if self.file is not None:
+            is_too_big = self.file.tell() >= self.max_bytes
+            is_too_old = time.time() - self.file_opened_ts >= self.max_age_secs
+            if not is_too_big and not is_too_old:
+                return
+            self.file.close()
+            for i in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        self.file = open(self.path, 'a')
+        self.file_opened_ts = time.time()
@@ -0,0 +1,332 @@
+import argparse
+import bisect
+import math
+import time
+
+import numpy as np
+
+from datetime import timedelta
+
+from cadence import MonitoringCadence
+from farm_policy import FarmPolicy, ACTION_EMERGENCY_RECOVER, ACTION_EMERGENCY_WITHDRAW, ACTION_START_NEW_EPOCH, LUSD_MIN_EMERGENCY_PRICE
+from liquity_helper import MCR, CCR
+
+# (Python farm simulator is imported from "scripts/simulation" directory, which callers put on path)
+from gamma_farm_py import GammaFarmPythonSimulator, E18
+from structs import Event, EventType, EpochData
+
+DAY_SECS = 24 * 60 * 60
+YEAR_SECS = 365 * DAY_SECS
+
+MARKET_STEP_SECS = 60  # market resolution (bot polling "every block" is polling every market step)
+ORACLE_DEVIATION_THRESHOLD = 0.01
+ORACLE_UPDATE_LAG_SECS = 10 * 60
+ORACLE_HEARTBEAT_SECS = 60 * 60
+LUSD_PEG_REVERSION_SECS = 30 * 60
+LUSD_STRESS_PREMIUM = 0.4  # LUSD premium per relative ETH drawdown from its 24h average
+LUSD_MAX_PRICE = 1.1  # LUSD can be minted at MCR, so its price is capped
+STABILITY_POOL_LUSD = 200_000_000  # total LUSD in Liquity Stability Pool (farm deposit earns its share of liquidations)
+NOISE_CHUNK_SIZE = 100_000
+
+
+class SimClock:
+    def __init__(self, ts=0):
+        self.ts = ts
+
+    # (clock is used as "now_time()" and cadence clock)
+    def __call__(self):
+        return self.ts
+
+
+# Synthetic ETH/LUSD market and Liquity troves:
+# - ETH price follows GBM with occasional crashes (gradual drops over "crash_duration_secs")
+# - oracle price follows ETH price with a lag after deviating by ORACLE_DEVIATION_THRESHOLD (or on heartbeat)
+# - LUSD price is pushed above peg by ETH drawdowns and reverts to peg
+# - troves with ICR < MCR at oracle price are liquidated and replaced by new troves at healthy ICRs
+class SyntheticMarket:
+    def __init__(self, seed=0, eth_price=2000.0, volatility=0.8, crashes_per_year=6, crash_size=(0.1, 0.35),
+                 crash_duration_secs=3 * 60 * 60, num_troves=300, step_secs=MARKET_STEP_SECS):
+        self.rng = np.random.default_rng(seed)
+        self.step_secs = step_secs
+        self.ts = 0
+        self.eth_price = eth_price
+        self.eth_price_avg = eth_price
+        self.oracle_price = eth_price
+        self.oracle_ts = 0
+        self.oracle_update_due_ts = None
+        self.lusd_price = 1.0
+        self.step_volatility = volatility * math.sqrt(step_secs / YEAR_SECS)
+        self.crash_probability = crashes_per_year * step_secs / YEAR_SECS
+        self.crash_size = crash_size
+        self.crash_steps = max(1, crash_duration_secs // step_secs)
+        self.crash_factor = 1.0  # per step price factor of ongoing crash
+        self.crash_steps_left = 0
+        # Drift compensates expected crash losses (so that price has no long term trend):
+        mean_crash_loss = -math.log(1 - sum(crash_size) / 2)
+        self.step_drift = self.crash_probability * mean_crash_loss - self.step_volatility ** 2 / 2
+        self.noise = iter(())
+        # Troves: sorted list of (undercoll_price, coll, debt), the last one has the lowest ICR
+        (self.troves, self.total_coll, self.total_debt) = ([], 0.0, 0.0)
+        for _ in range(num_troves):
+            self._open_trove()
+        self.liquidations = []  # (ts, coll, debt)
+
+    def _next_noise(self):
+        try:
+            return next(self.noise)
+        except StopIteration:
+            chunk = np.column_stack([self.rng.standard_normal(NOISE_CHUNK_SIZE), self.rng.random((NOISE_CHUNK_SIZE, 2))])
+            self.noise = iter(chunk.tolist())
+            return next(self.noise)
+
+    def _open_trove(self):
+        icr = self.rng.uniform(1.2, 3.5)
+        debt = float(self.rng.lognormal(math.log(100_000), 1.0))
+        coll = icr * debt / self.oracle_price
+        bisect.insort(self.troves, (MCR * debt / coll, coll, debt))
+        self.total_coll += coll
+        self.total_debt += debt
+
+    def step(self):
+        (z, u_crash, u_crash_size) = self._next_noise()
+        self.ts += self.step_secs
+        # ETH price:
+        if self.crash_steps_left == 0 and u_crash < self.crash_probability:
+            size = self.crash_size[0] + (self.crash_size[1] - self.crash_size[0]) * u_crash_size
+            (self.crash_factor, self.crash_steps_left) = ((1 - size) ** (1 / self.crash_steps), self.crash_steps)
+        self.eth_price *= math.exp(self.step_drift + self.step_volatility * z)
+        if self.crash_steps_left > 0:
+            self.eth_price *= self.crash_factor
+            self.crash_steps_left -= 1
+        self.eth_price_avg += (self.eth_price - self.eth_price_avg) * self.step_secs / DAY_SECS
+        # Oracle price:
+        if self.oracle_update_due_ts is None and abs(self.eth_price / self.oracle_price - 1) > ORACLE_DEVIATION_THRESHOLD:
+            self.oracle_update_due_ts = self.ts + ORACLE_UPDATE_LAG_SECS
+        if (self.oracle_update_due_ts is not None and self.ts >= self.oracle_update_due_ts) or \
+                self.ts - self.oracle_ts >= ORACLE_HEARTBEAT_SECS:
+            (self.oracle_price, self.oracle_ts, self.oracle_update_due_ts) = (self.eth_price, self.ts, None)
+        # LUSD price:
+        drawdown = max(0.0, 1 - self.eth_price / self.eth_price_avg)
+        lusd_target = min(1.0 + LUSD_STRESS_PREMIUM * drawdown, LUSD_MAX_PRICE)
+        self.lusd_price += (lusd_target - self.lusd_price) * min(1.0, self.step_secs / LUSD_PEG_REVERSION_SECS)
+        # Liquidations (at oracle price):
+        liquidations = []
+        while self.troves and self.troves[-1][0] > self.oracle_price:
+            (_, coll, debt) = self.troves.pop()
+            (self.total_coll, self.total_debt) = (self.total_coll - coll, self.total_debt - debt)
+            liquidations.append((self.ts, coll, debt))
+        for _ in liquidations:
+            self._open_trove()
+        self.liquidations += liquidations
+        return liquidations
+
+    def get_lowest_trove_amounts(self):
+        (_, coll, debt) = self.troves[-1]
+        return (coll, debt)
+
+    # Whether emergency condition holds at true ETH price (regardless of what oracle reports)
+    def is_emergency(self):
+        (coll, debt) = self.get_lowest_trove_amounts()
+        lowest_ICR = coll * self.eth_price / debt
+        TCR = self.total_coll * self.eth_price / self.total_debt
+        return (lowest_ICR < MCR or TCR < CCR) and self.lusd_price >= LUSD_MIN_EMERGENCY_PRICE
+
+
+# --- Stand-ins for bot helpers ---
+
+class SimulatedLiquityHelper:
+    def __init__(self, market):
+        self.market = market
+
+    def calculate_emergency_signals(self, eth_price):
+        market = self.market
+        oracle_last_eth_price = market.oracle_price
+        (trove_eth_coll, trove_lusd_debt) = market.get_lowest_trove_amounts()
+        undercoll_eth_price = MCR * trove_lusd_debt / trove_eth_coll
+        last_lowest_ICR = trove_eth_coll * oracle_last_eth_price / trove_lusd_debt
+        last_TCR = market.total_coll * oracle_last_eth_price / market.total_debt
+        lowest_ICR = trove_eth_coll * eth_price / trove_lusd_debt
+        TCR = market.total_coll * eth_price / market.total_debt
+        return (undercoll_eth_price, oracle_last_eth_price, last_lowest_ICR, last_TCR, lowest_ICR, TCR)
+
+
+class SimulatedPriceProvider:
+    def __init__(self, market):
+        self.market = market
+        self.lusd_price_ts = None
+        self.eth_price_ts = None
+
+    def get_eth_price(self):
+        self.eth_price_ts = self.market.ts
+        return self.market.eth_price
+
+    def get_lusd_price(self, max_age_secs=0):
+        self.lusd_price_ts = self.market.ts
+        return self.market.lusd_price
+
+
+class SimulatedCall:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def call(self):
+        return self.fn()
+
+
+class SimulatedFarmFunctions:
+    def __init__(self, sim):
+        self.sim = sim
+
+    def isEmergencyState(self):
+        return SimulatedCall(lambda: self.sim.isEmergencyState)
+
+    def epochStartTime(self):
+        return SimulatedCall(lambda: self.sim.epochStartTime)
+
+    def getTotalBalances(self):
+        return SimulatedCall(self.sim.getTotalBalances)
+
+
+# Stand-in for GammaFarm contract backed by GammaFarmPythonSimulator:
+# farm's Stability Pool deposit absorbs its share of liquidated debt and gains its share of liquidated collateral,
+# which is sold for LUSD at the next epoch start (or emergency withdraw)
+class SimulatedGammaFarm:
+    def __init__(self, clock, market, num_users=10, user_deposit=100_000):
+        self.clock = clock
+        self.market = market
+        mal_to_distribute = 6000 * E18
+        mal_distribution_period_secs = 4 * YEAR_SECS
+        self.sim = GammaFarmPythonSimulator(
+            mal_to_distribute, mal_distribution_period_secs, mal_to_distribute // mal_distribution_period_secs, E18,
+        )
+        self.functions = SimulatedFarmFunctions(self.sim)
+        (self.pending_lusd_loss, self.pending_eth_gain) = (0, 0.0)
+        for user in range(num_users):
+            self.sim.simulate_event(Event(clock(), EventType.DEPOSIT, amount=user_deposit * E18, user=user))
+
+    def on_liquidations(self, liquidations):
+        if self.sim.isEmergencyState:
+            return
+        share = self.sim.lusdStabilityPool.getCompoundedLUSDDeposit() / E18 / STABILITY_POOL_LUSD
+        for (_, coll, debt) in liquidations:
+            self.pending_lusd_loss += int(debt * share * E18)
+            self.pending_eth_gain += coll * share
+
+    def _build_epoch_data(self):
+        staked = self.sim.lusdStabilityPool.getCompoundedLUSDDeposit()
+        loss = min(self.pending_lusd_loss, staked)
+        reward = int(self.pending_eth_gain * self.market.eth_price * E18)
+        (self.pending_lusd_loss, self.pending_eth_gain) = (0, 0.0)
+        return EpochData(reward=reward, loss=loss)
+
+    def start_new_epoch(self):
+        self.sim.simulate_event(Event(self.clock(), EventType.NEW_EPOCH, data=self._build_epoch_data()))
+
+    def emergency_withdraw(self):
+        self.sim.simulate_event(Event(self.clock(), EventType.EMERGENCY_WITHDRAW, data=self._build_epoch_data()))
+
+    def emergency_recover(self):
+        self.sim.simulate_event(Event(self.clock(), EventType.EMERGENCY_RECOVER))
+
+
+def _no_log(*args, **fields):
+    pass
+
+
+# Runs bot policy (FarmPolicy with MonitoringCadence) against synthetic market and simulated farm in accelerated time
+# ("market" replaces synthetic market built from "seed" and "market_kwargs", e.g. with a scripted one)
+class BotSimulation:
+    def __init__(self, seed=0, min_epoch_duration=timedelta(days=2), min_period_before_emergency_recover=timedelta(hours=6),
+                 max_loop_interval=timedelta(minutes=5), market=None, **market_kwargs):
+        self.clock = SimClock()
+        self.market = market or SyntheticMarket(seed, **market_kwargs)
+        self.farm = SimulatedGammaFarm(self.clock, self.market)
+        self.cadence = MonitoringCadence(
+            min_interval_secs=self.market.step_secs, max_interval_secs=max_loop_interval.total_seconds(), clock=self.clock,
+        )
+        self.policy = FarmPolicy(
+            self.farm, SimulatedLiquityHelper(self.market), SimulatedPriceProvider(self.market), self.cadence, self.clock,
+            min_epoch_duration, min_period_before_emergency_recover, log=_no_log,
+        )
+        self.iterations = 0
+        self.actions = []  # (ts, action)
+        self.emergency_episodes = []  # (onset_ts, reaction_ts or None)
+        self.emergency_onset_ts = None
+        self.emergency_secs = 0
+
+    def run_iteration(self):
+        self.iterations += 1
+        action = self.policy.decide_action()
+        if action == ACTION_EMERGENCY_WITHDRAW:
+            self.farm.emergency_withdraw()
+        elif action == ACTION_EMERGENCY_RECOVER:
+            self.farm.emergency_recover()
+        elif action == ACTION_START_NEW_EPOCH:
+            self.farm.start_new_epoch()
+        if action is not None:
+            self.actions.append((self.clock(), action))
+        return action
+
+    def run(self, duration_secs):
+        end_ts = self.market.ts + duration_secs
+        next_iteration_ts = self.market.ts
+        while self.market.ts < end_ts:
+            self.farm.on_liquidations(self.market.step())
+            self.clock.ts = self.market.ts
+            is_farm_emergency = self.farm.sim.isEmergencyState
+            if is_farm_emergency:
+                self.emergency_secs += self.market.step_secs
+            self._track_emergency_episode(is_farm_emergency)
+            if self.clock.ts >= next_iteration_ts:
+                if self.run_iteration() == ACTION_EMERGENCY_WITHDRAW and self.emergency_onset_ts is not None:
+                    self.emergency_episodes.append((self.emergency_onset_ts, self.clock.ts))
+                    self.emergency_onset_ts = None
+                next_iteration_ts = self.clock.ts + self.cadence.get_next_interval_secs()
+        return self.get_stats(duration_secs)
+
+    # Emergency episode: period of emergency condition (at true price) while farm is not in emergency state
+    def _track_emergency_episode(self, is_farm_emergency):
+        is_market_emergency = not is_farm_emergency and self.market.is_emergency()
+        if is_market_emergency and self.emergency_onset_ts is None:
+            self.emergency_onset_ts = self.clock.ts
+        elif not is_market_emergency and self.emergency_onset_ts is not None:
+            if not is_farm_emergency:
+                self.emergency_episodes.append((self.emergency_onset_ts, None))
+            self.emergency_onset_ts = None
+
+    def get_stats(self, duration_secs):
+        epoch_starts = [ts for (ts, action) in self.actions if action in (ACTION_START_NEW_EPOCH, ACTION_EMERGENCY_WITHDRAW)]
+        epoch_durations = np.diff([0] + epoch_starts) / DAY_SECS
+        reaction_secs = [reaction_ts - onset_ts for (onset_ts, reaction_ts) in self.emergency_episodes if reaction_ts is not None]
+        count = lambda action: sum(1 for (_, a) in self.actions if a == action)
+        return {
+            'years': duration_secs / YEAR_SECS,
+            'iterations': self.iterations,
+            'epochs': self.farm.sim.epoch,
+            'epoch_duration_days_mean': float(np.mean(epoch_durations)) if len(epoch_durations) else None,
+            'epoch_duration_days_p50': float(np.median(epoch_durations)) if len(epoch_durations) else None,
+            'epoch_duration_days_max': float(np.max(epoch_durations)) if len(epoch_durations) else None,
+            'emergency_withdraws': count(ACTION_EMERGENCY_WITHDRAW),
+            'emergency_recovers': count(ACTION_EMERGENCY_RECOVER),
+            'emergency_time_pct': 100 * self.emergency_secs / duration_secs,
+            'emergency_episodes': len(self.emergency_episodes),
+            'emergency_episodes_missed': sum(1 for (_, reaction_ts) in self.emergency_episodes if reaction_ts is None),
+            'emergency_reaction_secs_mean': float(np.mean(reaction_secs)) if reaction_secs else None,
+            'emergency_reaction_secs_max': float(np.max(reaction_secs)) if reaction_secs else None,
+            'liquidations': len(self.market.liquidations),
+        }
+
+
+# Run from "bots" directory: `PYTHONPATH=../scripts/simulation python bot_simulation.py`
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=float, default=1, help="Simulated period")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of synthetic market")
+    parser.add_argument("--crashes-per-year", type=float, default=6, help="Expected number of ETH crashes per year")
+    args = parser.parse_args()
+    start_ts = time.perf_counter()
+    simulation = BotSimulation(seed=args.seed, crashes_per_year=args.crashes_per_year)
+    stats = simulation.run(int(args.years * YEAR_SECS))
+    for (name, value) in stats.items():
+        print(f"{name}: {value:.3f}" if isinstance(value, float) else f"{name}: {value}")
+    print(f"Simulated {args.years} years in {time.perf_counter() - start_ts:.1f}s")
@@ -0,0 +1,91 @@
+import math
+import time
+
+from collections import deque
+
+BLOCK_TIME_SECS = 12
+PRICE_HISTORY_WINDOW_SECS = 60 * 60
+CLOSE_TO_EMERGENCY_DISTANCE = 0.02  # relative ETH price drop below which system is polled every block
+SAFETY_SIGMAS = 4  # how many standard deviations of ETH price move must fit into distance to emergency between polls
+MIN_VOLATILITY = 0.5 / math.sqrt(365 * 24 * 60 * 60)  # floor of ETH volatility (per sqrt second, ~50% annualized)
+
+
+# Decides how often emergency condition should be evaluated, given how far (in relative ETH price drop)
+# the system is from the emergency boundary and how volatile ETH price recently was
+class MonitoringCadence:
+    def __init__(self, min_interval_secs=BLOCK_TIME_SECS, max_interval_secs=300, clock=time.time):
+        self.clock = clock
+        self.min_interval_secs = min_interval_secs
+        self.max_interval_secs = max_interval_secs
+        self.eth_prices = deque()  # (ts, eth_price)
+        self.distance_to_emergency = None
+        self.farm_emergency_states = {}  # farm -> whether it is in emergency state (see on_farm_emergency_state)
+
+    def on_eth_price(self, eth_price, ts=None):
+        ts = self.clock() if ts is None else ts
+        if self.eth_prices and ts <= self.eth_prices[-1][0]:
+            return
+        self.eth_prices.append((ts, eth_price))
+        while ts - self.eth_prices[0][0] > PRICE_HISTORY_WINDOW_SECS:
+            self.eth_prices.popleft()
+
+    # Updates distance to emergency from signals calculated for current "eth_price":
+    # - ICR of the lowest trove falls below MCR when ETH price drops below "undercoll_eth_price"
+    # - TCR is proportional to ETH price, so it falls below CCR when ETH price drops by (1 - CCR / TCR)
+    def update_signals(self, eth_price, undercoll_eth_price, TCR, CCR, ts=None):
+        self.on_eth_price(eth_price, ts)
+        liquidation_distance = 1 - undercoll_eth_price / eth_price
+        recovery_mode_distance = 1 - CCR / TCR
+        self.distance_to_emergency = min(liquidation_distance, recovery_mode_distance)
+
+    # Records emergency state of "farm" (several farms may share cadence, see gamma_farm_bot.py)
+    def on_farm_emergency_state(self, farm, is_emergency_state):
+        self.farm_emergency_states[farm] = is_emergency_state
+
+    # Whether system is past the emergency boundary and every farm has already withdrawn: there is nothing to react to
+    # in the next block (recover waits for "min_period_before_emergency_recover" anyway), so it is polled as if calm
+    def is_emergency_ongoing(self):
+        if self.distance_to_emergency is None or self.distance_to_emergency > 0:
+            return False
+        return bool(self.farm_emergency_states) and all(self.farm_emergency_states.values())
+
+    # Returns standard deviation of ETH price log returns per sqrt second
+    def get_volatility(self):
+        (variance_sum, dt_sum) = (0, 0)
+        for ((ts0, price0), (ts1, price1)) in zip(self.eth_prices, list(self.eth_prices)[1:]):
+            variance_sum += math.log(price1 / price0) ** 2
+            dt_sum += ts1 - ts0
+        if dt_sum == 0:
+            return MIN_VOLATILITY
+        return max(math.sqrt(variance_sum / dt_sum), MIN_VOLATILITY)
+
+    def is_close_to_emergency(self):
+        if self.distance_to_emergency is None or self.is_emergency_ongoing():
+            return False
+        if self.distance_to_emergency <= CLOSE_TO_EMERGENCY_DISTANCE:
+            return True
+        return self.distance_to_emergency <= SAFETY_SIGMAS * self.get_volatility() * math.sqrt(self.min_interval_secs)
+
+    # Longest interval in which ETH price is unlikely (SAFETY_SIGMAS) to move by distance to emergency
+    def get_next_interval_secs(self):
+        if self.distance_to_emergency is None:
+            return self.min_interval_secs
+        if self.is_emergency_ongoing():
+            return self.max_interval_secs
+        if self.is_close_to_emergency():
+            return self.min_interval_secs
+        interval_secs = (self.distance_to_emergency / (SAFETY_SIGMAS * self.get_volatility())) ** 2
+        return min(max(interval_secs, self.min_interval_secs), self.max_interval_secs)
+
+    # Returns how old cached values (e.g. LUSD price) may be: "calm_max_age_secs" or 0 (bypass) when close to emergency
+    def get_cache_max_age_secs(self, calm_max_age_secs):
+        if self.distance_to_emergency is None or self.is_close_to_emergency():
+            return 0
+        return calm_max_age_secs
+
+    def to_checkpoint(self):
+        return {'eth_prices': list(self.eth_prices), 'distance_to_emergency': self.distance_to_emergency}
+
+    def restore_checkpoint(self, state):
+        self.eth_prices = deque((ts, eth_price) for (ts, eth_price) in state['eth_prices'])
+        self.distance_to_emergency = state['distance_to_emergency']
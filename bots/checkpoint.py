@@ -0,0 +1,81 @@
+import json
+import os
+import time
+
+from web3._utils.encoding import Web3JsonEncoder
+
+CHECKPOINT_VERSION = 1
+
+
+# Writes checkpoint atomically (readers see either the previous or the new checkpoint, never a partial one)
+def save_checkpoint(path, identity, components):
+    data = {'version': CHECKPOINT_VERSION, 'saved_ts': time.time(), 'identity': identity, 'components': components}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, cls=Web3JsonEncoder, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# Returns checkpointed component states, or None if checkpoint is missing, unreadable, of other version,
+# written for other identity (chain/farm/owner) or older than "max_age_secs"
+def load_checkpoint(path, identity, max_age_secs, log=print):
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log(f"Failed to read checkpoint {path}: {e}")
+        return None
+    if data.get('version') != CHECKPOINT_VERSION:
+        log(f"Ignoring checkpoint of version {data.get('version')} (expected {CHECKPOINT_VERSION})")
+        return None
+    if data.get('identity') != identity:
+        log(f"Ignoring checkpoint written for {data.get('identity')}")
+        return None
+    age_secs = time.time() - data['saved_ts']
+    if not 0 <= age_secs <= max_age_secs:
+        log(f"Ignoring checkpoint saved {age_secs:.0f}s ago")
+        return None
+    return data['components']
+
+
+# Periodically checkpoints "components" (name -> object with to_checkpoint() and restore_checkpoint(state))
+class Checkpointer:
+    def __init__(self, path, identity, components, interval_secs, max_age_secs, log=print):
+        self.path = path
+        self.identity = identity
+        self.components = components
+        self.interval_secs = interval_secs
+        self.max_age_secs = max_age_secs
+        self.log = log
+        self.last_save_ts = None
+
+    def save(self, force=False):
+        now_ts = time.monotonic()
+        if not force and self.last_save_ts is not None and now_ts - self.last_save_ts < self.interval_secs:
+            return False
+        states = {name: component.to_checkpoint() for (name, component) in self.components.items()}
+        save_checkpoint(self.path, self.identity, states)
+        self.last_save_ts = now_ts
+        return True
+
+    # Restores components found in checkpoint (a component failing validation is left as is),
+    # "get_stale(states)" may return names of components which should not be restored, returns names of restored components
+    def restore(self, get_stale=None):
+        states = load_checkpoint(self.path, self.identity, self.max_age_secs, log=self.log)
+        if states is None:
+            return []
+        skip = get_stale(states) if get_stale is not None else ()
+        restored = []
+        for (name, component) in self.components.items():
+            if name not in states or name in skip:
+                continue
+            try:
+                component.restore_checkpoint(states[name])
+                restored.append(name)
+            except Exception as e:
+                self.log(f"Failed to restore {name} from checkpoint: {e}")
+        return restored
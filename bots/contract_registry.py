@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import weakref
+
+from collections import namedtuple
+from eth_utils import function_abi_to_4byte_selector
+from web3 import Web3
+from web3._utils.abi import get_abi_input_types, get_abi_output_types
+
+BOTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ABI_DIR = os.path.join(BOTS_DIR, "abi")
+COMPILED_ABI_CACHE_PATH = os.path.join(ABI_DIR, "__pycache__", "compiled_abis.json")
+COMPILED_ABI_CACHE_VERSION = 2
+
+# Precomputed ABI function: 4-byte selector, input and output types (as accepted by eth_abi)
+CompiledFunction = namedtuple('CompiledFunction', ['name', 'selector', 'input_types', 'output_types'])
+
+
+# Resolves ABI name (e.g. "TroveManager" for abi/TroveManager.json) or ".json" path (relative to bots directory)
+def get_abi_path(abi_name):
+    if abi_name.endswith(".json"):
+        return os.path.normpath(os.path.join(BOTS_DIR, abi_name))
+    return os.path.join(ABI_DIR, f"{abi_name}.json")
+
+
+def _get_file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+# Returns {function name -> [[name, selector hex, input types, output types]]} (as stored in JSON cache)
+def compile_functions(abi):
+    functions = {}
+    for fn_abi in abi:
+        if fn_abi.get('type') != 'function':
+            continue
+        compiled = [
+            fn_abi['name'], function_abi_to_4byte_selector(fn_abi).hex(),
+            list(get_abi_input_types(fn_abi)), list(get_abi_output_types(fn_abi)),
+        ]
+        functions.setdefault(fn_abi['name'], []).append(compiled)
+    return functions
+
+
+def _to_compiled_function(compiled):
+    (name, selector, input_types, output_types) = compiled
+    return CompiledFunction(name, bytes.fromhex(selector), tuple(input_types), tuple(output_types))
+
+
+# ABIs are parsed on first use (each file once per process), compiled functions are kept in an on-disk JSON cache
+# (invalidated by ABI file modification time and size)
+class AbiStore:
+    def __init__(self, cache_path=COMPILED_ABI_CACHE_PATH):
+        self.cache_path = cache_path
+        self.lock = threading.RLock()
+        self.abis = {}       # path -> ABI
+        self.compiled = None  # path -> [file stamp, {function name -> [compiled function]}] (see compile_functions)
+
+    def get_abi(self, abi_name):
+        path = get_abi_path(abi_name)
+        with self.lock:
+            abi = self.abis.get(path)
+            if abi is None:
+                with open(path, "r") as f:
+                    abi = self.abis[path] = json.load(f)
+            return abi
+
+    # Returns {function name -> [CompiledFunction]} (overloads share the name)
+    def get_functions(self, abi_name):
+        path = get_abi_path(abi_name)
+        with self.lock:
+            if self.compiled is None:
+                self.compiled = self._load_cache()
+            stamp = _get_file_stamp(path)
+            entry = self.compiled.get(path)
+            if entry is None or entry[0] != stamp:
+                entry = self.compiled[path] = [stamp, compile_functions(self.get_abi(abi_name))]
+                self._save_cache()
+            return {name: [_to_compiled_function(fn) for fn in fns] for (name, fns) in entry[1].items()}
+
+    # Returns compiled function "fn_name" (with "num_args" inputs if function is overloaded)
+    def get_function(self, abi_name, fn_name, num_args=None):
+        candidates = [fn for fn in self.get_functions(abi_name).get(fn_name, [])
+                      if num_args is None or len(fn.input_types) == num_args]
+        if len(candidates) != 1:
+            raise ValueError(f"{abi_name} has {len(candidates)} functions matching {fn_name}")
+        return candidates[0]
+
+    # (cache is plain data, so a tampered cache file can at worst yield wrong selectors, never run code)
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+            if not isinstance(cache, dict) or cache.get('version') != COMPILED_ABI_CACHE_VERSION:
+                return {}
+            return cache['compiled']
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    # (cache is best effort: read-only checkouts just compile on each start)
+    def _save_cache(self):
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': COMPILED_ABI_CACHE_VERSION, 'compiled': self.compiled}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+
+
+abi_store = AbiStore()
+
+
+# Contract handle which builds web3 contract on first attribute access
+class LazyContract:
+    def __init__(self, w3, abi_name, address):
+        self.w3 = w3
+        self.abi_name = abi_name
+        self.address = address
+        self.lock = threading.Lock()
+        self.contract = None
+
+    def get(self):
+        if self.contract is None:
+            with self.lock:
+                if self.contract is None:
+                    self.contract = self.w3.eth.contract(address=self.address, abi=abi_store.get_abi(self.abi_name))
+        return self.contract
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+# Hands out one contract handle per (kind, ABI, address) for a web3 instance
+class ContractRegistry:
+    def __init__(self, w3):
+        self.w3 = w3
+        self.lock = threading.Lock()
+        self.contracts = {}
+
+    # ("factory(w3, abi_name, address)" builds other kinds of handles, e.g. fast_call.FastContract)
+    def get_contract(self, abi_name, address, factory=LazyContract):
+        address = Web3.toChecksumAddress(address)
+        key = (factory, abi_name, address)
+        with self.lock:
+            contract = self.contracts.get(key)
+            if contract is None:
+                contract = self.contracts[key] = factory(self.w3, abi_name, address)
+            return contract
+
+
+_registries = weakref.WeakKeyDictionary()
+_registries_lock = threading.Lock()
+
+
+def get_contract_registry(w3):
+    with _registries_lock:
+        registry = _registries.get(w3)
+        if registry is None:
+            registry = _registries[w3] = ContractRegistry(w3)
+        return registry
+
+
+def get_contract(w3, abi_name, address):
+    return get_contract_registry(w3).get_contract(abi_name, address)
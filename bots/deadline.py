@@ -0,0 +1,68 @@
+import contextvars
+import time
+
+from contextlib import contextmanager
+from web3 import Web3
+
+# Deadline of the current unit of work (e.g. run iteration), None if unbounded
+_current_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, budget_secs):
+        self.budget_secs = budget_secs
+        self.expires_at = time.monotonic() + budget_secs
+
+    def get_remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def check(self):
+        if self.get_remaining() <= 0:
+            raise DeadlineExceeded(f"Budget of {self.budget_secs}s exceeded")
+
+    # Returns timeout for a blocking call which must not outlive deadline
+    def get_timeout(self, max_timeout_secs):
+        self.check()
+        return min(max_timeout_secs, self.get_remaining())
+
+
+# Makes "deadline" current for the block (None shields the block from outer deadline)
+@contextmanager
+def deadline_scope(deadline):
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def get_deadline():
+    return _current_deadline.get()
+
+
+# Raises DeadlineExceeded if current deadline has passed (cooperative cancellation point)
+def check_deadline():
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check()
+
+
+# Returns "max_timeout_secs" capped by time remaining until current deadline
+def get_timeout(max_timeout_secs):
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return max_timeout_secs
+    return deadline.get_timeout(max_timeout_secs)
+
+
+# HTTP provider deriving each request timeout from current deadline
+class DeadlineHTTPProvider(Web3.HTTPProvider):
+    def get_request_kwargs(self):
+        request_kwargs = dict(super().get_request_kwargs())
+        if 'timeout' in request_kwargs:
+            request_kwargs['timeout'] = get_timeout(request_kwargs['timeout'])
+        return request_kwargs
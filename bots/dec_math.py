@@ -0,0 +1,78 @@
+# 18-digit decimal fixed-point math with the exact rounding of GammaLib (and LiquityMath), shared by bots,
+# scripts and simulators (pure Python, no dependencies): bots import it as "dec_math", scripts as "bots.dec_math"
+
+E18 = 10 ** 18
+DECIMAL_PRECISION = E18
+DEC_POW_CACHE_MAX_RESULTS = 4096
+
+
+# Returns x * y for 18-digit decimals "x" and "y" (rounded half up, as GammaLib._decMul)
+def dec_mul(x, y):
+    return (x * y + DECIMAL_PRECISION // 2) // DECIMAL_PRECISION
+
+
+# Returns a^n for 18-digit decimal base "a" and integer "n" (same operations as GammaLib.decPow, so bit-exact)
+def dec_pow(a, n):
+    if n == 0:
+        return DECIMAL_PRECISION
+    y = DECIMAL_PRECISION
+    x = a
+    while n > 1:
+        if n % 2 == 0:
+            x = dec_mul(x, x)
+            n = n // 2
+        else:
+            y = dec_mul(x, y)
+            x = dec_mul(x, x)
+            n = (n - 1) // 2
+    return dec_mul(x, y)
+
+
+# Powers of a fixed base, bit-exact with dec_pow:
+# - repeated squares "base^(2^k)" do not depend on exponent, so they are computed once and each power only
+#   multiplies the squares of its set bits in dec_pow order (a power can't be derived from a neighbouring one,
+#   e.g. "base^(n-1) * base" rounds differently)
+# - results are memoized (MAL rewards ask for the current decay epoch over and over, i.e. O(1) amortized)
+class DecPowCache:
+    def __init__(self, base, max_results=DEC_POW_CACHE_MAX_RESULTS):
+        self.base = base
+        self.max_results = max_results
+        self.squares = [base]
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def pow(self, n):
+        result = self.results.get(n)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        if len(self.results) >= self.max_results:
+            self.results.clear()
+        result = self.results[n] = self._pow(n)
+        return result
+
+    # Returns [base^n for n in "exponents"]
+    def pow_many(self, exponents):
+        exponents = list(exponents)
+        if exponents:
+            self._extend_squares(max(exponents).bit_length() - 1)
+        return [self.pow(n) for n in exponents]
+
+    def _pow(self, n):
+        if n == 0:
+            return DECIMAL_PRECISION
+        top_bit = n.bit_length() - 1
+        squares = self._extend_squares(top_bit)
+        y = DECIMAL_PRECISION
+        for k in range(top_bit):
+            if (n >> k) & 1:
+                y = dec_mul(squares[k], y)
+        return dec_mul(squares[top_bit], y)
+
+    def _extend_squares(self, top_bit):
+        squares = self.squares
+        while len(squares) <= top_bit:
+            squares.append(dec_mul(squares[-1], squares[-1]))
+        return squares
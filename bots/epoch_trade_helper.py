@@ -1,7 +1,9 @@
-import json
 from eth_abi import encode_abi
 from web3 import Web3
 
+from contract_registry import get_contract
+from deadline import DeadlineExceeded, check_deadline
+from tracing import traced
 from uniswap_quoter import UniswapQuoter
 
 DAI_ADDRESS = "0x6B175474E89094C44Da98b954EedeAC495271d0F"
@@ -12,16 +14,19 @@ USDC_ADDRESS = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
 WETH_ADDRESS = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
 
 CURVE_LUSD_POOL_ADDRESS = "0xEd279fDD11cA84bEef15AF5D39BB4d4bEE23F0cA"
-CURVE_LUSD_POOL_ABI = json.loads(open(f"abi/CurveLUSDPool.json", "r").read())
+
+QUIET_PATH_MAX_LOSS_BPS = 10  # how much worse (than the best) a path with less frontrun collision risk can be
 
 
 class EpochTradeHelper:
-    def __init__(self, w3):
+    def __init__(self, w3, pool_activity_watcher=None):
         self.w3 = w3
+        self.pool_activity_watcher = pool_activity_watcher
         self.uniswap_quoter = UniswapQuoter(w3)
-        self.lusd_curve_pool = w3.eth.contract(address=CURVE_LUSD_POOL_ADDRESS, abi=CURVE_LUSD_POOL_ABI)
+        self.lusd_curve_pool = get_contract(w3, "CurveLUSDPool", CURVE_LUSD_POOL_ADDRESS)
 
-    def build_trade_data(self, eth_amount, lqty_amount, mal_burn_pct):
+    # "excluded_trade_data" is a collection of previously built trade data that should not be used (e.g. failed pre-flight)
+    def build_trade_data(self, eth_amount, lqty_amount, mal_burn_pct, excluded_trade_data=()):
         # LQTY->WETH | WETH(mal_burn%)->MAL | WETH(100%-mal_burn%)+wrap(ETH)->LUSD
         lqty_weth_path = [LQTY_ADDRESS, 3000, WETH_ADDRESS]
         weth_mal_path = [WETH_ADDRESS, 3000, MAL_ADDRESS]
@@ -31,13 +36,17 @@ class EpochTradeHelper:
         weth_to_buy_lusd = eth_amount + (weth_amount_out - weth_to_buy_mal)
         if weth_to_buy_lusd == 0:
             return b''
-        (weth_lusd_path, lusd_amount_out) = self._evaluate_weth_to_lusd_options(weth_to_buy_lusd)
+        (weth_lusd_path, lusd_amount_out) = self._evaluate_weth_to_lusd_options(weth_to_buy_lusd, excluded_trade_data)
+        return self.encode_trade_data(weth_lusd_path)
+
+    @staticmethod
+    def encode_trade_data(weth_lusd_path):
         weth_to_stable_token_fee = weth_lusd_path[1]
         stable_token = weth_lusd_path[2]
         use_curve_for_stable_token_to_lusd = (weth_lusd_path[-1] != LUSD_ADDRESS)
         return encode_abi(['address', 'uint24', 'bool'], [stable_token, weth_to_stable_token_fee, use_curve_for_stable_token_to_lusd])
 
-    def _evaluate_weth_to_lusd_options(self, weth_amount):
+    def _evaluate_weth_to_lusd_options(self, weth_amount, excluded_trade_data=()):
         weth_lusd_options = [
             [WETH_ADDRESS, 3000, LUSD_ADDRESS],
             [WETH_ADDRESS, 500, USDC_ADDRESS],
@@ -49,14 +58,45 @@ class EpochTradeHelper:
             [WETH_ADDRESS, 500, DAI_ADDRESS, 500, LUSD_ADDRESS],
             [WETH_ADDRESS, 3000, DAI_ADDRESS, 500, LUSD_ADDRESS],
         ]
-        return self._pick_best_path(weth_amount, weth_lusd_options, with_curve_trade=True)
+        weth_lusd_options = [path for path in weth_lusd_options if self.encode_trade_data(path) not in excluded_trade_data]
+        if self.pool_activity_watcher is None or not self.pool_activity_watcher.is_loaded():
+            return self._pick_best_path(weth_amount, weth_lusd_options, with_curve_trade=True)
+        return self._pick_quiet_path(weth_amount, weth_lusd_options)
+
+    # Picks path with the lowest chance of pools being traded in the next block (which would trigger frontrun protection)
+    # among paths which are at most QUIET_PATH_MAX_LOSS_BPS worse than the best one
+    @traced()
+    def _pick_quiet_path(self, weth_amount, weth_lusd_options):
+        path_amounts_out = self._quote_paths(weth_amount, weth_lusd_options, with_curve_trade=True)
+        if not path_amounts_out:
+            raise Exception("Failed to estimate amount out for given trade path options")
+        best_amount_out = max(amount_out for (_, amount_out) in path_amounts_out)
+        min_amount_out = best_amount_out * (10000 - QUIET_PATH_MAX_LOSS_BPS) // 10000
+        candidates = [(path, amount_out) for (path, amount_out) in path_amounts_out if amount_out >= min_amount_out]
+        estimate_collision_probability = self.pool_activity_watcher.estimate_trade_data_collision_probability
+        return min(candidates, key=lambda v: (estimate_collision_probability(self.encode_trade_data(v[0])), -v[1]))
 
+    @traced()
     def _pick_best_path(self, amount_in, path_options, with_curve_trade=False):
-        (best_path, best_amount_out) = (None, None)
+        (best_path, best_amount_out) = (None, 0)
+        for (path, amount_out) in self._quote_paths(amount_in, path_options, with_curve_trade):
+            if best_amount_out < amount_out:
+                (best_path, best_amount_out) = (path, amount_out)
+        if best_path is None:
+            raise Exception("Failed to estimate amount out for given trade path options")
+        return (best_path, best_amount_out)
+
+    # Returns list of (path, amount_out) for paths which were quoted successfully with non-zero amount out
+    @traced()
+    def _quote_paths(self, amount_in, path_options, with_curve_trade=False):
+        path_amounts_out = []
         for path in path_options:
+            check_deadline()
             amount_out = None
             try:
                 amount_out = self.uniswap_quoter.estimate_amount_out(int(amount_in), path)
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 print(f"Skipping path {path} with error: {e}")
                 continue
@@ -67,11 +107,9 @@ class EpochTradeHelper:
                     amount_out = self.lusd_curve_pool.functions.get_dy_underlying(1, 0, amount_out).call()
                 else:
                     raise Exception("Unexpected token")
-            if (best_amount_out or 0) < amount_out:
-                (best_path, best_amount_out) = (path, amount_out)
-        if best_path is None:
-            raise Exception("Failed to estimate amount out for given trade path options")
-        return (best_path, best_amount_out)
+            if amount_out > 0:
+                path_amounts_out.append((path, amount_out))
+        return path_amounts_out
 
     def _amount_to_swap_for_mal(self, amount, mal_burn_pct):
         return amount * mal_burn_pct // 10000
@@ -82,12 +120,12 @@ if __name__ == "__main__":
     w3 = Web3(Web3.HTTPProvider(MAINNET_ENDPOINT))
     (E18, E12, E6) = (10**18, 10**12, 10**6)
     # price feed:
-    price_feed = w3.eth.contract(address="0x4c517D4e2C851CA76d7eC94B805269Df0f2201De", abi=json.loads(open(f"abi/PriceFeed.json", "r").read()))
+    price_feed = get_contract(w3, "PriceFeed", "0x4c517D4e2C851CA76d7eC94B805269Df0f2201De")
     eth_usd_price = price_feed.functions.lastGoodPrice().call() / E18
     print(f"PriceFeed: last_good_price={eth_usd_price:.4f}")
     # quote WETH -> LUSD options:
     quoter = UniswapQuoter(w3)
-    lusd_curve_pool = w3.eth.contract(address=CURVE_LUSD_POOL_ADDRESS, abi=CURVE_LUSD_POOL_ABI)
+    lusd_curve_pool = get_contract(w3, "CurveLUSDPool", CURVE_LUSD_POOL_ADDRESS)
     paths = {
         "V2[WETH/LUSD]": [WETH_ADDRESS, LUSD_ADDRESS],
         "V2[WETH/USDC]": [WETH_ADDRESS, USDC_ADDRESS],
@@ -0,0 +1,165 @@
+from deadline import Deadline
+from fast_call import get_pinned_reads
+from liquity_helper import MCR, CCR
+from tracing import traced
+
+LUSD_MIN_EMERGENCY_PRICE = 1.06
+LUSD_PRICE_CACHE_MAX_AGE_SECS = 10 * 60
+EMERGENCY_ACTION_BUDGET_SECS = 120
+
+# Owner actions:
+ACTION_EMERGENCY_WITHDRAW = "emergencyWithdraw"
+ACTION_EMERGENCY_RECOVER = "emergencyRecover"
+ACTION_START_NEW_EPOCH = "startNewEpoch"
+EMERGENCY_ACTIONS = (ACTION_EMERGENCY_WITHDRAW, ACTION_EMERGENCY_RECOVER)
+
+
+# Returns deadline "action" is performed under: emergency actions get a budget of their own, so they are never
+# cancelled because the iteration spent its budget before them ("iteration_deadline" bounds the other actions)
+def get_action_deadline(action, iteration_deadline):
+    if action in EMERGENCY_ACTIONS:
+        return Deadline(EMERGENCY_ACTION_BUDGET_SECS)
+    return iteration_deadline
+
+
+# Evaluates emergency condition from Liquity state ("liquity_helper") and prices ("price_provider"), which are
+# the same for every farm: within pinned reads scope (see fast_call.py) condition is evaluated once and shared
+# by policies of all farms (prices are fetched and cadence is updated once per scope)
+class EmergencyEvaluator:
+    def __init__(self, liquity_helper, price_provider, cadence, log=print, on_emergency_signals=None):
+        self.liquity_helper = liquity_helper
+        self.price_provider = price_provider
+        self.cadence = cadence
+        self.log = log
+        self.on_emergency_signals = on_emergency_signals
+        self.last_pinned_reads = None
+        self.last_condition = None
+
+    def evaluate(self):
+        pinned_reads = get_pinned_reads()
+        if pinned_reads is not None and pinned_reads is self.last_pinned_reads:
+            return self.last_condition
+        condition = self._evaluate()
+        (self.last_pinned_reads, self.last_condition) = (pinned_reads, condition)
+        return condition
+
+    @traced()
+    def _evaluate(self):
+        # Signals (cached LUSD price is only used if system is not close to emergency as of signals just updated):
+        eth_price = self.price_provider.get_eth_price()
+        (undercoll_eth_price, oracle_last_eth_price, last_lowest_ICR, last_TCR, new_lowest_ICR, new_TCR) = \
+            self.liquity_helper.calculate_emergency_signals(eth_price)
+        self.cadence.update_signals(eth_price, undercoll_eth_price, new_TCR, CCR)
+        lusd_price = self.price_provider.get_lusd_price(self.cadence.get_cache_max_age_secs(LUSD_PRICE_CACHE_MAX_AGE_SECS))
+        # For a given ETH price, define emergency condition as true, if:
+        # - price puts system in recovery mode (TCR < CCR) or creates undercoll troves (ICR < MCR)
+        # - LUSD price is at least LUSD_MIN_EMERGENCY_PRICE (1.02)
+        is_emergency_oracle_price = (last_lowest_ICR < MCR or last_TCR < CCR)
+        is_emergency_new_price = (new_lowest_ICR < MCR or new_TCR < CCR) and lusd_price >= LUSD_MIN_EMERGENCY_PRICE
+        # (fields are formatted by logger thread)
+        self.log("Emergency evaluation",
+            is_emergency_oracle=is_emergency_oracle_price, is_emergency_new=is_emergency_new_price,
+            lusd=lusd_price, liquidation_eth=undercoll_eth_price,
+            oracle_last_eth=oracle_last_eth_price, coinbase_eth=eth_price,
+            last_TCR=last_TCR, new_TCR=new_TCR, last_min_ICR=last_lowest_ICR, new_min_ICR=new_lowest_ICR)
+        if self.on_emergency_signals is not None:
+            self.on_emergency_signals({
+                'lusd_price': lusd_price, 'eth_price': eth_price, 'oracle_last_eth_price': oracle_last_eth_price,
+                'liquidation_eth_price': undercoll_eth_price, 'last_TCR': last_TCR, 'new_TCR': new_TCR,
+                'last_lowest_ICR': last_lowest_ICR, 'new_lowest_ICR': new_lowest_ICR,
+                'is_emergency_oracle': int(is_emergency_oracle_price), 'is_emergency_new': int(is_emergency_new_price),
+            })
+        return (is_emergency_oracle_price, is_emergency_new_price)
+
+
+# Decides which GammaFarm owner action to take (shared by GammaFarmBot and its accelerated-time simulation):
+# - farm state is read via "gamma_farm" contract interface (i.e. gamma_farm.functions.<name>().call())
+# - emergency signals are read via "liquity_helper" and "price_provider"
+# - "now_time()" returns current timestamp
+# - policies of several farms may share "emergency_evaluator" (built from the other arguments if not given)
+class FarmPolicy:
+    def __init__(self, gamma_farm, liquity_helper, price_provider, cadence, now_time,
+                 min_epoch_duration, min_period_before_emergency_recover, log=print, on_emergency_signals=None,
+                 emergency_evaluator=None):
+        self.gamma_farm = gamma_farm
+        self.cadence = cadence
+        self.now_time = now_time
+        self.min_epoch_duration = min_epoch_duration
+        self.min_period_before_emergency_recover = min_period_before_emergency_recover
+        self.log = log
+        self.emergency_evaluator = emergency_evaluator or \
+            EmergencyEvaluator(liquity_helper, price_provider, cadence, log=log, on_emergency_signals=on_emergency_signals)
+        self.last_emergency_condition_ts = now_time()
+
+    # --- Checkpoint ---
+
+    def to_checkpoint(self):
+        return {'last_emergency_condition_ts': self.last_emergency_condition_ts, 'observed_ts': self.now_time()}
+
+    # Emergency condition is unknown while bot was down: if it was down longer than the usual monitoring interval,
+    # the whole gap counts as emergency (recover is never decided earlier than after a cold start with no gap)
+    def restore_checkpoint(self, state):
+        (last_emergency_condition_ts, observed_ts) = (state['last_emergency_condition_ts'], state['observed_ts'])
+        now_ts = self.now_time()
+        assert last_emergency_condition_ts <= observed_ts <= now_ts, "checkpoint timestamps are in the future"
+        if now_ts - observed_ts > self.cadence.max_interval_secs:
+            last_emergency_condition_ts = now_ts
+        self.last_emergency_condition_ts = last_emergency_condition_ts
+
+    def get_farm_emergency_state(self):
+        return self.gamma_farm.functions.isEmergencyState().call()
+
+    def evaluate_emergency_condition(self):
+        return self.emergency_evaluator.evaluate()
+
+    # --- Trigger methods for GammaFarm actions ---
+
+    def should_emergency_withdraw(self):
+        (is_emergency_oracle_price, is_emergency_new_price) = self.evaluate_emergency_condition()
+        if is_emergency_oracle_price or is_emergency_new_price:
+            self.last_emergency_condition_ts = self.now_time()
+        # Decision: withdraw, if:
+        # - system is not in emergency condition as of last oracle price
+        # - system is in emergency condition as of new price
+        should_withdraw = not is_emergency_oracle_price and is_emergency_new_price
+        self.log(f"Should emergency withdraw: {'YES' if should_withdraw else 'NO'}")
+        return should_withdraw
+
+    def should_emergency_recover(self):
+        (is_emergency_oracle_price, is_emergency_new_price) = self.evaluate_emergency_condition()
+        if is_emergency_oracle_price or is_emergency_new_price:
+            self.last_emergency_condition_ts = self.now_time()
+        # Decision: recover, if:
+        # - system is not in emergency condition for the last "min_period_before_emergency_recover"
+        seconds_since_last_emergency = self.now_time() - self.last_emergency_condition_ts
+        should_recover = seconds_since_last_emergency >= self.min_period_before_emergency_recover.total_seconds()
+        self.log(f"Should emergency recover: {'YES' if should_recover else 'NO'}")
+        return should_recover
+
+    def should_start_new_epoch(self):
+        # Check time since start of current epoch:
+        epoch_start_time = self.gamma_farm.functions.epochStartTime().call()
+        epoch_duration_secs = self.now_time() - epoch_start_time
+        if epoch_duration_secs < self.min_epoch_duration.total_seconds():
+            self.log(f"Too early for new epoch (elapsed={epoch_duration_secs}s), skipping...")
+            return False
+        # Check whether there are funds:
+        (total_lusd, _) = self.gamma_farm.functions.getTotalBalances().call()
+        if total_lusd == 0:
+            self.log("No funds in contract, skipping...")
+            return False
+        return True
+
+    # Returns owner action to take (None if there is nothing to do)
+    def decide_action(self):
+        # Get current contract emergency state:
+        farm_emergency_state = self.get_farm_emergency_state()
+        self.cadence.on_farm_emergency_state(self, farm_emergency_state)
+        self.log(f"Farm is {'' if farm_emergency_state else 'not '}in emergency state.")
+        # Check if should flip emergency state (no new epoch during emergency or if emergency action taken):
+        if farm_emergency_state:
+            return ACTION_EMERGENCY_RECOVER if self.should_emergency_recover() else None
+        if self.should_emergency_withdraw():
+            return ACTION_EMERGENCY_WITHDRAW
+        self.log(f"Checking if it's time for new epoch...")
+        return ACTION_START_NEW_EPOCH if self.should_start_new_epoch() else None
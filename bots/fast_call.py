@@ -0,0 +1,222 @@
+import contextvars
+import threading
+import weakref
+
+from eth_abi.decoding import ContextFramesBytesIO, TupleDecoder
+from eth_abi.encoding import TupleEncoder
+from eth_abi.exceptions import DecodingError
+from eth_abi.registry import registry as abi_registry
+from contextlib import contextmanager
+from eth_utils import to_checksum_address
+from web3._utils.method_formatters import get_error_formatters
+from web3._utils.rpc_abi import RPC
+from web3.exceptions import BadFunctionCallOutput
+from web3.manager import RequestManager
+from web3.middleware import combine_middlewares
+
+from contract_registry import abi_store, get_contract_registry
+
+raise_call_error = get_error_formatters(RPC.eth_call)
+
+# Block which "latest" reads of the current unit of work are pinned to (None if reads follow chain head)
+_current_pinned_reads = contextvars.ContextVar('pinned_reads', default=None)
+
+_request_funcs = weakref.WeakKeyDictionary()
+_request_funcs_lock = threading.Lock()
+
+
+# Returns request function of "w3" without web3 default middlewares (request/result formatting and validation),
+# i.e. with middlewares added on top of defaults only (metrics, tracing, recording)
+def get_raw_request_func(w3):
+    middlewares = tuple(w3.middleware_onion.middlewares)
+    with _request_funcs_lock:
+        cached = _request_funcs.get(w3)
+        if cached is None or cached[0] != middlewares:
+            default_names = set(name for (_, name) in RequestManager.default_middlewares(w3))
+            # ("middlewares" are (middleware, name) from the innermost one)
+            outer_middlewares = [middleware for (middleware, name) in reversed(middlewares) if name not in default_names]
+            request_func = combine_middlewares(
+                middlewares=tuple(outer_middlewares) + tuple(w3.provider.middlewares),
+                web3=w3,
+                provider_request_fn=w3.provider.make_request,
+            )
+            cached = _request_funcs[w3] = (middlewares, request_func)
+        return cached[1]
+
+
+# Reads pinned to "block_number": results are memoized by (address, calldata), so the same call made
+# by several consumers (e.g. farms sharing Liquity state) within the scope hits the node once
+class PinnedReads:
+    def __init__(self, block_number):
+        self.block_number = block_number
+        self.block_identifier = hex(block_number)
+        self.results = {}  # (address, calldata) -> raw result
+        self.hits = 0
+        self.misses = 0
+
+
+# Pins "latest" fast calls made within the block to "block_number" (None leaves reads unpinned)
+@contextmanager
+def pinned_reads_scope(block_number):
+    pinned_reads = PinnedReads(block_number) if block_number is not None else None
+    token = _current_pinned_reads.set(pinned_reads)
+    try:
+        yield pinned_reads
+    finally:
+        _current_pinned_reads.reset(token)
+
+
+def get_pinned_reads():
+    return _current_pinned_reads.get()
+
+
+# Read-only contract function with calldata built by cached encoder and result decoded by cached decoder
+# (request skips web3 default middlewares, i.e. params must be sent in wire format)
+class FastFunction:
+    def __init__(self, w3, address, compiled_fn):
+        self.w3 = w3
+        self.address = address
+        self.name = compiled_fn.name
+        self.selector = compiled_fn.selector
+        self.encoder = TupleEncoder(encoders=[abi_registry.get_encoder(t) for t in compiled_fn.input_types]) \
+            if compiled_fn.input_types else None
+        self.decoder = TupleDecoder(decoders=[abi_registry.get_decoder(t) for t in compiled_fn.output_types])
+        self.address_outputs = [i for (i, t) in enumerate(compiled_fn.output_types) if t == 'address']
+        self.is_single_output = len(compiled_fn.output_types) == 1
+        # (argument-free calls are pre-encoded)
+        self.calldata = "0x" + self.selector.hex() if self.encoder is None else None
+
+    def encode(self, args):
+        if self.encoder is None:
+            assert not args, f"{self.name} takes no arguments"
+            return self.calldata
+        return "0x" + (self.selector + self.encoder(args)).hex()
+
+    # Returns decoded result like web3 contract call (single output is unwrapped, addresses are checksummed)
+    def decode(self, data):
+        try:
+            result = self.decoder(ContextFramesBytesIO(data))
+        except DecodingError as e:
+            raise BadFunctionCallOutput(f"Could not decode output of {self.name} (is contract deployed?): {e}")
+        if self.address_outputs:
+            result = list(result)
+            for i in self.address_outputs:
+                result[i] = to_checksum_address(result[i])
+        return result[0] if self.is_single_output else list(result)
+
+    def call(self, *args, block_identifier='latest'):
+        calldata = self.encode(args)
+        pinned_reads = _current_pinned_reads.get() if block_identifier == 'latest' else None
+        if pinned_reads is None:
+            return self.decode(self.call_raw(calldata, block_identifier))
+        key = (self.address, calldata)
+        result = pinned_reads.results.get(key)
+        if result is None:
+            pinned_reads.misses += 1
+            result = pinned_reads.results[key] = self.call_raw(calldata, pinned_reads.block_identifier)
+        else:
+            pinned_reads.hits += 1
+        return self.decode(result)
+
+    # Returns raw result of eth_call with "calldata"
+    def call_raw(self, calldata, block_identifier):
+        if isinstance(block_identifier, int):
+            block_identifier = hex(block_identifier)
+        response = get_raw_request_func(self.w3)(RPC.eth_call, [{'to': self.address, 'data': calldata}, block_identifier])
+        if 'error' in response:
+            raise_call_error(response)
+            raise ValueError(response['error'])
+        if response.get('result') is None:
+            raise ValueError(f"Unexpected response to {self.name} call: {response}")
+        return bytes.fromhex(response['result'][2:])
+
+    # Mimics web3 "contract.functions.<name>(*args)" so that callers can keep using ".call()"
+    def __call__(self, *args):
+        return BoundFastFunction(self, args)
+
+
+class BoundFastFunction:
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+
+    def call(self, block_identifier='latest'):
+        return self.fn.call(*self.args, block_identifier=block_identifier)
+
+
+class FastFunctions:
+    def __init__(self, contract):
+        self._contract = contract
+
+    def __getattr__(self, name):
+        return self._contract.get_function(name)
+
+
+# Read-only counterpart of web3 contract: "contract.functions.<name>(*args).call()" or "contract.call(<name>, *args)"
+class FastContract:
+    def __init__(self, w3, abi_name, address):
+        self.w3 = w3
+        self.abi_name = abi_name
+        self.address = address
+        self.fns = {}
+        self.functions = FastFunctions(self)
+
+    # (overloaded functions are not supported)
+    def get_function(self, name):
+        fn = self.fns.get(name)
+        if fn is None:
+            fn = self.fns[name] = FastFunction(self.w3, self.address, abi_store.get_function(self.abi_name, name))
+        return fn
+
+    def call(self, name, *args, block_identifier='latest'):
+        return self.get_function(name).call(*args, block_identifier=block_identifier)
+
+
+def get_fast_contract(w3, abi_name, address):
+    return get_contract_registry(w3).get_contract(abi_name, address, factory=FastContract)
+
+
+if __name__ == '__main__':
+    import timeit
+
+    from eth_abi import encode_abi
+    from web3 import Web3
+    from web3.providers.base import JSONBaseProvider
+
+    from contract_registry import get_contract
+
+    TROVE_MANAGER_ADDRESS = "0xA39739EF8b0231DbFA0DcdA07d7e29faAbCf4bb2"
+    NUM_CALLS = 2000
+
+    # In-process provider answering every eth_call with the same result (measures Python CPU only)
+    class EchoProvider(JSONBaseProvider):
+        def __init__(self, result):
+            super().__init__()
+            self.result = "0x" + result.hex()
+
+        def make_request(self, method, params):
+            if method == 'eth_chainId':
+                return {'jsonrpc': '2.0', 'id': 0, 'result': "0x1"}
+            return {'jsonrpc': '2.0', 'id': 0, 'result': self.result}
+
+    w3 = Web3(EchoProvider(encode_abi(['uint256', 'uint256', 'uint256', 'uint256', 'uint256'], [1, 2, 3, 4, 5])))
+    (contract, fast_contract) = (get_contract(w3, "TroveManager", TROVE_MANAGER_ADDRESS), get_fast_contract(w3, "TroveManager", TROVE_MANAGER_ADDRESS))
+    calls = {
+        "getEntireSystemColl()": (
+            lambda: contract.functions.getEntireSystemColl().call(),
+            lambda: fast_contract.functions.getEntireSystemColl().call(),
+        ),
+        "getTCR(uint256)": (
+            lambda: contract.functions.getTCR(2000 * 10**18).call(),
+            lambda: fast_contract.functions.getTCR(2000 * 10**18).call(),
+        ),
+        "Troves(address)": (
+            lambda: contract.functions.Troves(TROVE_MANAGER_ADDRESS).call(),
+            lambda: fast_contract.functions.Troves(TROVE_MANAGER_ADDRESS).call(),
+        ),
+    }
+    for (name, (web3_call, fast_call)) in calls.items():
+        assert web3_call() == fast_call()
+        web3_us = min(timeit.repeat(web3_call, number=NUM_CALLS, repeat=3)) / NUM_CALLS * 1e6
+        fast_us = min(timeit.repeat(fast_call, number=NUM_CALLS, repeat=3)) / NUM_CALLS * 1e6
+        print(f"{name}: web3={web3_us:.1f}us, fast={fast_us:.1f}us ({web3_us / fast_us:.1f}x)")
@@ -0,0 +1,140 @@
+from collections import deque
+
+FEE_HISTORY_WINDOW_SIZE = 20
+FEE_HISTORY_REWARD_PERCENTILES = [10, 25, 50, 75, 90, 99]
+BASE_FEE_MAX_CHANGE_DENOMINATOR = 8
+ELASTICITY_MULTIPLIER = 2
+REPLACEMENT_BUMP_RATIO = 1.125  # nodes require at least +10% on both fees to accept a replacement
+
+
+def calculate_next_base_fee(base_fee, gas_used_ratio):
+    # EIP-1559: base fee changes by at most 1/8 depending on how far gas used is from target (half of gas limit):
+    target_ratio = 1 / ELASTICITY_MULTIPLIER
+    delta = int(base_fee * (gas_used_ratio - target_ratio) / target_ratio / BASE_FEE_MAX_CHANGE_DENOMINATOR)
+    return max(base_fee + delta, 0)
+
+
+class FeeHistory:
+    def __init__(self, w3, window_size=FEE_HISTORY_WINDOW_SIZE, reward_percentiles=FEE_HISTORY_REWARD_PERCENTILES):
+        self.w3 = w3
+        self.window_size = window_size
+        self.reward_percentiles = reward_percentiles
+        # Per block values (oldest first):
+        self.base_fees = deque(maxlen=window_size)
+        self.gas_used_ratios = deque(maxlen=window_size)
+        self.rewards = deque(maxlen=window_size)
+        self.newest_block_number = None
+        self.next_base_fee = None
+
+    def is_loaded(self):
+        return self.newest_block_number is not None
+
+    def load(self, newest_block='latest'):
+        self._append_fee_history(self.window_size, newest_block)
+
+    # BlockWatcher listener: appends only blocks which are not in the window yet
+    def on_new_block(self, block):
+        if not self.is_loaded() or block.number - self.newest_block_number > self.window_size:
+            self.load(block.number)
+        elif block.number > self.newest_block_number:
+            self._append_fee_history(block.number - self.newest_block_number, block.number)
+
+    def _append_fee_history(self, block_count, newest_block):
+        fee_history = self.w3.eth.fee_history(block_count, newest_block, self.reward_percentiles)
+        block_base_fees = fee_history['baseFeePerGas']
+        self.base_fees.extend(block_base_fees[:-1])
+        self.gas_used_ratios.extend(fee_history['gasUsedRatio'])
+        self.rewards.extend(fee_history['reward'])
+        self.newest_block_number = fee_history['oldestBlock'] + len(fee_history['gasUsedRatio']) - 1
+        self.next_base_fee = block_base_fees[-1]
+
+    # --- Checkpoint ---
+
+    def to_checkpoint(self):
+        return {
+            'base_fees': list(self.base_fees), 'gas_used_ratios': list(self.gas_used_ratios), 'rewards': list(self.rewards),
+            'newest_block_number': self.newest_block_number, 'next_base_fee': self.next_base_fee,
+        }
+
+    # (window catches up with blocks mined since checkpoint on the next new block)
+    def restore_checkpoint(self, state):
+        assert len(state['base_fees']) == len(state['gas_used_ratios']) == len(state['rewards']), "inconsistent fee history"
+        self.base_fees = deque(state['base_fees'], maxlen=self.window_size)
+        self.gas_used_ratios = deque(state['gas_used_ratios'], maxlen=self.window_size)
+        self.rewards = deque(state['rewards'], maxlen=self.window_size)
+        (self.newest_block_number, self.next_base_fee) = (state['newest_block_number'], state['next_base_fee'])
+
+    # --- Forecasts ---
+
+    # Returns base fees for the next "num_blocks" blocks assuming given gas used ratio (mean of window by default)
+    def forecast_base_fees(self, num_blocks, gas_used_ratio=None):
+        if gas_used_ratio is None:
+            gas_used_ratio = sum(self.gas_used_ratios) / len(self.gas_used_ratios)
+        base_fees = [self.next_base_fee]
+        for _ in range(num_blocks - 1):
+            base_fees.append(calculate_next_base_fee(base_fees[-1], gas_used_ratio))
+        return base_fees
+
+    # Returns max base fee within the next "num_blocks" blocks assuming blocks are as full as the fullest block in window
+    def forecast_max_base_fee(self, num_blocks):
+        return max(self.forecast_base_fees(num_blocks, gas_used_ratio=max(self.gas_used_ratios)))
+
+    # Estimates probability to be included in a single block with given priority fee:
+    # - for each block in window find the highest reward percentile paid which is not above given priority fee
+    # - average those percentiles over window
+    def estimate_block_inclusion_probability(self, priority_fee):
+        total_probability = 0
+        for block_rewards in self.rewards:
+            for (percentile, reward) in reversed(list(zip(self.reward_percentiles, block_rewards))):
+                if reward <= priority_fee:
+                    total_probability += percentile / 100
+                    break
+        return total_probability / len(self.rewards)
+
+    # Returns lowest observed priority fee to be included within "num_blocks" blocks with at least "probability"
+    # (or the highest observed priority fee if none is enough)
+    def estimate_priority_fee(self, probability, num_blocks):
+        candidates = sorted(set(reward for block_rewards in self.rewards for reward in block_rewards))
+        for priority_fee in candidates:
+            block_probability = self.estimate_block_inclusion_probability(priority_fee)
+            if 1 - pow(1 - block_probability, num_blocks) >= probability:
+                return priority_fee
+        return candidates[-1]
+
+
+# Priority fee is estimated from fee history and kept within [min_priority_fee_per_gas, max_priority_fee_per_gas]
+# (a stressed window may estimate any fee, e.g. its highest p99 reward)
+class FeeHistoryGasStrategy:
+    def __init__(self, fee_history, target_probability, target_blocks, min_priority_fee_per_gas=0, max_priority_fee_per_gas=None,
+                 bump_ratio=REPLACEMENT_BUMP_RATIO):
+        assert 0 < target_probability < 1, "target_probability must be in (0, 1)"
+        assert target_blocks >= 1, "target_blocks must be at least 1"
+        assert max_priority_fee_per_gas is None or min_priority_fee_per_gas <= max_priority_fee_per_gas, "min fee above max fee"
+        self.fee_history = fee_history
+        self.target_probability = target_probability
+        self.target_blocks = target_blocks
+        self.min_priority_fee_per_gas = min_priority_fee_per_gas
+        self.max_priority_fee_per_gas = max_priority_fee_per_gas
+        self.bump_ratio = bump_ratio
+
+    def fill_initial_gas_fees(self, tx):
+        (max_priority_fee_per_gas, max_fee_per_gas) = self._estimate_gas_fees(self.target_blocks)
+        tx['maxPriorityFeePerGas'] = max_priority_fee_per_gas
+        tx['maxFeePerGas'] = max_fee_per_gas
+
+    # Tx is still pending: aim at fewer blocks and make sure replacement is accepted by nodes
+    def fill_next_gas_fees(self, tx):
+        self.target_blocks = max(self.target_blocks - 1, 1)
+        (max_priority_fee_per_gas, max_fee_per_gas) = self._estimate_gas_fees(self.target_blocks)
+        tx['maxPriorityFeePerGas'] = max(max_priority_fee_per_gas, int(tx['maxPriorityFeePerGas'] * self.bump_ratio))
+        tx['maxFeePerGas'] = max(max_fee_per_gas, int(tx['maxFeePerGas'] * self.bump_ratio))
+
+    def _estimate_gas_fees(self, num_blocks):
+        max_priority_fee_per_gas = max(
+            self.fee_history.estimate_priority_fee(self.target_probability, num_blocks),
+            self.min_priority_fee_per_gas,
+        )
+        if self.max_priority_fee_per_gas is not None:
+            max_priority_fee_per_gas = min(max_priority_fee_per_gas, self.max_priority_fee_per_gas)
+        max_fee_per_gas = self.fee_history.forecast_max_base_fee(num_blocks) + max_priority_fee_per_gas
+        return (max_priority_fee_per_gas, max_fee_per_gas)
@@ -1,56 +1,179 @@
 import argparse
 import json
 import os
-import random
 import signal
 import sys
+import threading
 import time
 import traceback
 
+import price_provider
+
+from collections import Counter
 from datetime import timedelta
 from eth_keyfile import extract_key_from_keyfile
 from getpass import getpass
 from web3 import Web3
+from web3.exceptions import BlockNotFound, ContractLogicError
 
+from block_watcher import BlockWatcher
+from bot_logger import BotLogger
+from cadence import MonitoringCadence
+from checkpoint import Checkpointer
 from config import CONFIG
+from contract_registry import get_contract
+from deadline import Deadline, DeadlineExceeded, DeadlineHTTPProvider, check_deadline, deadline_scope, get_deadline
 from epoch_trade_helper import EpochTradeHelper
-from liquity_helper import LiquityHelper, MCR, CCR
+from fast_call import get_fast_contract, pinned_reads_scope
+from fee_history import FeeHistory, FeeHistoryGasStrategy
+from inclusion_tracker import InclusionTracker
+from leader_election import FileLeaseStore, LeaderElector, get_default_holder_id
+from farm_policy import EmergencyEvaluator, FarmPolicy, ACTION_EMERGENCY_RECOVER, ACTION_EMERGENCY_WITHDRAW, ACTION_START_NEW_EPOCH, get_action_deadline
+from liquity_helper import LiquityHelper
+from metrics_server import MetricsRegistry, MetricsServer
+from nonce_manager import NonceManager
+from pool_activity_watcher import PoolActivityWatcher
+from preflight import simulate_tx, parse_error_message, PREFLIGHT_OK, PREFLIGHT_REBUILD_TRADE_DATA, PREFLIGHT_RETRY_NEXT_BLOCK
 from price_provider import PriceProvider
+from replay import CallStore, ReplayServer, get_percentile, get_replay_api_url, record_session, record_web3
+from rpc_metrics import RpcMetrics, format_metrics_summary, instrument_web3
+from tracing import tracer, traced, trace_web3
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--mainnet", action='store_true', help="Use that to run on mainnet")
+parser.add_argument("--metrics-host", default="127.0.0.1", help="Host to serve Prometheus metrics on")
+parser.add_argument("--metrics-port", type=int, default=9108, help="Port to serve Prometheus metrics on")
+parser.add_argument("--trace-sample-rate", type=float, default=0.05, help="Share of run iterations to trace")
+parser.add_argument("--record", metavar="FILE", help="Record RPC and price API calls of an iteration (or --bench iterations) into FILE")
+parser.add_argument("--replay", metavar="FILE", help="Serve RPC and price API calls recorded in FILE from a local stand-in server")
+parser.add_argument("--replay-latency-ms", type=float, default=0, help="Latency injected into each replayed call")
+parser.add_argument("--replay-jitter-ms", type=float, default=0, help="Max random deviation from --replay-latency-ms")
+parser.add_argument("--bench", type=int, metavar="N", help="Run N iterations back to back and report iteration times and call counts")
+parser.add_argument("--farm", action='append', metavar="ADDRESS",
+                    help="GammaFarm to manage (repeat to manage several farms, default: farm of network config)")
+parser.add_argument("--lease-file", metavar="PATH",
+                    help="Run as one of replicas sharing lease in PATH: only lease holder sends txs, others stay warm on standby")
+parser.add_argument("--replica", metavar="NAME", help="Replica name (keeps log, checkpoint and lease holder id apart)")
+parser.add_argument("--no-checkpoint", action='store_true', help="Start cold and don't write state checkpoints")
 cmd_args = parser.parse_args()
+if cmd_args.lease_file and not cmd_args.replica:
+    parser.error("--lease-file requires --replica (replicas must not share log and checkpoint files)")
 
 NETWORK = "mainnet" if cmd_args.mainnet else "mainnet-fork"
-GAMMA_FARM_ADDRESS = CONFIG[NETWORK]["GAMMA_FARM_ADDRESS"]
-GAMMA_FARM_ABI = json.loads(open(CONFIG[NETWORK]["GAMMA_FARM_ABI_PATH"], "r").read())
+GAMMA_FARM_ADDRESSES = [Web3.toChecksumAddress(address) for address in cmd_args.farm or [CONFIG[NETWORK]["GAMMA_FARM_ADDRESS"]]]
+GAMMA_FARM_ABI_PATH = CONFIG[NETWORK]["GAMMA_FARM_ABI_PATH"]
 WEB3_ENDPOINT = CONFIG[NETWORK]["WEB3_ENDPOINT"]
 WEB3_PRIVATE_ENDPOINT = CONFIG[NETWORK]["WEB3_PRIVATE_ENDPOINT"]
 
 LOG_PATH = os.path.expanduser(CONFIG[NETWORK]["LOG_PATH"])
+if cmd_args.replica:
+    (log_path_root, log_path_ext) = os.path.splitext(LOG_PATH)
+    LOG_PATH = f"{log_path_root}.{cmd_args.replica}{log_path_ext}"
+RPC_METRICS_PATH = LOG_PATH + ".rpc_metrics.json"
+TRACE_PATH = LOG_PATH + ".trace.json"
+CHECKPOINT_PATH = LOG_PATH + ".checkpoint.json"
+
+WEB3_BACKUP_ENDPOINT = "https://rpc.builder0x69.io"
+
+# Offline replay: all endpoints point to local stand-in server
+call_store = None
+if cmd_args.replay:
+    call_store = CallStore.load(cmd_args.replay)
+    replay_server = ReplayServer(call_store, cmd_args.replay_latency_ms, cmd_args.replay_jitter_ms).start()
+    (WEB3_ENDPOINT, WEB3_PRIVATE_ENDPOINT, WEB3_BACKUP_ENDPOINT) = \
+        (replay_server.get_rpc_url("main"), replay_server.get_rpc_url("private"), replay_server.get_rpc_url("backup"))
+    price_provider.COINGECKO_API_PRICES_ENDPOINT = get_replay_api_url(price_provider.COINGECKO_API_PRICES_ENDPOINT, replay_server.url)
+    price_provider.COINBASE_API_PRICES_ENDPOINT = get_replay_api_url(price_provider.COINBASE_API_PRICES_ENDPOINT, replay_server.url)
+
+# (request timeouts are capped by deadline of current iteration)
+w3 = Web3(DeadlineHTTPProvider(WEB3_ENDPOINT, request_kwargs={'timeout':60}))
+w3_private = Web3(DeadlineHTTPProvider(WEB3_PRIVATE_ENDPOINT, request_kwargs={'timeout':60}))
+w3_backup = Web3(DeadlineHTTPProvider(WEB3_BACKUP_ENDPOINT, request_kwargs={'timeout':60}))
+
+if cmd_args.record:
+    call_store = CallStore()
+    record_web3(w3, call_store, "main")
+    record_web3(w3_private, call_store, "private")
+    record_web3(w3_backup, call_store, "backup")
+    record_session(price_provider.SESSION, call_store)
+
+rpc_metrics = RpcMetrics()
+instrument_web3(w3, rpc_metrics, "main")
+instrument_web3(w3_private, rpc_metrics, "private")
+instrument_web3(w3_backup, rpc_metrics, "backup")
+
+tracer.sample_rate = cmd_args.trace_sample_rate
+trace_web3(w3, "main")
+trace_web3(w3_private, "private")
+trace_web3(w3_backup, "backup")
+
+metrics = MetricsRegistry(prefix="gamma_farm_bot")
+ITERATIONS = metrics.counter("iterations_total", "Number of finished run iterations")
+ITERATION_ERRORS = metrics.counter("iteration_errors_total", "Number of run iterations which raised an exception")
+FARM_ERRORS = metrics.counter("farm_errors_total", "Number of farm steps which raised an exception (multi-farm mode)")
+IS_LEADER = metrics.gauge("is_leader", "Whether this replica holds the lease (always 1 without --lease-file)")
+ITERATION_DURATION = metrics.gauge("iteration_duration_seconds", "Duration of the last run iteration")
+LAST_BLOCK_NUMBER = metrics.gauge("last_block_number", "Number of the last block seen")
+SECONDS_SINCE_LAST_BLOCK = metrics.gauge("seconds_since_last_block", "Seconds since the last new block was seen")
+EMERGENCY_SIGNAL = metrics.gauge("emergency_signal", "Last emergency evaluation signal values")
+PRICE_STALENESS = metrics.gauge("price_staleness_seconds", "Seconds since the price was last updated by its source")
+PENDING_TX_AGE = metrics.gauge("pending_tx_age_seconds", "Seconds since the oldest pending owner tx was first sent")
+GAS_PAID = metrics.counter("gas_paid_wei_total", "Fees paid by owner txs")
+RPC_REQUESTS = metrics.counter("rpc_requests_total", "Number of JSON-RPC requests")
+RPC_ERRORS = metrics.counter("rpc_errors_total", "Number of failed JSON-RPC requests")
+RPC_LATENCY = metrics.gauge("rpc_latency_seconds", "JSON-RPC request latency quantiles since start")
+CACHE_HITS = metrics.counter("cache_hits_total", "Number of cache hits")
+CACHE_MISSES = metrics.counter("cache_misses_total", "Number of cache misses")
+
+
+def collect_rpc_metrics():
+    for ((endpoint, call), call_metrics) in rpc_metrics.get_total().items():
+        RPC_REQUESTS.set(call_metrics.latency_us.count, endpoint=endpoint, call=call)
+        for (error_class, count) in call_metrics.errors.items():
+            RPC_ERRORS.set(count, endpoint=endpoint, call=call, error=error_class)
+        for quantile in [0.5, 0.9, 0.99]:
+            latency_us = call_metrics.latency_us.get_percentile(quantile * 100)
+            RPC_LATENCY.set(latency_us / 1e6, endpoint=endpoint, call=call, quantile=quantile)
+
+metrics.add_collector(collect_rpc_metrics)
+
+
+def set_emergency_signals(signals):
+    for (signal_name, value) in signals.items():
+        EMERGENCY_SIGNAL.set(value, signal=signal_name)
 
-w3 = Web3(Web3.HTTPProvider(WEB3_ENDPOINT, request_kwargs={'timeout':60}))
-w3_private = Web3(Web3.HTTPProvider(WEB3_PRIVATE_ENDPOINT, request_kwargs={'timeout':60}))
-w3_backup = Web3(Web3.HTTPProvider("https://rpc.builder0x69.io", request_kwargs={'timeout':60}))
 
 LQTY_ADDRESS = "0x6DEA81C8171D0bA574754EF6F8b412F2Ed88c54D"
-ERC20_ABI = json.loads(open(f"abi/ERC20.json", "r").read())
 
 BASE_FEE_PER_GAS_LIMIT = w3.toWei('100', 'gwei')
 PRIORITY_FEE_PER_GAS_LIMIT = w3.toWei('10', 'gwei')
 GAS_BUMP_RATIO = 1.2
+TX_BUMP_INTERVAL_BLOCKS = 3
+EMERGENCY_TX_BUMP_INTERVAL_BLOCKS = 1
+TX_MAX_PENDING_BLOCKS = 100
+PREFLIGHT_MAX_BLOCK_RETRIES = 5
+MAX_TRADE_COLLISION_PROBABILITY = 0.5
+FRONTRUN_BACKOFF_BLOCKS = 2
+BLOCK_WAIT_TIMEOUT_SECS = 60
+ITERATION_BUDGET_SECS = 45
+CHECKPOINT_INTERVAL_SECS = 60
+CHECKPOINT_MAX_AGE_SECS = 24 * 60 * 60
 
 START_NEW_EPOCH_GAS_LIMIT = 1200000
 EMERGENCY_WITHDRAW_GAS_LIMIT = 1200000
 EMERGENCY_RECOVER_GAS_LIMIT = 1200000
 
-LUSD_MIN_EMERGENCY_PRICE = 1.06
+logger = BotLogger(LOG_PATH)
+
+def log(*args, **fields):
+    logger.log(*args, **fields)
+
 
-def log(*args):
-    log_message = time.strftime('[%Y-%m-%d %H:%M:%S] ') + ' '.join(str(arg) for arg in args)
-    with open(LOG_PATH, 'a') as log_file:
-        log_file.write(log_message + '\n')
-    print(log_message)
+# Lease of active replica (None if bot runs without replicas)
+leader_elector = None
+
+def is_leader():
+    return leader_elector is None or leader_elector.is_leader()
 
 
 class GasStrategy:
@@ -86,53 +209,104 @@ def get_error_message(tx_hash):
             'data': tx.get('data') or tx.get('input'),
         }
         w3.eth.call(replay_tx)
-    except ValueError as e:
-        if len(e.args) != 1:
-            return None
-        data = e.args[0]
-        if type(data) == str:
-            return data
-        elif type(data) == dict:
-            return data.get('message')
+    except (ContractLogicError, ValueError) as e:
+        return parse_error_message(e)
     except:
         return None
     return None
 
 
-def send_and_wait_tx_status(tx, pk, gas_strategy, tx_name=""):
-    gas_strategy.fill_initial_gas_fees(tx)
-    while tx['maxPriorityFeePerGas'] < PRIORITY_FEE_PER_GAS_LIMIT:
+# (fenced: a replica which lost the lease never sends, including replacements of txs it sent as leader)
+def send_raw_transaction(raw_tx, tx_name_str=" "):
+    if leader_elector is not None:
+        leader_elector.check_leader()
+    if cmd_args.mainnet:
+        log(f"Sending tx {tx_name_str}to {WEB3_PRIVATE_ENDPOINT} privately...")
+        w3_private.eth.send_raw_transaction(raw_tx)
+        try:
+            log(f"Sending tx {tx_name_str} to backup endpoint...")
+            w3_backup.eth.send_raw_transaction(raw_tx)
+        except Exception as e:
+            log(f"Failed to send tx {tx_name_str} to backup endpoint...")
+    else:
+        log(f"Sending tx {tx_name_str}to mempool...")
+        w3.eth.send_raw_transaction(raw_tx)
+    return w3.toHex(w3.keccak(raw_tx))
+
+
+# ("is_urgent" tx is sent at maximum priority fee rather than not at all, if fees reach it)
+@traced()
+def send_and_wait_tx_status(tx, pk, gas_strategy, inclusion_tracker, tx_name="", bump_interval_blocks=TX_BUMP_INTERVAL_BLOCKS,
+                            is_urgent=False):
+    tx_name_str = f"({tx_name}) " if tx_name else " "
+
+    def send_tx(tx):
         # Sign tx:
         signed_tx = w3.eth.account.sign_transaction(tx, private_key=pk)
-        tx_hash = w3.toHex(w3.keccak(signed_tx.rawTransaction))
-        tx_name_str = f"({tx_name}) " if tx_name else " "
         # Send tx:
-        if cmd_args.mainnet:
-            log(f"Sending tx {tx_name_str}to {WEB3_PRIVATE_ENDPOINT} privately...")
-            w3_private.eth.send_raw_transaction(signed_tx.rawTransaction)
-            try:
-                log(f"Sending tx {tx_name_str} to backup endpoint...")
-                w3_backup.eth.send_raw_transaction(signed_tx.rawTransaction)
-            except Exception as e:
-                log(f"Failed to send tx {tx_name_str} to backup endpoint...")
-        else:
-            log(f"Sending tx {tx_name_str}to mempool...")
-            w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        # Wait tx status:
+        tx_hash = send_raw_transaction(signed_tx.rawTransaction, tx_name_str)
         log(f"Transaction {tx_hash} {tx_name_str}was sent. Waiting for confirmation...")
-        try:
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-            is_ok = receipt["status"] == 1
-            error_message = None
-            if not is_ok:
-                error_message = get_error_message(tx_hash)
-            log(f"Transaction {tx_hash} {tx_name_str}{'succeeded' if is_ok else 'reverted'}")
-            return is_ok, error_message
-        except Exception as e:
-            log(f"Transaction {tx_hash} {tx_name_str}was not included: {e}. Increasing priority fee...")
-            gas_strategy.fill_next_gas_fees(tx)
-    log(f"Reached maximum priority fee. Finishing loop...")
-    return False, None
+        return tx_hash
+
+    nonce_manager = inclusion_tracker.nonce_manager
+    try:
+        # Don't start sending tx if iteration budget is already spent:
+        check_deadline()
+        gas_strategy.fill_initial_gas_fees(tx)
+        # Make sure tx replaces any tx sent earlier with the same nonce:
+        (min_priority_fee_per_gas, min_max_fee_per_gas) = nonce_manager.get_replacement_fees(tx['nonce'])
+        if is_urgent and tx['maxPriorityFeePerGas'] > PRIORITY_FEE_PER_GAS_LIMIT:
+            log(f"Capping priority fee {tx_name_str}at {PRIORITY_FEE_PER_GAS_LIMIT}...")
+            tx['maxFeePerGas'] -= tx['maxPriorityFeePerGas'] - PRIORITY_FEE_PER_GAS_LIMIT
+            tx['maxPriorityFeePerGas'] = PRIORITY_FEE_PER_GAS_LIMIT
+        tx['maxPriorityFeePerGas'] = max(tx['maxPriorityFeePerGas'], min_priority_fee_per_gas)
+        tx['maxFeePerGas'] = max(tx['maxFeePerGas'], min_max_fee_per_gas)
+        if tx['maxPriorityFeePerGas'] >= PRIORITY_FEE_PER_GAS_LIMIT and not is_urgent:
+            log(f"Reached maximum priority fee. Finishing loop...")
+            return False, None
+        # Wait tx status (once sent, tx is followed until resolved regardless of iteration budget,
+        # which is bounded by TX_MAX_PENDING_BLOCKS):
+        with deadline_scope(None):
+            receipt = inclusion_tracker.send_and_track(
+                tx, send_tx, gas_strategy,
+                bump_interval_blocks=bump_interval_blocks,
+                max_pending_blocks=TX_MAX_PENDING_BLOCKS,
+                max_priority_fee_per_gas=PRIORITY_FEE_PER_GAS_LIMIT,
+                tx_name=tx_name,
+            )
+    finally:
+        # Nonce is given back only if tx was never sent:
+        nonce_manager.release(tx['nonce'])
+    with deadline_scope(None):
+        if receipt is None:
+            cancel_tx(tx['nonce'], pk, inclusion_tracker)
+            return False, None
+        tx_hash = w3.toHex(receipt["transactionHash"])
+        is_ok = receipt["status"] == 1
+        GAS_PAID.inc(receipt["gasUsed"] * receipt["effectiveGasPrice"], tx=tx_name)
+        error_message = None
+        if not is_ok:
+            error_message = get_error_message(tx_hash)
+        log(f"Transaction {tx_hash} {tx_name_str}{'succeeded' if is_ok else 'reverted'}")
+        return is_ok, error_message
+
+
+def cancel_tx(nonce, pk, inclusion_tracker):
+    cancel_tx = inclusion_tracker.nonce_manager.build_cancel_tx(nonce, w3.eth.chain_id)
+    if cancel_tx is None:
+        return False
+    log(f"Cancelling pending tx with nonce {nonce}...")
+    # Cancellation is cheap, so allow it to go above priority fee limit:
+    receipt = inclusion_tracker.send_and_track(
+        cancel_tx,
+        lambda tx: send_raw_transaction(w3.eth.account.sign_transaction(tx, private_key=pk).rawTransaction),
+        GasStrategy(initial_max_base_fee_per_gas_ratio=1),
+        bump_interval_blocks=EMERGENCY_TX_BUMP_INTERVAL_BLOCKS,
+        max_pending_blocks=TX_MAX_PENDING_BLOCKS,
+        max_priority_fee_per_gas=2 * PRIORITY_FEE_PER_GAS_LIMIT,
+        tx_name='cancel',
+    )
+    return receipt is not None
 
 
 def now_time():
@@ -141,194 +315,181 @@ def now_time():
     return w3.eth.getBlock('latest').timestamp + 120
 
 
-class GammaFarmBot:
-    def __init__(self, min_epoch_duration, min_period_before_emergency_recover):
-        assert isinstance(min_epoch_duration, timedelta), "min_epoch_duration must be timedelta"
-        assert isinstance(min_period_before_emergency_recover, timedelta), "min_period_before_emergency_recover must be timedelta"
-        self.min_epoch_duration = min_epoch_duration
-        self.min_period_before_emergency_recover = min_period_before_emergency_recover
-        # Initialize contracts:
-        self.gamma_farm = w3.eth.contract(address=GAMMA_FARM_ADDRESS, abi=GAMMA_FARM_ABI)
-        self.lqty = w3.eth.contract(address=LQTY_ADDRESS, abi=ERC20_ABI)
-        # Initialize helpers:
-        self.epoch_trade_helper = EpochTradeHelper(w3)
-        self.liquity_helper = LiquityHelper(w3)
-        self.price_provider = PriceProvider()
-        self.last_emergency_condition_ts = now_time()
-        # Prompt password for keyfile:
-        gamma_farm_owner_address = self.gamma_farm.functions.owner().call()
-        if cmd_args.mainnet:
-            pk = getpass(f"Enter private key for GammaFarm owner account ({gamma_farm_owner_address}):\n")
-        else:
-            pk = "0x6c46d4ed5bb1667797867b00773e7cb52a048dccad5da7338c646c3d91d2b19d"
-        self.gamma_farm_owner = w3.eth.account.privateKeyToAccount(pk)
-        assert self.gamma_farm_owner.address == gamma_farm_owner_address
-
-    def sigint_handler(self, signum, frame):
-        log('Received SIGINT. Terminating...')
-        signal.signal(signum, signal.SIG_IGN)
-        sys.exit(0)
+# Owner account of one or more farms (farms sharing an owner share its nonces and tx tracking)
+class FarmOwner:
+    def __init__(self, account, block_watcher):
+        self.account = account
+        self.nonce_manager = NonceManager(w3, account.address, log=log)
+        self.nonce_manager.sync()
+        block_watcher.add_listener(self.nonce_manager.on_new_block)
+        self.inclusion_tracker = InclusionTracker(w3, block_watcher, self.nonce_manager, log=log)
+
+    @property
+    def address(self):
+        return self.account.address
+
+
+# Farm specific part of the bot: farm contracts, policy and owner actions
+# (chain tracking, Liquity reads, prices and quotes come from the shared "bot")
+class FarmRunner:
+    def __init__(self, bot, address, policy, owner):
+        self.bot = bot
+        self.address = address
+        # (owner txs are built via web3 contract, views are read via fast calls)
+        self.gamma_farm = get_contract(w3, GAMMA_FARM_ABI_PATH, address)
+        self.gamma_farm_view = get_fast_contract(w3, GAMMA_FARM_ABI_PATH, address)
+        self.policy = policy
+        self.owner = owner
 
     # --- GammaFarm methods ---
 
     def start_new_epoch(self):
         # Check current gas price:
-        base_fee_per_gas = w3.eth.getBlock('pending').baseFeePerGas
+        base_fee_per_gas = self.bot.get_next_base_fee()
         if base_fee_per_gas > BASE_FEE_PER_GAS_LIMIT:
             log(f"Base fee is too high: {base_fee_per_gas} > {BASE_FEE_PER_GAS_LIMIT}, skipping...")
             return False, "Base fee is too high"
-        # Build trade data:
-        trade_data = self.build_epoch_trade_data()
-        # Build start new epoch tx:
-        start_new_epoch_func = self.gamma_farm.functions.startNewEpoch(trade_data)
-        tx = start_new_epoch_func.buildTransaction({
-            'from': self.gamma_farm_owner.address,
-            'nonce': w3.eth.getTransactionCount(self.gamma_farm_owner.address),
-            'gas': START_NEW_EPOCH_GAS_LIMIT,
-        })
-        gas_strategy = GasStrategy(
+        # Build start new epoch tx (and check it won't revert):
+        tx, error_msg = self.build_preflighted_trade_tx(
+            lambda trade_data: self.gamma_farm.functions.startNewEpoch(trade_data).buildTransaction({
+                'from': self.owner.address,
+                'gas': START_NEW_EPOCH_GAS_LIMIT,
+            }),
+            tx_name='startNewEpoch',
+        )
+        if tx is None:
+            return False, error_msg
+        tx['nonce'] = self.owner.nonce_manager.reserve()
+        gas_strategy = self.bot.build_gas_strategy(
+            target_probability=0.9,
+            target_blocks=5,
             initial_max_base_fee_per_gas_ratio=0.5,
             initial_max_priority_fee_per_gas=w3.toWei('1', 'gwei')
         )
-        pk = self.gamma_farm_owner.privateKey
-        is_ok, error_msg = send_and_wait_tx_status(tx, pk, gas_strategy, tx_name='startNewEpoch')
+        pk = self.owner.account.privateKey
+        is_ok, error_msg = send_and_wait_tx_status(tx, pk, gas_strategy, self.owner.inclusion_tracker, tx_name='startNewEpoch')
         return is_ok, error_msg
 
     def emergency_withdraw(self):
-        # Build trade data:
-        trade_data = self.build_epoch_trade_data()
-        # Build emergencyWithdraw tx
-        emergency_withdraw_func = self.gamma_farm.functions.emergencyWithdraw(trade_data)
-        tx = emergency_withdraw_func.buildTransaction({
-            'from': self.gamma_farm_owner.address,
-            'nonce': w3.eth.getTransactionCount(self.gamma_farm_owner.address),
-            'gas': EMERGENCY_WITHDRAW_GAS_LIMIT,
-        })
-        gas_strategy = GasStrategy(
+        # Build emergencyWithdraw tx (and check it won't revert):
+        tx, error_msg = self.build_preflighted_trade_tx(
+            lambda trade_data: self.gamma_farm.functions.emergencyWithdraw(trade_data).buildTransaction({
+                'from': self.owner.address,
+                'gas': EMERGENCY_WITHDRAW_GAS_LIMIT,
+            }),
+            tx_name='emergencyWithdraw',
+            wait_for_quiet_pools=False,
+        )
+        if tx is None:
+            return False, error_msg
+        tx['nonce'] = self.owner.nonce_manager.reserve()
+        gas_strategy = self.bot.build_gas_strategy(
+            target_probability=0.99,
+            target_blocks=1,
             initial_max_base_fee_per_gas_ratio=2,
             initial_max_priority_fee_per_gas=w3.toWei('2', 'gwei')
         )
-        pk = self.gamma_farm_owner.privateKey
-        is_ok, error_msg = send_and_wait_tx_status(tx, pk, gas_strategy, tx_name='emergencyWithdraw')
+        pk = self.owner.account.privateKey
+        is_ok, error_msg = send_and_wait_tx_status(
+            tx, pk, gas_strategy, self.owner.inclusion_tracker,
+            tx_name='emergencyWithdraw',
+            bump_interval_blocks=EMERGENCY_TX_BUMP_INTERVAL_BLOCKS,
+            is_urgent=True,
+        )
         return is_ok, error_msg
 
     def emergency_recover(self):
         # Build emergencyRecover tx
         emergency_recover_func = self.gamma_farm.functions.emergencyRecover()
         tx = emergency_recover_func.buildTransaction({
-            'from': self.gamma_farm_owner.address,
-            'nonce': w3.eth.getTransactionCount(self.gamma_farm_owner.address),
+            'from': self.owner.address,
             'gas': EMERGENCY_RECOVER_GAS_LIMIT,
         })
-        gas_strategy = GasStrategy(
+        tx['nonce'] = self.owner.nonce_manager.reserve()
+        gas_strategy = self.bot.build_gas_strategy(
+            target_probability=0.9,
+            target_blocks=5,
             initial_max_base_fee_per_gas_ratio=0.5,
             initial_max_priority_fee_per_gas=w3.toWei('1', 'gwei')
         )
-        pk = self.gamma_farm_owner.privateKey
-        is_ok, error_msg = send_and_wait_tx_status(tx, pk, gas_strategy, tx_name='emergencyRecover')
+        pk = self.owner.account.privateKey
+        is_ok, error_msg = send_and_wait_tx_status(tx, pk, gas_strategy, self.owner.inclusion_tracker, tx_name='emergencyRecover')
         return is_ok, error_msg
 
-    def get_farm_emergency_state(self):
-        return self.gamma_farm.functions.isEmergencyState().call()
-
-    # --- Epoch and emergency tracking helpers ---
+    # Builds tx via "build_tx(trade_data)" and executes it against pending block before it is signed:
+    # - trade data uses the quietest of (almost) equally good paths, if its pools are still likely to be traded
+    #   in the next block, tx is postponed to the next block
+    # - on slippage/trade data errors trade data is rebuilt excluding trade data that failed
+    # - on frontrun protection error it is retried in the next block
+    # - "wait_for_quiet_pools=False" skips postponing on busy pools (urgent txs only wait on an actual revert)
+    # Returns (tx, None) if pre-flight succeeded or (None, error_msg) otherwise
+    def build_preflighted_trade_tx(self, build_tx, tx_name, wait_for_quiet_pools=True):
+        (excluded_trade_data, block_retries) = ([], 0)
+        pool_activity_watcher = self.bot.pool_activity_watcher
+        pool_activity_watcher.update_pending_activity()
+        trade_data = self.build_epoch_trade_data()
+        while True:
+            # Target a block in which trade pools are likely to be quiet:
+            collision_probability = pool_activity_watcher.estimate_trade_data_collision_probability(trade_data, self.gamma_farm_view)
+            if wait_for_quiet_pools and collision_probability > MAX_TRADE_COLLISION_PROBABILITY and block_retries < PREFLIGHT_MAX_BLOCK_RETRIES:
+                block_retries += 1
+                log(f"Trade pools are busy (collision_probability={collision_probability:.2f}), waiting for the next block...")
+                trade_data = self._rebuild_trade_data_in_next_block()
+                continue
+            # Pre-flight:
+            tx = build_tx(trade_data)
+            (action, error_msg) = simulate_tx(w3, tx, 'pending')
+            if action == PREFLIGHT_OK:
+                return tx, None
+            log(f"Pre-flight of {tx_name} failed: {error_msg}")
+            if action == PREFLIGHT_REBUILD_TRADE_DATA and trade_data:
+                excluded_trade_data.append(trade_data)
+                try:
+                    trade_data = self.build_epoch_trade_data(excluded_trade_data)
+                except Exception as e:
+                    log(f"Failed to rebuild trade data: {e}")
+                    return None, error_msg
+                log(f"Retrying {tx_name} with new trade data...")
+            elif action == PREFLIGHT_RETRY_NEXT_BLOCK and block_retries < PREFLIGHT_MAX_BLOCK_RETRIES:
+                block_retries += 1
+                log(f"Retrying {tx_name} in the next block...")
+                trade_data = self._rebuild_trade_data_in_next_block()
+            else:
+                return None, error_msg
+
+    def _rebuild_trade_data_in_next_block(self):
+        self.bot.block_watcher.wait_for_new_blocks(BLOCK_WAIT_TIMEOUT_SECS)
+        self.bot.pool_activity_watcher.update_pending_activity()
+        return self.build_epoch_trade_data()
+
+    # --- Epoch helpers ---
 
     def estimate_gains(self):
-        (eth_gain, lqty_gain) = self.liquity_helper.estimate_gains(GAMMA_FARM_ADDRESS, now_time())
-        eth_gain += w3.eth.getBalance(GAMMA_FARM_ADDRESS)
-        lqty_gain += self.lqty.functions.balanceOf(GAMMA_FARM_ADDRESS).call()
+        (eth_gain, lqty_gain) = self.bot.liquity_helper.estimate_gains(self.address, now_time())
+        eth_gain += w3.eth.getBalance(self.address)
+        lqty_gain += self.bot.lqty.functions.balanceOf(self.address).call()
         return (eth_gain, lqty_gain)
 
-    def build_epoch_trade_data(self):
+    @traced()
+    def build_epoch_trade_data(self, excluded_trade_data=()):
         (eth_gain, lqty_gain) = self.estimate_gains()
         if eth_gain == 0 and lqty_gain == 0:
             return b''
-        mal_burn_pct = self.gamma_farm.functions.malBurnPct().call()
-        trade_data = self.epoch_trade_helper.build_trade_data(eth_gain, lqty_gain, mal_burn_pct)
+        mal_burn_pct = self.gamma_farm_view.functions.malBurnPct().call()
+        trade_data = self.bot.epoch_trade_helper.build_trade_data(eth_gain, lqty_gain, mal_burn_pct, excluded_trade_data)
         return trade_data
 
-    def evaluate_emergency_condition(self):
-        # Signals:
-        eth_price = self.price_provider.get_eth_price()
-        lusd_price = self.price_provider.get_lusd_price()
-        (undercoll_eth_price, oracle_last_eth_price, last_lowest_ICR, last_TCR, new_lowest_ICR, new_TCR) = \
-            self.liquity_helper.calculate_emergency_signals(eth_price)
-        # For a given ETH price, define emergency condition as true, if:
-        # - price puts system in recovery mode (TCR < CCR) or creates undercoll troves (ICR < MCR)
-        # - LUSD price is at least LUSD_MIN_EMERGENCY_PRICE (1.02)
-        is_emergency_oracle_price = (last_lowest_ICR < MCR or last_TCR < CCR)
-        is_emergency_new_price = (new_lowest_ICR < MCR or new_TCR < CCR) and lusd_price >= LUSD_MIN_EMERGENCY_PRICE
-        log(f"Emergency evaluation: " + \
-            f"is_emergency_oracle={is_emergency_oracle_price}, is_emergency_new={is_emergency_new_price} | " + \
-            f"lusd=${lusd_price}, liquidation_eth=${undercoll_eth_price}, " + \
-            f"oracle_last_eth=${oracle_last_eth_price}, coinbase_eth=${eth_price}, " + \
-            f"last_TCR={last_TCR}, new_TCR={new_TCR}, last_min_ICR={last_lowest_ICR}, new_min_ICR={new_lowest_ICR}")
-        return (is_emergency_oracle_price, is_emergency_new_price)
-
-    # --- Trigger methods for GammaFarm actions ---
-
-    def should_emergency_withdraw(self):
-        (is_emergency_oracle_price, is_emergency_new_price) = self.evaluate_emergency_condition()
-        if is_emergency_oracle_price or is_emergency_new_price:
-            self.last_emergency_condition_ts = now_time()
-        # Decision: withdraw, if:
-        # - system is not in emergency condition as of last oracle price
-        # - system is in emergency condition as of new price
-        should_withdraw = not is_emergency_oracle_price and is_emergency_new_price
-        log(f"Should emergency withdraw: {'YES' if should_withdraw else 'NO'}")
-        return should_withdraw
-
-    def should_emergency_recover(self):
-        (is_emergency_oracle_price, is_emergency_new_price) = self.evaluate_emergency_condition()
-        if is_emergency_oracle_price or is_emergency_new_price:
-            self.last_emergency_condition_ts = now_time()
-        # Decision: recover, if:
-        # - system is not in emergency condition for the last "min_period_before_emergency_recover"
-        seconds_since_last_emergency = now_time() - self.last_emergency_condition_ts
-        should_recover = seconds_since_last_emergency >= self.min_period_before_emergency_recover.total_seconds()
-        log(f"Should emergency recover: {'YES' if should_recover else 'NO'}")
-        return should_recover
-
-    def should_start_new_epoch(self):
-        # Check time since start of current epoch:
-        epoch_start_time = self.gamma_farm.functions.epochStartTime().call()
-        epoch_duration_secs = now_time() - epoch_start_time
-        if epoch_duration_secs < self.min_epoch_duration.total_seconds():
-            log(f"Too early for new epoch (elapsed={epoch_duration_secs}s), skipping...")
-            return False
-        # Check whether there are funds:
-        (total_lusd, _) = self.gamma_farm.functions.getTotalBalances().call()
-        if total_lusd == 0:
-            log("No funds in contract, skipping...")
-            return False
-        return True
+    # --- Owner action ---
 
-    # --- Single run iteration and main run loop ---
-
-    def run_iteration(self):
-        # Get current contract emergency state:
-        farm_emergency_state = self.get_farm_emergency_state()
-        log(f"Farm is {'' if farm_emergency_state else 'not '}in emergency state.")
-
-        # Check if should flip emergency state:
-        (should_recover, should_withdraw) = (False, False)
-        if farm_emergency_state:
-            should_recover = self.should_emergency_recover()
-        else:
-            should_withdraw = self.should_emergency_withdraw()
-
-        # If needed, perform emergency withdraw or recovery:
-        if should_recover:
+    @traced()
+    def perform_action(self, action):
+        if action == ACTION_EMERGENCY_RECOVER:
             self.emergency_recover()
-        elif should_withdraw:
+            return
+        elif action == ACTION_EMERGENCY_WITHDRAW:
             self.emergency_withdraw()
-
-        # Don't start new epoch during emergency or if emergency action taken:
-        if farm_emergency_state or (should_recover or should_withdraw):
             return
-
-        log(f"Checking if it's time for new epoch...")
-        if not self.should_start_new_epoch():
+        elif action != ACTION_START_NEW_EPOCH:
             return
         # Start new epoch:
         is_ok, error_msg = self.start_new_epoch()
@@ -336,32 +497,357 @@ class GammaFarmBot:
             log(f"New epoch has started!")
         else:
             log(f"Failed to start new epoch: {error_msg}")
-            if "frontrun protection" in error_msg:
-                sleep_mins = random.randint(10, 60)
-                log(f"Sleeping for {sleep_mins} mins...")
-                time.sleep(sleep_mins * 60)
+            if error_msg and "frontrun protection" in error_msg:
+                log(f"Waiting for {FRONTRUN_BACKOFF_BLOCKS} blocks before retrying...")
+                for _ in range(FRONTRUN_BACKOFF_BLOCKS):
+                    self.bot.block_watcher.wait_for_new_blocks(BLOCK_WAIT_TIMEOUT_SECS)
 
 
-    def run(self, loop_interval):
+# Manages one or more GammaFarm deployments in a single loop: connections, block tracking, Liquity reads,
+# prices, quotes and emergency evaluation are shared, so each additional farm only adds its own state reads
+class GammaFarmBot:
+    def __init__(self, farm_addresses, min_epoch_duration, min_period_before_emergency_recover):
+        assert isinstance(min_epoch_duration, timedelta), "min_epoch_duration must be timedelta"
+        assert isinstance(min_period_before_emergency_recover, timedelta), "min_period_before_emergency_recover must be timedelta"
+        # Initialize shared contracts:
+        self.lqty = get_fast_contract(w3, "ERC20", LQTY_ADDRESS)
+        # Initialize block tracking:
+        self.block_watcher = BlockWatcher(w3, log=log)
+        self.block_watcher.add_listener(lambda block: logger.set_context(block=block.number))
+        self.fee_history = FeeHistory(w3)
+        self.block_watcher.add_listener(self.fee_history.on_new_block)
+        self.pool_activity_watcher = PoolActivityWatcher(w3)
+        self.block_watcher.add_listener(self.pool_activity_watcher.on_new_block)
+        # Initialize helpers:
+        self.epoch_trade_helper = EpochTradeHelper(w3, self.pool_activity_watcher)
+        self.block_watcher.add_listener(self.epoch_trade_helper.uniswap_quoter.on_new_block)
+        self.liquity_helper = LiquityHelper(w3)
+        self.price_provider = PriceProvider()
+        self.cadence = MonitoringCadence()
+        self.emergency_evaluator = EmergencyEvaluator(
+            self.liquity_helper, self.price_provider, self.cadence, log=log, on_emergency_signals=set_emergency_signals,
+        )
+        self.pinned_read_hits = 0
+        self.pinned_read_misses = 0
+        # Replica state (standby keeps running decisions to stay warm, see run_iteration):
+        self.wakeup = threading.Event()
+        self.is_taken_over = False  # whether nonces were taken over in current leadership (see take_over_if_needed)
+        # Initialize farms (and their owners):
+        self.owners = {}  # owner address -> FarmOwner
+        self.farms = []
+        for address in farm_addresses:
+            logger.set_context(farm=address)
+            gamma_farm_view = get_fast_contract(w3, GAMMA_FARM_ABI_PATH, address)
+            owner = self.get_owner(gamma_farm_view.functions.owner().call())
+            policy = FarmPolicy(
+                gamma_farm_view, self.liquity_helper, self.price_provider, self.cadence, now_time,
+                min_epoch_duration, min_period_before_emergency_recover, log=log, emergency_evaluator=self.emergency_evaluator,
+            )
+            self.farms.append(FarmRunner(self, address, policy, owner))
+        logger.set_context(farm=None)
+        # Warm up from checkpoint (not for benchmark/recording/replay runs):
+        self.checkpointer = None
+        if not (cmd_args.no_checkpoint or cmd_args.bench or cmd_args.record or cmd_args.replay):
+            components = {
+                'cadence': self.cadence, 'price_provider': self.price_provider, 'block_watcher': self.block_watcher,
+                'fee_history': self.fee_history, 'pool_activity_watcher': self.pool_activity_watcher,
+            }
+            for farm in self.farms:
+                components[f'policy:{farm.address}'] = farm.policy
+            for owner in self.owners.values():
+                components[f'nonce_manager:{owner.address}'] = owner.nonce_manager
+            self.checkpointer = Checkpointer(
+                CHECKPOINT_PATH,
+                identity={
+                    'chain_id': w3.eth.chain_id,
+                    'gamma_farms': {farm.address: farm.owner.address for farm in self.farms},
+                },
+                components=components,
+                interval_secs=CHECKPOINT_INTERVAL_SECS,
+                max_age_secs=CHECKPOINT_MAX_AGE_SECS,
+                log=log,
+            )
+            restored = self.checkpointer.restore(get_stale=self.get_stale_checkpoint_components)
+            if restored:
+                log(f"Restored from checkpoint: {', '.join(restored)}")
+        # Initialize metrics:
+        self.last_block_ts = None
+        self.block_watcher.add_listener(self.on_new_block)
+        metrics.add_collector(self.collect_metrics)
+
+    # Returns owner of given address (prompts for its key on first use)
+    def get_owner(self, owner_address):
+        owner = self.owners.get(owner_address)
+        if owner is None:
+            if cmd_args.mainnet:
+                pk = getpass(f"Enter private key for GammaFarm owner account ({owner_address}):\n")
+            else:
+                pk = "0x6c46d4ed5bb1667797867b00773e7cb52a048dccad5da7338c646c3d91d2b19d"
+            account = w3.eth.account.privateKeyToAccount(pk)
+            assert account.address == owner_address
+            owner = self.owners[owner_address] = FarmOwner(account, self.block_watcher)
+        return owner
+
+    def on_new_block(self, block):
+        self.last_block_ts = time.time()
+        LAST_BLOCK_NUMBER.set(block.number)
+
+    # Metrics collector (called from metrics server thread on each scrape)
+    def collect_metrics(self):
+        now_ts = time.time()
+        if self.last_block_ts is not None:
+            SECONDS_SINCE_LAST_BLOCK.set(now_ts - self.last_block_ts)
+        if self.price_provider.lusd_price_ts is not None:
+            PRICE_STALENESS.set(now_ts - self.price_provider.lusd_price_ts, price="lusd")
+        if self.price_provider.eth_price_ts is not None:
+            PRICE_STALENESS.set(now_ts - self.price_provider.eth_price_ts, price="eth")
+        CACHE_HITS.set(self.price_provider.cache_hits, cache="lusd_price")
+        CACHE_MISSES.set(self.price_provider.cache_misses, cache="lusd_price")
+        uniswap_quoter = self.epoch_trade_helper.uniswap_quoter
+        CACHE_HITS.set(uniswap_quoter.cache_hits, cache="quotes")
+        CACHE_MISSES.set(uniswap_quoter.cache_misses, cache="quotes")
+        IS_LEADER.set(int(is_leader()))
+        CACHE_HITS.set(self.pinned_read_hits, cache="pinned_reads")
+        CACHE_MISSES.set(self.pinned_read_misses, cache="pinned_reads")
+        for owner in self.owners.values():
+            PENDING_TX_AGE.set(owner.nonce_manager.get_oldest_pending_tx_age() or 0, owner=owner.address)
+
+    # --- Checkpoint helpers ---
+
+    # Block based state is stale if checkpointed block is no longer canonical (e.g. after reorg or fork reset)
+    def get_stale_checkpoint_components(self, states):
+        block = states.get('block_watcher')
+        if block is None:
+            return ()
+        try:
+            if w3.toHex(w3.eth.get_block(block['number']).hash) == block['hash']:
+                return ()
+        except BlockNotFound:
+            pass
+        log(f"Checkpointed block {block['number']} is not canonical, skipping block based state...")
+        return ('block_watcher', 'fee_history', 'pool_activity_watcher')
+
+    def save_checkpoint(self, force=False):
+        if self.checkpointer is None:
+            return
+        try:
+            self.checkpointer.save(force)
+        except Exception as e:
+            log(f"Failed to save checkpoint: {e}")
+
+    def sigint_handler(self, signum, frame):
+        log('Received SIGINT. Terminating...')
+        signal.signal(signum, signal.SIG_IGN)
+        # Hand lease over to a standby right away:
+        if leader_elector is not None:
+            leader_elector.stop()
+        self.save_checkpoint(force=True)
+        logger.close()
+        sys.exit(0)
+
+    # Debug command (`kill -USR1 <pid>`): logs RPC metrics since start and dumps them to RPC_METRICS_PATH
+    def sigusr1_handler(self, signum, frame):
+        log("RPC metrics since start:")
+        for line in format_metrics_summary(rpc_metrics.get_total()):
+            log(line)
+        with open(RPC_METRICS_PATH + ".tmp", 'w') as f:
+            json.dump(rpc_metrics.to_dict(), f, indent=2)
+        os.replace(RPC_METRICS_PATH + ".tmp", RPC_METRICS_PATH)
+
+    # --- Replica helpers ---
+
+    # Called from leader elector thread
+    def on_leadership_change(self, is_leader):
+        IS_LEADER.set(int(is_leader))
+        self.is_taken_over = False
+        if is_leader:
+            self.wakeup.set()
+
+    # New leader takes over nonces of txs the previous leader may have left pending
+    def take_over(self):
+        log("Taking over as leader...")
+        for owner in self.owners.values():
+            owner.nonce_manager.sync()
+
+    # Takes over once per leadership, as soon as lease is seen held (also when it was gained in the middle
+    # of an iteration, or before "on_leadership_change" was called; taking over twice is harmless)
+    def take_over_if_needed(self):
+        if leader_elector is None or self.is_taken_over or not is_leader():
+            return
+        self.is_taken_over = True
+        self.take_over()
+
+    # --- Gas helpers ---
+
+    # Uses fee history window if available (kept up to date by block watcher), otherwise falls back to fixed ratios
+    # (initial priority fee is the floor of fee history estimates, PRIORITY_FEE_PER_GAS_LIMIT is their cap)
+    def build_gas_strategy(self, target_probability, target_blocks, initial_max_base_fee_per_gas_ratio, initial_max_priority_fee_per_gas):
+        if self.fee_history.is_loaded():
+            return FeeHistoryGasStrategy(
+                self.fee_history, target_probability, target_blocks,
+                min_priority_fee_per_gas=initial_max_priority_fee_per_gas, max_priority_fee_per_gas=PRIORITY_FEE_PER_GAS_LIMIT,
+            )
+        return GasStrategy(initial_max_base_fee_per_gas_ratio, initial_max_priority_fee_per_gas)
+
+    def get_next_base_fee(self):
+        if self.fee_history.is_loaded():
+            return self.fee_history.next_base_fee
+        return w3.eth.getBlock('pending').baseFeePerGas
+
+    # --- Single run iteration and main run loop ---
+
+    # Decides actions of all farms against the last seen block (shared reads are made once, see EmergencyEvaluator),
+    # then performs them (emergency withdrawals first), a failing farm doesn't stop the others
+    # (standby replica does everything but performing actions, so its state is as warm as leader's)
+    @traced()
+    def run_iteration(self):
+        self.take_over_if_needed()
+        # Catch up with new blocks (updates fee history window):
+        self.block_watcher.poll()
+
+        # Decide owner actions:
+        actions = []
+        with pinned_reads_scope(self.block_watcher.last_block_number) as pinned_reads:
+            for farm in self.farms:
+                logger.set_context(farm=farm.address)
+                action = self.run_farm_step(farm, farm.policy.decide_action)
+                if action is not None:
+                    actions.append((farm, action))
+        if pinned_reads is not None:
+            self.pinned_read_hits += pinned_reads.hits
+            self.pinned_read_misses += pinned_reads.misses
+        if not is_leader():
+            for (farm, action) in actions:
+                log(f"Standby replica, leaving {action} of {farm.address} to leader")
+            return
+        # (lease may have been gained while deciding)
+        self.take_over_if_needed()
+        # Perform owner actions (emergency actions are not bound by iteration budget, see get_action_deadline):
+        actions.sort(key=lambda farm_action: farm_action[1] != ACTION_EMERGENCY_WITHDRAW)
+        iteration_deadline = get_deadline()
+        for (farm, action) in actions:
+            logger.set_context(farm=farm.address)
+            with deadline_scope(get_action_deadline(action, iteration_deadline)):
+                self.run_farm_step(farm, lambda: farm.perform_action(action))
+        logger.set_context(farm=None)
+
+    # (single farm keeps failing the whole iteration as before)
+    def run_farm_step(self, farm, step):
+        if len(self.farms) == 1:
+            return step()
+        try:
+            return step()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            FARM_ERRORS.inc(farm=farm.address)
+            log(f"Exception caught for farm {farm.address}: {e}")
+            log(traceback.format_exc())
+            return None
+
+    # Iterations are spaced by monitoring cadence: every block when close to emergency, up to "max_loop_interval" otherwise
+    def run(self, max_loop_interval):
+        global leader_elector
         if not cmd_args.mainnet:
             log("Running in development mode... (for mainnet use --mainnet flag)")
         signal.signal(signal.SIGINT, self.sigint_handler)
-        assert isinstance(loop_interval, timedelta), "loop_interval must be timedelta"
+        signal.signal(signal.SIGUSR1, self.sigusr1_handler)
+        metrics_server = MetricsServer(metrics, cmd_args.metrics_host, cmd_args.metrics_port).start()
+        log(f"Serving metrics on http://{cmd_args.metrics_host}:{metrics_server.port}/metrics")
+        if cmd_args.lease_file:
+            leader_elector = LeaderElector(
+                FileLeaseStore(cmd_args.lease_file), get_default_holder_id(cmd_args.replica),
+                on_change=self.on_leadership_change, log=log,
+            ).start()
+            log(f"Running as replica {leader_elector.holder} ({'leader' if is_leader() else 'standby'})")
+        assert isinstance(max_loop_interval, timedelta), "max_loop_interval must be timedelta"
+        self.cadence.max_interval_secs = max_loop_interval.total_seconds()
+        iteration_id = 0
         while True:
+            iteration_id += 1
+            logger.set_context(iteration=iteration_id)
+            iteration_start_ts = time.perf_counter()
+            tracer.start_trace()
             try:
                 log("="*40)
                 log("Starting new iteration...")
-                self.run_iteration()
+                with deadline_scope(Deadline(ITERATION_BUDGET_SECS)):
+                    self.run_iteration()
+            except DeadlineExceeded as e:
+                ITERATION_ERRORS.inc()
+                log(f"Iteration was cancelled: {e}")
             except Exception as e:
+                ITERATION_ERRORS.inc()
                 log(f"Exception caught in run loop: {e}")
                 log(traceback.format_exc())
-            log(f"Iteration finished. Sleeping for {loop_interval.total_seconds()} seconds...")
-            time.sleep(loop_interval.total_seconds())
+            if tracer.finish_trace():
+                tracer.export(TRACE_PATH)
+            ITERATIONS.inc()
+            ITERATION_DURATION.set(time.perf_counter() - iteration_start_ts)
+            for line in format_metrics_summary(rpc_metrics.finish_iteration()):
+                log("RPC", line)
+            self.save_checkpoint()
+            self.wait_for_next_iteration()
+
+    # Runs "num_iterations" iterations back to back, reports iteration time percentiles and call counts
+    def bench(self, num_iterations):
+        api_calls = Counter()
+        price_provider.SESSION.hooks['response'].append(lambda r, *args, **kwargs: api_calls.update(['api']))
+        (iteration_secs, rpc_calls, iteration_api_calls) = ([], [], [])
+        for iteration_id in range(1, num_iterations + 1):
+            logger.set_context(iteration=iteration_id)
+            if cmd_args.replay:
+                call_store.rewind()
+            api_calls.clear()
+            iteration_start_ts = time.perf_counter()
+            try:
+                with deadline_scope(Deadline(ITERATION_BUDGET_SECS)):
+                    self.run_iteration()
+            except Exception as e:
+                log(f"Exception caught in bench iteration: {e}")
+            iteration_secs.append(time.perf_counter() - iteration_start_ts)
+            rpc_calls.append(sum(m.latency_us.count for m in rpc_metrics.finish_iteration().values()))
+            iteration_api_calls.append(api_calls['api'])
+        log(f"Bench: iterations={num_iterations}, " + \
+            f"p50={get_percentile(iteration_secs, 50)*1000:.1f}ms, p99={get_percentile(iteration_secs, 99)*1000:.1f}ms, " + \
+            f"max={max(iteration_secs)*1000:.1f}ms, rpc_calls/iteration={sum(rpc_calls)/num_iterations:.1f}, " + \
+            f"api_calls/iteration={sum(iteration_api_calls)/num_iterations:.1f}")
+        for line in format_metrics_summary(rpc_metrics.get_total()):
+            log("Bench RPC", line)
+        if cmd_args.replay and call_store.misses:
+            log(f"Bench: calls missing from recording: {dict(call_store.misses)}")
+
+    def wait_for_next_iteration(self):
+        if self.cadence.is_close_to_emergency():
+            log(f"Iteration finished. Close to emergency (distance={self.cadence.distance_to_emergency:.4f}), waiting for the next block...")
+            try:
+                if self.block_watcher.wait_for_new_blocks(BLOCK_WAIT_TIMEOUT_SECS):
+                    return
+            except Exception as e:
+                log(f"Failed to wait for the next block: {e}")
+            self.sleep(self.cadence.min_interval_secs)
+            return
+        interval_secs = self.cadence.get_next_interval_secs()
+        log(f"Iteration finished. Sleeping for {interval_secs:.0f} seconds...")
+        self.sleep(interval_secs)
+
+    # Sleep is cut short when replica becomes leader (standby may be sleeping for up to "max_loop_interval")
+    def sleep(self, secs):
+        self.wakeup.wait(secs)
+        self.wakeup.clear()
 
 
 if __name__ == '__main__':
     gamma_farm_bot = GammaFarmBot(
+        farm_addresses=GAMMA_FARM_ADDRESSES,
         min_epoch_duration=timedelta(days=2),
         min_period_before_emergency_recover=timedelta(hours=6),
     )
-    gamma_farm_bot.run(loop_interval=timedelta(minutes=1))
+    if cmd_args.bench or cmd_args.record:
+        gamma_farm_bot.bench(cmd_args.bench or 1)
+        if cmd_args.record:
+            call_store.save(cmd_args.record)
+            log(f"Recorded calls saved to {cmd_args.record}")
+        logger.close()
+    else:
+        gamma_farm_bot.run(max_loop_interval=timedelta(minutes=1))
@@ -0,0 +1,85 @@
+from web3.exceptions import TransactionNotFound
+
+BLOCK_WAIT_TIMEOUT_SECS = 60
+
+
+class InclusionTracker:
+    def __init__(self, w3, block_watcher, nonce_manager, log=print):
+        self.w3 = w3
+        self.block_watcher = block_watcher
+        self.nonce_manager = nonce_manager
+        self.log = log
+
+    # Sends "tx" using "send_tx(tx) -> tx_hash" and watches new blocks until tx (or any of its replacements) is included:
+    # - while tx is pending, fees are re-priced via "gas_strategy" every "bump_interval_blocks" blocks
+    #   (priority fee is capped by "max_priority_fee_per_gas": the last replacement is clamped to it, if it still
+    #   outbids pending tx by replacement bump, and fees are not bumped any further)
+    # - resolves as soon as account nonce moves past tx nonce (as reconciled by nonce manager on new blocks)
+    # Returns receipt of the included tx, or None if nonce was used by unknown tx or tx was pending for "max_pending_blocks"
+    # (only blocks actually observed count, but "max_pending_blocks" waits in a row without new blocks give up as well)
+    def send_and_track(self, tx, send_tx, gas_strategy, bump_interval_blocks, max_pending_blocks, max_priority_fee_per_gas, tx_name=""):
+        tx_name_str = f"({tx_name}) " if tx_name else ""
+        sent_tx_hashes = [self._send_tx(tx, send_tx)]
+        (pending_blocks, blocks_since_bump, empty_waits, is_fee_capped) = (0, 0, 0, False)
+        while pending_blocks < max_pending_blocks:
+            new_blocks = self.block_watcher.wait_for_new_blocks(BLOCK_WAIT_TIMEOUT_SECS)
+            if not new_blocks:
+                empty_waits += 1
+                if empty_waits >= max_pending_blocks:
+                    self.log(f"No new blocks for {empty_waits} waits while transaction {sent_tx_hashes[-1]} {tx_name_str}is pending")
+                    return None
+                continue
+            empty_waits = 0
+            # Check whether any of sent txs was included in new blocks:
+            for block in new_blocks:
+                included_tx_hash = self._find_sent_tx_hash(block, sent_tx_hashes)
+                if included_tx_hash is not None:
+                    return self.w3.eth.get_transaction_receipt(included_tx_hash)
+            # Check whether nonce was used (e.g. block was missed or tx was replaced):
+            if self.nonce_manager.is_used(tx['nonce']):
+                receipt = self._find_sent_tx_receipt(sent_tx_hashes)
+                if receipt is None:
+                    self.log(f"Nonce {tx['nonce']} {tx_name_str}was used by unknown transaction")
+                return receipt
+            # Re-price tx if it is still pending:
+            pending_blocks += len(new_blocks)
+            blocks_since_bump += len(new_blocks)
+            if is_fee_capped or blocks_since_bump < bump_interval_blocks:
+                continue
+            blocks_since_bump = 0
+            next_tx = dict(tx)
+            gas_strategy.fill_next_gas_fees(next_tx)
+            if next_tx['maxPriorityFeePerGas'] >= max_priority_fee_per_gas:
+                is_fee_capped = True
+                next_tx['maxPriorityFeePerGas'] = max_priority_fee_per_gas
+                (min_priority_fee_per_gas, min_max_fee_per_gas) = self.nonce_manager.get_replacement_fees(tx['nonce'])
+                if next_tx['maxPriorityFeePerGas'] < min_priority_fee_per_gas or next_tx['maxFeePerGas'] < min_max_fee_per_gas:
+                    continue
+            self.log(f"Transaction {sent_tx_hashes[-1]} {tx_name_str}is pending for {pending_blocks} blocks. Increasing priority fee...")
+            tx.update(next_tx)
+            try:
+                sent_tx_hashes.append(self._send_tx(tx, send_tx))
+            except Exception as e:
+                self.log(f"Failed to send replacement tx {tx_name_str}: {e}")
+        self.log(f"Transaction {sent_tx_hashes[-1]} {tx_name_str}was not included within {max_pending_blocks} blocks")
+        return None
+
+    def _send_tx(self, tx, send_tx):
+        tx_hash = send_tx(tx)
+        self.nonce_manager.mark_sent(tx, tx_hash)
+        return tx_hash
+
+    def _find_sent_tx_hash(self, block, sent_tx_hashes):
+        block_tx_hashes = set(self.w3.toHex(tx_hash) for tx_hash in block.transactions)
+        for tx_hash in sent_tx_hashes:
+            if tx_hash in block_tx_hashes:
+                return tx_hash
+        return None
+
+    def _find_sent_tx_receipt(self, sent_tx_hashes):
+        for tx_hash in reversed(sent_tx_hashes):
+            try:
+                return self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
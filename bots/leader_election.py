@@ -0,0 +1,179 @@
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+
+LEASE_SECS = 5
+RENEW_INTERVAL_SECS = 1
+
+
+class NotLeader(Exception):
+    pass
+
+
+def get_default_holder_id(name=None):
+    return f"{socket.gethostname()}:{name or os.getpid()}"
+
+
+# Lease store backed by a local file: read-modify-write is serialized by an exclusive flock on "<path>.lock"
+# (replicas must share the host, or a filesystem with working flock)
+class FileLeaseStore:
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+
+    # Acquires lease for "holder" (or renews it if "holder" already holds it) unless another holder's lease is live,
+    # returns whether "holder" holds the lease for the next "lease_secs"
+    def try_acquire(self, holder, lease_secs):
+        with open(self.path + ".lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                lease = self._read()
+                now_ts = self.clock()
+                if lease is not None and lease['holder'] != holder and lease['expires_ts'] > now_ts:
+                    return False
+                self._write({'holder': holder, 'expires_ts': now_ts + lease_secs})
+                return True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def release(self, holder):
+        with open(self.path + ".lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                lease = self._read()
+                if lease is not None and lease['holder'] == holder:
+                    os.remove(self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Returns holder of live lease (None if lease is free)
+    def get_holder(self):
+        lease = self._read()
+        if lease is None or lease['expires_ts'] <= self.clock():
+            return None
+        return lease['holder']
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, lease):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(lease, f)
+        os.replace(tmp_path, self.path)
+
+
+# In-process key-value stand-in for FileLeaseStore (tests and simulations, "clock" may be simulated)
+class MemoryLeaseStore:
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.lease = None  # (holder, expires_ts)
+
+    def try_acquire(self, holder, lease_secs):
+        with self.lock:
+            now_ts = self.clock()
+            if self.lease is not None and self.lease[0] != holder and self.lease[1] > now_ts:
+                return False
+            self.lease = (holder, now_ts + lease_secs)
+            return True
+
+    def release(self, holder):
+        with self.lock:
+            if self.lease is not None and self.lease[0] == holder:
+                self.lease = None
+
+    def get_holder(self):
+        with self.lock:
+            if self.lease is None or self.lease[1] <= self.clock():
+                return None
+            return self.lease[0]
+
+
+# Keeps trying to hold the lease in "store" for "holder":
+# - leader renews lease every "renew_interval_secs" (from a background thread, so that long waits in run loop,
+#   e.g. for tx inclusion, don't let lease lapse), standbys try to take it over as often
+# - leader counts itself leader only until its last successful renewal plus "lease_secs" (minus one renew interval
+#   for clock skew), so it steps down before any standby can take over even if the store becomes unreachable
+# - "on_change(is_leader)" is called (from renewal thread) whenever leadership changes
+class LeaderElector:
+    def __init__(self, store, holder, lease_secs=LEASE_SECS, renew_interval_secs=RENEW_INTERVAL_SECS,
+                 on_change=None, clock=time.monotonic, log=print):
+        assert renew_interval_secs * 2 < lease_secs, "lease must outlive at least two renewals"
+        self.store = store
+        self.holder = holder
+        self.lease_secs = lease_secs
+        self.renew_interval_secs = renew_interval_secs
+        self.on_change = on_change
+        self.clock = clock
+        self.log = log
+        self.lock = threading.Lock()
+        self.valid_until = None  # local (monotonic) time until which lease is held
+        self.was_leader = False
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def is_leader(self):
+        with self.lock:
+            return self.valid_until is not None and self.clock() < self.valid_until
+
+    # Raises NotLeader unless lease is held (fencing check right before an action only leader may take)
+    def check_leader(self):
+        if not self.is_leader():
+            raise NotLeader(f"{self.holder} does not hold the lease (holder: {self.store.get_holder()})")
+
+    # Single acquire/renew attempt, returns whether lease is held
+    def renew(self):
+        attempt_ts = self.clock()
+        try:
+            is_acquired = self.store.try_acquire(self.holder, self.lease_secs)
+        except Exception as e:
+            # (lease held so far stays valid until it runs out)
+            self.log(f"Failed to renew lease: {e}")
+            is_acquired = None
+        with self.lock:
+            if is_acquired:
+                self.valid_until = attempt_ts + self.lease_secs - self.renew_interval_secs
+            elif is_acquired is not None:
+                self.valid_until = None
+            is_leader = self.valid_until is not None and self.clock() < self.valid_until
+        self._notify(is_leader)
+        return is_leader
+
+    def _notify(self, is_leader):
+        if is_leader == self.was_leader:
+            return
+        self.was_leader = is_leader
+        self.log(f"{self.holder} is {'now the leader' if is_leader else 'no longer the leader'}")
+        if self.on_change is not None:
+            self.on_change(is_leader)
+
+    def start(self):
+        self.renew()
+        self.thread = threading.Thread(target=self._run, name="LeaderElector", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.renew_interval_secs):
+            self.renew()
+
+    # Stops renewing and gives lease up (so that a standby takes over without waiting for lease to expire)
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            self.valid_until = None
+        try:
+            self.store.release(self.holder)
+        except Exception as e:
+            self.log(f"Failed to release lease: {e}")
+        self._notify(False)
@@ -1,32 +1,29 @@
-import json
 import time
 from web3 import Web3
 
+from dec_math import dec_pow
+from fast_call import get_fast_contract
+
 COMMUNITY_ISSUANCE_ADDRESS = "0xD8c9D9071123a059C6E0A945cF0e0c82b508d816"
 LUSD_STABILITY_POOL_ADDRESS = "0x66017D22b0f8556afDd19FC67041899Eb65a21bb"
 PRICE_FEED_ADDRESS = "0x4c517D4e2C851CA76d7eC94B805269Df0f2201De"
 SORTED_TROVES_ADDRESS = "0x8FdD3fbFEb32b28fb73555518f8b361bCeA741A6"
 TROVE_MANAGER_ADDRESS = "0xA39739EF8b0231DbFA0DcdA07d7e29faAbCf4bb2"
 
-COMMUNITY_ISSUANCE_ABI = json.loads(open(f"abi/CommunityIssuance.json", "r").read())
-LUSD_STABILITY_POOL_ABI = json.loads(open(f"abi/LUSDStabilityPool.json", "r").read())
-PRICE_FEED_ABI = json.loads(open(f"abi/PriceFeed.json", "r").read())
-SORTED_TROVES_ABI = json.loads(open(f"abi/SortedTroves.json", "r").read())
-TROVE_MANAGER_ABI = json.loads(open(f"abi/TroveManager.json", "r").read())
-
 MCR = 1.1  # Minimum Collateral Ratio
 CCR = 1.5  # Critical Collateral Ratio
+LIQUITY_DEC_POW_MAX_MINUTES = 525600000  # 1000 years
 
 
 class LiquityHelper:
     def __init__(self, w3):
         self.w3 = w3
-        # Initialize contracts:
-        self.lqty_comm_issuance = w3.eth.contract(address=COMMUNITY_ISSUANCE_ADDRESS, abi=COMMUNITY_ISSUANCE_ABI)
-        self.lusd_stability_pool = w3.eth.contract(address=LUSD_STABILITY_POOL_ADDRESS, abi=LUSD_STABILITY_POOL_ABI)
-        self.price_feed = w3.eth.contract(address=PRICE_FEED_ADDRESS, abi=PRICE_FEED_ABI)
-        self.sorted_troves = w3.eth.contract(address=SORTED_TROVES_ADDRESS, abi=SORTED_TROVES_ABI)
-        self.trove_manager = w3.eth.contract(address=TROVE_MANAGER_ADDRESS, abi=TROVE_MANAGER_ABI)
+        # Initialize contracts (helper only reads, so all calls take the fast path):
+        self.lqty_comm_issuance = get_fast_contract(w3, "CommunityIssuance", COMMUNITY_ISSUANCE_ADDRESS)
+        self.lusd_stability_pool = get_fast_contract(w3, "LUSDStabilityPool", LUSD_STABILITY_POOL_ADDRESS)
+        self.price_feed = get_fast_contract(w3, "PriceFeed", PRICE_FEED_ADDRESS)
+        self.sorted_troves = get_fast_contract(w3, "SortedTroves", SORTED_TROVES_ADDRESS)
+        self.trove_manager = get_fast_contract(w3, "TroveManager", TROVE_MANAGER_ADDRESS)
 
     def get_price_feed_last_good_price(self):
         return self.price_feed.functions.lastGoodPrice().call() / 1e18
@@ -91,7 +88,8 @@ class LiquityHelper:
         # 1. issueLQTY():
         now_ts = now_ts or int(time.time())
         mins = (now_ts - LQTY_ISSUANCE_DEPLOYMENT_TIME) // 60
-        cum_fr = 10**18 - self._dec_pow(LQTY_ISSUANCE_FACTOR, mins)
+        # (LiquityMath._decPow caps minutes to avoid overflow)
+        cum_fr = 10**18 - dec_pow(LQTY_ISSUANCE_FACTOR, min(mins, LIQUITY_DEC_POW_MAX_MINUTES))
         total_lqty_issued = self.lqty_comm_issuance.functions.totalLQTYIssued().call()
         new_total_lqty_issued = LQTY_SUPPLY_CAP * cum_fr // 10**18
         new_lqty_issued = new_total_lqty_issued - total_lqty_issued
@@ -117,26 +115,3 @@ class LiquityHelper:
         lqty_gain = self.estimate_pending_lqty_gain(depositor, now_ts)
         eth_gain = self.lusd_stability_pool.functions.getDepositorETHGain(depositor).call()
         return (eth_gain, lqty_gain)
-
-    # --- LiquityMath methods ---
-
-    def _dec_pow(self, base, mins):
-        if mins > 525600000:
-            return 525600000
-        if mins == 0:
-            return 10**18
-        y = 10**18
-        x = base
-        n = mins
-        while n > 1:
-            if n % 2 == 0:
-                x = self._dec_mul(x, x)
-                n = n // 2
-            else:
-                y = self._dec_mul(x, y)
-                x = self._dec_mul(x, x)
-                n = (n - 1) // 2
-        return self._dec_mul(x, y)
-
-    def _dec_mul(self, x, y):
-        return (x * y + 10**18 // 2) // 10**18
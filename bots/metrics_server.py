@@ -0,0 +1,124 @@
+import threading
+import traceback
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if value == float('-inf'):
+        return "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class Metric:
+    def __init__(self, registry, name, metric_type, help_text):
+        self.registry = registry
+        self.name = name
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.values = {}  # sorted label items -> value
+
+    def set(self, value, **labels):
+        with self.registry.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def clear(self):
+        with self.registry.lock:
+            self.values = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        for (labels, value) in sorted(self.values.items()):
+            if value is None:
+                continue
+            labels_str = ','.join(f'{k}="{_escape_label_value(v)}"' for (k, v) in labels)
+            lines.append(f"{self.name}{{{labels_str}}} {_format_value(value)}" if labels_str else f"{self.name} {_format_value(value)}")
+        return lines
+
+
+# Registry of gauges and counters rendered in Prometheus text exposition format
+class MetricsRegistry:
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self.lock = threading.RLock()
+        self.metrics = {}
+        self.collectors = []  # functions called before each scrape (to refresh derived metrics)
+
+    def gauge(self, name, help_text):
+        return self._add_metric(name, 'gauge', help_text)
+
+    def counter(self, name, help_text):
+        return self._add_metric(name, 'counter', help_text)
+
+    def _add_metric(self, name, metric_type, help_text):
+        name = f"{self.prefix}_{name}" if self.prefix else name
+        with self.lock:
+            assert name not in self.metrics, f"Metric {name} is already registered"
+            metric = self.metrics[name] = Metric(self, name, metric_type, help_text)
+            return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception:
+                traceback.print_exc()
+        with self.lock:
+            lines = []
+            for name in sorted(self.metrics):
+                lines += self.metrics[name].render()
+            return '\n'.join(lines) + '\n'
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Serves "/metrics" of the registry from a daemon thread (port 0 picks a free port)
+class MetricsServer:
+    def __init__(self, registry, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        self.server.daemon_threads = True
+        self.server.registry = registry
+        self.thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
@@ -0,0 +1,153 @@
+import threading
+import time
+
+from fee_history import REPLACEMENT_BUMP_RATIO
+
+
+class NonceManager:
+    def __init__(self, w3, address, log=print):
+        self.w3 = w3
+        self.address = address
+        self.log = log
+        self.lock = threading.RLock()
+        self.next_nonce = None       # next nonce to hand out (if there are no released nonces)
+        self.confirmed_nonce = None  # account nonce as of last seen block (all lower nonces are mined)
+        self.reserved = {}           # nonce -> last sent tx (None if reserved but not sent yet)
+        self.released = set()        # nonces below "next_nonce" which were reserved but are free again
+        self.first_sent_ts = {}      # nonce -> time when first tx with that nonce was sent
+        self.sent_tx_hashes = {}     # nonce -> hashes of txs sent with that nonce
+        self.orphaned = {}           # nonce -> last tx sent before restart (nonce is free to be reused by a replacement)
+
+    def sync(self, block_identifier='pending'):
+        with self.lock:
+            chain_nonce = self.w3.eth.get_transaction_count(self.address, block_identifier)
+            self.next_nonce = max(self.next_nonce or 0, chain_nonce)
+            if self.confirmed_nonce is None:
+                self.confirmed_nonce = self.w3.eth.get_transaction_count(self.address, 'latest')
+
+    # --- Reserve / replace / cancel ---
+
+    # Returns nonce for new tx (reuses lowest released nonce first to avoid gaps)
+    def reserve(self):
+        with self.lock:
+            if self.next_nonce is None:
+                self.sync()
+            if self.released:
+                nonce = min(self.released)
+                self.released.remove(nonce)
+            else:
+                nonce = self.next_nonce
+                self.next_nonce += 1
+            self.reserved[nonce] = None
+            return nonce
+
+    # Records tx sent (or re-sent with higher fees) with reserved nonce
+    def mark_sent(self, tx, tx_hash=None):
+        with self.lock:
+            if tx['nonce'] >= self.confirmed_nonce:
+                self.reserved[tx['nonce']] = dict(tx)
+                self.orphaned.pop(tx['nonce'], None)
+                self.first_sent_ts.setdefault(tx['nonce'], time.time())
+                if tx_hash is not None:
+                    self.sent_tx_hashes.setdefault(tx['nonce'], []).append(tx_hash)
+
+    # Returns reserved nonce back if tx was not sent
+    def release(self, nonce):
+        with self.lock:
+            if self.reserved.get(nonce, True) is not None:
+                return
+            del self.reserved[nonce]
+            if nonce == self.next_nonce - 1:
+                self.next_nonce -= 1
+            else:
+                self.released.add(nonce)
+
+    # Returns minimal (maxPriorityFeePerGas, maxFeePerGas) for a tx to replace last tx sent with "nonce"
+    def get_replacement_fees(self, nonce):
+        with self.lock:
+            last_tx = self.reserved.get(nonce) or self.orphaned.get(nonce)
+            if last_tx is None:
+                return (0, 0)
+            return (
+                int(last_tx['maxPriorityFeePerGas'] * REPLACEMENT_BUMP_RATIO),
+                int(last_tx['maxFeePerGas'] * REPLACEMENT_BUMP_RATIO),
+            )
+
+    # Returns tx replacing last tx sent with "nonce" by empty self-transfer (None if nothing to cancel:
+    # nonce which was reserved but never sent is released instead)
+    def build_cancel_tx(self, nonce, chain_id):
+        with self.lock:
+            if nonce not in self.reserved or self.is_used(nonce):
+                return None
+            if self.reserved[nonce] is None and nonce not in self.orphaned:
+                self.release(nonce)
+                return None
+            (max_priority_fee_per_gas, max_fee_per_gas) = self.get_replacement_fees(nonce)
+            return {
+                'from': self.address,
+                'to': self.address,
+                'value': 0,
+                'gas': 21000,
+                'nonce': nonce,
+                'chainId': chain_id,
+                'maxPriorityFeePerGas': max_priority_fee_per_gas,
+                'maxFeePerGas': max_fee_per_gas,
+            }
+
+    def is_used(self, nonce):
+        with self.lock:
+            return self.confirmed_nonce is not None and nonce < self.confirmed_nonce
+
+    def get_pending_txs(self):
+        with self.lock:
+            return {nonce: tx for (nonce, tx) in self.reserved.items() if tx is not None}
+
+    # Returns seconds since oldest still pending tx was first sent (None if there are no pending txs)
+    def get_oldest_pending_tx_age(self):
+        with self.lock:
+            if not self.first_sent_ts:
+                return None
+            return time.time() - min(self.first_sent_ts.values())
+
+    # --- Reconciliation ---
+
+    # BlockWatcher listener: forgets mined nonces and catches up with txs sent outside of this manager
+    def on_new_block(self, block):
+        chain_nonce = self.w3.eth.get_transaction_count(self.address, block.number)
+        with self.lock:
+            self.confirmed_nonce = chain_nonce
+            for nonce in [nonce for nonce in self.reserved if nonce < chain_nonce]:
+                del self.reserved[nonce]
+            for nonce in [nonce for nonce in self.first_sent_ts if nonce < chain_nonce]:
+                del self.first_sent_ts[nonce]
+                self.sent_tx_hashes.pop(nonce, None)
+                self.orphaned.pop(nonce, None)
+            self.released = set(nonce for nonce in self.released if nonce >= chain_nonce)
+            if self.next_nonce is not None and self.next_nonce < chain_nonce:
+                self.log(f"Nonce {self.next_nonce} was used outside of nonce manager, skipping to {chain_nonce}")
+                self.next_nonce = chain_nonce
+
+    # --- Checkpoint ---
+
+    def to_checkpoint(self):
+        with self.lock:
+            pending_txs = {**self.orphaned, **self.get_pending_txs()}
+            return {
+                'next_nonce': self.next_nonce,
+                'pending_txs': {str(nonce): tx for (nonce, tx) in pending_txs.items()},
+                'first_sent_ts': {str(nonce): ts for (nonce, ts) in self.first_sent_ts.items()},
+                'sent_tx_hashes': {str(nonce): tx_hashes for (nonce, tx_hashes) in self.sent_tx_hashes.items()},
+            }
+
+    # Txs which were pending when checkpoint was saved are no longer tracked, so their nonces are handed out again
+    # (next tx with such nonce replaces the pending one, see "get_replacement_fees"); expects "sync" to be called first
+    # (next nonce comes from "sync" only: nonces reserved but never sent before restart are handed out again)
+    def restore_checkpoint(self, state):
+        with self.lock:
+            pending_txs = {int(nonce): tx for (nonce, tx) in state['pending_txs'].items() if int(nonce) >= self.confirmed_nonce}
+            self.orphaned = {nonce: tx for (nonce, tx) in pending_txs.items() if nonce not in self.reserved}
+            self.first_sent_ts = {int(nonce): ts for (nonce, ts) in state['first_sent_ts'].items() if int(nonce) in pending_txs}
+            self.sent_tx_hashes = {int(nonce): hashes for (nonce, hashes) in state['sent_tx_hashes'].items() if int(nonce) in pending_txs}
+            self.released |= set(nonce for nonce in self.orphaned if nonce < self.next_nonce)
+            for (nonce, tx_hashes) in sorted(self.sent_tx_hashes.items()):
+                self.log(f"Tx with nonce {nonce} was pending before restart: {', '.join(tx_hashes)}")
@@ -0,0 +1,138 @@
+from collections import deque
+from eth_abi import decode_abi
+
+from epoch_trade_helper import CURVE_LUSD_POOL_ADDRESS, DAI_ADDRESS, LUSD_ADDRESS, USDC_ADDRESS
+
+# Pools checked by GammaFarm._requireNoTradesInCurrentBlock:
+LQTY_WETH_3000_POOL = "0xD1D5A4c0eA98971894772Dcd6D2f1dc71083C44E"
+WETH_MAL_3000_POOL = "0x41506D56B16794e4F7F423AEFF366740D4bdd387"
+WETH_LUSD_3000_POOL = "0x9663f2CA0454acCad3e094448Ea6f77443880454"
+WETH_USDC_500_POOL = "0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640"
+WETH_USDC_3000_POOL = "0x8ad599c3A0ff1De082011EFDDc58f1908eb6e6D8"
+USDC_LUSD_500_POOL = "0x4e0924d3a751bE199C426d52fb1f2337fa96f736"
+WETH_DAI_500_POOL = "0x60594a405d53811d3BC4766596EFD80fd545A270"
+WETH_DAI_3000_POOL = "0xC2e9F25Be6257c210d7Adf0D4Cd6E3E881ba25f8"
+DAI_LUSD_500_POOL = "0x16980C16811bDe2B3358c1Ce4341541a4C772Ec9"
+CURVE_LUSD_POOL = CURVE_LUSD_POOL_ADDRESS
+
+WATCHED_POOLS = [
+    LQTY_WETH_3000_POOL, WETH_MAL_3000_POOL, WETH_LUSD_3000_POOL,
+    WETH_USDC_500_POOL, WETH_USDC_3000_POOL, USDC_LUSD_500_POOL,
+    WETH_DAI_500_POOL, WETH_DAI_3000_POOL, DAI_LUSD_500_POOL,
+    CURVE_LUSD_POOL,
+]
+
+POOL_ACTIVITY_WINDOW_BLOCKS = 50
+
+
+# Returns pools which must have no trades in the block for GammaFarm to accept given trade data
+# (empty trade data stands for farm's "default_trade_params", see PoolActivityWatcher.get_default_trade_params)
+def get_trade_data_pools(trade_data, default_trade_params=None):
+    pools = [LQTY_WETH_3000_POOL, WETH_MAL_3000_POOL]
+    if trade_data:
+        (stable_token, weth_to_stable_token_fee, use_curve_for_stable_token_to_lusd) = \
+            decode_abi(['address', 'uint24', 'bool'], trade_data)
+    else:
+        assert default_trade_params is not None, "empty trade data requires farm's default trade params"
+        (stable_token, weth_to_stable_token_fee, use_curve_for_stable_token_to_lusd) = default_trade_params
+    stable_token = stable_token.lower()
+    if stable_token == LUSD_ADDRESS.lower():
+        pools.append(WETH_LUSD_3000_POOL)
+    elif stable_token == USDC_ADDRESS.lower():
+        pools.append(WETH_USDC_500_POOL if weth_to_stable_token_fee == 500 else WETH_USDC_3000_POOL)
+        if not use_curve_for_stable_token_to_lusd:
+            pools.append(USDC_LUSD_500_POOL)
+    elif stable_token == DAI_ADDRESS.lower():
+        pools.append(WETH_DAI_500_POOL if weth_to_stable_token_fee == 500 else WETH_DAI_3000_POOL)
+        if not use_curve_for_stable_token_to_lusd:
+            pools.append(DAI_LUSD_500_POOL)
+    if use_curve_for_stable_token_to_lusd:
+        pools.append(CURVE_LUSD_POOL)
+    return pools
+
+
+class PoolActivityWatcher:
+    def __init__(self, w3, window_blocks=POOL_ACTIVITY_WINDOW_BLOCKS):
+        self.w3 = w3
+        self.window_blocks = window_blocks
+        self.pools = [w3.toChecksumAddress(pool) for pool in WATCHED_POOLS]
+        # Per block sets of pools that had any event (swaps, mints and burns all update pool's last observation):
+        self.active_pools_per_block = deque(maxlen=window_blocks)
+        self.newest_block_number = None
+        self.pending_active_pools = set()
+        self.default_trade_params = {}  # farm address -> default trade params
+
+    def is_loaded(self):
+        return self.newest_block_number is not None
+
+    # BlockWatcher listener: appends activity of blocks which are not in the window yet
+    def on_new_block(self, block):
+        if self.is_loaded() and block.number <= self.newest_block_number:
+            return
+        from_block = block.number - self.window_blocks + 1
+        if self.is_loaded():
+            from_block = max(from_block, self.newest_block_number + 1)
+        active_pools = {number: set() for number in range(from_block, block.number + 1)}
+        for log in self._get_logs(from_block, block.number):
+            active_pools[log['blockNumber']].add(log['address'].lower())
+        self.active_pools_per_block.extend(active_pools[number] for number in sorted(active_pools))
+        self.newest_block_number = block.number
+        self.pending_active_pools = set()
+
+    # Looks at logs emitted by pending block (if node supports it)
+    def update_pending_activity(self):
+        try:
+            logs = self._get_logs('pending', 'pending')
+            self.pending_active_pools = set(log['address'].lower() for log in logs)
+        except Exception:
+            self.pending_active_pools = set()
+
+    def _get_logs(self, from_block, to_block):
+        return self.w3.eth.get_logs({'fromBlock': from_block, 'toBlock': to_block, 'address': self.pools})
+
+    # --- Checkpoint ---
+
+    def to_checkpoint(self):
+        return {
+            'active_pools_per_block': [sorted(active_pools) for active_pools in self.active_pools_per_block],
+            'newest_block_number': self.newest_block_number,
+        }
+
+    # (window catches up with blocks mined since checkpoint on the next new block)
+    def restore_checkpoint(self, state):
+        self.active_pools_per_block = deque(
+            (set(active_pools) for active_pools in state['active_pools_per_block']), maxlen=self.window_blocks,
+        )
+        self.newest_block_number = state['newest_block_number']
+
+    # --- Estimations ---
+
+    # Probability that pool will be touched in the next block (share of recent blocks with activity, smoothed)
+    def estimate_pool_collision_probability(self, pool):
+        pool = pool.lower()
+        if pool in self.pending_active_pools:
+            return 1.0
+        active_blocks = sum(1 for active_pools in self.active_pools_per_block if pool in active_pools)
+        return (active_blocks + 1) / (len(self.active_pools_per_block) + 2)
+
+    # Returns (stable_token, weth_to_stable_token_fee, use_curve_for_stable_token_to_lusd) GammaFarm trades with
+    # for empty trade data (read once per farm: defaults only change via owner's setDefaultTradeData)
+    def get_default_trade_params(self, gamma_farm):
+        default_trade_params = self.default_trade_params.get(gamma_farm.address)
+        if default_trade_params is None:
+            functions = gamma_farm.functions
+            default_trade_params = self.default_trade_params[gamma_farm.address] = (
+                functions.defaultWethToStableToken().call(),
+                functions.defaultWethToStableTokenFee().call(),
+                functions.defaultUseCurveForStableTokenToLusd().call(),
+            )
+        return default_trade_params
+
+    # Probability that at least one pool used by trade data will be touched in the next block
+    # ("gamma_farm" resolves empty trade data to its default trade params)
+    def estimate_trade_data_collision_probability(self, trade_data, gamma_farm=None):
+        default_trade_params = None if trade_data else self.get_default_trade_params(gamma_farm)
+        no_collision_probability = 1.0
+        for pool in get_trade_data_pools(trade_data, default_trade_params):
+            no_collision_probability *= 1 - self.estimate_pool_collision_probability(pool)
+        return 1 - no_collision_probability
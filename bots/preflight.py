@@ -0,0 +1,52 @@
+from web3.exceptions import ContractLogicError
+
+# Pre-flight actions:
+PREFLIGHT_OK = "ok"
+PREFLIGHT_RETRY_NEXT_BLOCK = "retry_next_block"
+PREFLIGHT_REBUILD_TRADE_DATA = "rebuild_trade_data"
+PREFLIGHT_ABORT = "abort"
+
+# GammaFarm (and underlying Uniswap/Curve) revert reasons:
+RETRY_NEXT_BLOCK_REASONS = [
+    "frontrun protection",
+]
+REBUILD_TRADE_DATA_REASONS = [
+    "received too little",
+    "Too little received",
+    "Exchange resulted in fewer coins than expected",
+    "invalid trade data",
+]
+
+
+def parse_error_message(e):
+    if isinstance(e, ContractLogicError):
+        return str(e)
+    if not isinstance(e, ValueError) or len(e.args) != 1:
+        return None
+    data = e.args[0]
+    if type(data) == str:
+        return data
+    elif type(data) == dict:
+        return data.get('message')
+    return None
+
+
+def classify_revert_reason(error_message):
+    if error_message is None:
+        return PREFLIGHT_ABORT
+    if any(reason in error_message for reason in RETRY_NEXT_BLOCK_REASONS):
+        return PREFLIGHT_RETRY_NEXT_BLOCK
+    if any(reason in error_message for reason in REBUILD_TRADE_DATA_REASONS):
+        return PREFLIGHT_REBUILD_TRADE_DATA
+    return PREFLIGHT_ABORT
+
+
+# Executes exact tx via eth_call against "block_identifier", returns (action, error_message)
+def simulate_tx(w3, tx, block_identifier='pending'):
+    call_tx = {k: tx[k] for k in ['from', 'to', 'value', 'data', 'gas'] if k in tx}
+    try:
+        w3.eth.call(call_tx, block_identifier)
+    except (ContractLogicError, ValueError) as e:
+        error_message = parse_error_message(e)
+        return (classify_revert_reason(error_message), error_message)
+    return (PREFLIGHT_OK, None)
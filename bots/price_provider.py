@@ -2,6 +2,9 @@ import json
 import requests
 import time
 
+from deadline import get_timeout
+from tracing import traced
+
 COINGECKO_API_PRICES_ENDPOINT = "https://api.coingecko.com/api/v3/simple/price"
 COINGECKO_LUSD_ID = "liquity-usd"
 COINGECKO_ETH_ID = "ethereum"
@@ -10,19 +13,26 @@ COINGECKO_USD_ID = "usd"
 COINBASE_API_PRICES_ENDPOINT = "https://api.coinbase.com/v2/prices"
 COINBASE_ETH_USD_PAIR = "ETH-USD"
 
+PRICE_API_TIMEOUT_SECS = 10
+
+# (shared session keeps connections to price APIs alive)
+SESSION = requests.Session()
+
 
+@traced()
 def fetch_spot_price_from_coinbase(pair):
-    r = requests.get(f"{COINBASE_API_PRICES_ENDPOINT}/{pair}/spot")
+    r = SESSION.get(f"{COINBASE_API_PRICES_ENDPOINT}/{pair}/spot", timeout=get_timeout(PRICE_API_TIMEOUT_SECS))
     return r.json()
 
 
+@traced()
 def fetch_prices_from_coingecko(ids, vs_currencies, include_last_updated_at=True):
     params = {
         'ids': ','.join(ids),
         'vs_currencies': ','.join(vs_currencies),
         'include_last_updated_at': 'true' if include_last_updated_at else 'false',
     }
-    r = requests.get(COINGECKO_API_PRICES_ENDPOINT, params)
+    r = SESSION.get(COINGECKO_API_PRICES_ENDPOINT, params, timeout=get_timeout(PRICE_API_TIMEOUT_SECS))
     return r.json()
 
 
@@ -32,11 +42,21 @@ class PriceProvider:
         self.eth_price = None
         self.lusd_price_ts = None
         self.eth_price_ts = None
+        self.lusd_price_fetch_ts = None
+        self.cache_hits = 0
+        self.cache_misses = 0
 
-    def get_lusd_price(self):
+    # Returns cached price if it was fetched less than "max_age_secs" ago
+    def get_lusd_price(self, max_age_secs=0):
+        now_ts = time.time()
+        if self.lusd_price_fetch_ts is not None and now_ts - self.lusd_price_fetch_ts < max_age_secs:
+            self.cache_hits += 1
+            return self.lusd_price
+        self.cache_misses += 1
         result = fetch_prices_from_coingecko([COINGECKO_LUSD_ID], [COINGECKO_USD_ID])
         self.lusd_price = result[COINGECKO_LUSD_ID][COINGECKO_USD_ID]
         self.lusd_price_ts = result[COINGECKO_LUSD_ID]['last_updated_at']
+        self.lusd_price_fetch_ts = now_ts
         return self.lusd_price
 
     def get_eth_price(self):
@@ -46,4 +66,16 @@ class PriceProvider:
         if self.eth_price is None or self.eth_price != eth_price:
             self.eth_price = eth_price
             self.eth_price_ts = now_ts
-        return self.eth_price
\ No newline at end of file
+        return self.eth_price
+
+    def to_checkpoint(self):
+        return {
+            'lusd_price': self.lusd_price, 'lusd_price_ts': self.lusd_price_ts, 'lusd_price_fetch_ts': self.lusd_price_fetch_ts,
+            'eth_price': self.eth_price, 'eth_price_ts': self.eth_price_ts,
+        }
+
+    def restore_checkpoint(self, state):
+        assert state['lusd_price_fetch_ts'] is None or state['lusd_price_fetch_ts'] <= time.time(), "LUSD price is from the future"
+        (self.lusd_price, self.lusd_price_ts, self.lusd_price_fetch_ts) = \
+            (state['lusd_price'], state['lusd_price_ts'], state['lusd_price_fetch_ts'])
+        (self.eth_price, self.eth_price_ts) = (state['eth_price'], state['eth_price_ts'])
@@ -0,0 +1,189 @@
+import gzip
+import json
+import random
+import threading
+import time
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from web3._utils.encoding import Web3JsonEncoder
+
+NOT_RECORDED_ERROR_CODE = -32000
+
+
+# (params are keyed as they are sent over the wire)
+def get_rpc_key(endpoint, method, params):
+    return json.dumps([endpoint, method, params or []], sort_keys=True, separators=(',', ':'), cls=Web3JsonEncoder)
+
+
+# Price API calls are keyed by host, path and sorted query (scheme is dropped)
+def get_api_key(url):
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query)))
+    return f"{parts.netloc}{parts.path}?{query}" if query else f"{parts.netloc}{parts.path}"
+
+
+# Returns url which points "url" to the replay server
+def get_replay_api_url(url, server_url):
+    parts = urlsplit(url)
+    return f"{server_url}/api/{parts.netloc}{parts.path}"
+
+
+# Recorded responses: key -> list of responses in order they were received
+class CallStore:
+    def __init__(self, rpc=None, api=None):
+        self.lock = threading.Lock()
+        self.rpc = rpc or {}
+        self.api = api or {}
+        self.positions = Counter()
+        self.served = Counter()  # ('rpc', method) / ('api', host) -> number of served calls
+        self.misses = Counter()
+
+    def add_rpc(self, endpoint, method, params, response):
+        with self.lock:
+            self.rpc.setdefault(get_rpc_key(endpoint, method, params), []).append(response)
+
+    def add_api(self, url, text):
+        with self.lock:
+            self.api.setdefault(get_api_key(url), []).append(text)
+
+    # Responses with the same key are served in recorded order (the last one is repeated)
+    def _next(self, calls, key):
+        responses = calls.get(key)
+        if not responses:
+            return None
+        position = self.positions[key]
+        self.positions[key] = min(position + 1, len(responses) - 1)
+        return responses[position]
+
+    def next_rpc(self, endpoint, method, params):
+        with self.lock:
+            self.served[('rpc', method)] += 1
+            response = self._next(self.rpc, get_rpc_key(endpoint, method, params))
+            if response is None:
+                self.misses[('rpc', method)] += 1
+            return response
+
+    def next_api(self, url):
+        with self.lock:
+            self.served[('api', urlsplit(url).netloc)] += 1
+            text = self._next(self.api, get_api_key(url))
+            if text is None:
+                self.misses[('api', urlsplit(url).netloc)] += 1
+            return text
+
+    # Serves recorded sequences from the beginning again
+    def rewind(self):
+        with self.lock:
+            self.positions = Counter()
+
+    def save(self, path):
+        with self.lock:
+            data = {'rpc': self.rpc, 'api': self.api}
+        with gzip.open(path, 'wt') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt') as f:
+            data = json.load(f)
+        return cls(data['rpc'], data['api'])
+
+
+# --- Recording ---
+
+# Builds web3 middleware storing raw responses of requests sent via its w3 instance as "endpoint"
+def build_recording_middleware(store, endpoint):
+    def recording_middleware(make_request, w3):
+        def middleware(method, params):
+            response = make_request(method, params)
+            store.add_rpc(endpoint, method, params, json.loads(json.dumps(response, cls=Web3JsonEncoder)))
+            return response
+        return middleware
+    return recording_middleware
+
+
+def record_web3(w3, store, endpoint):
+    w3.middleware_onion.inject(build_recording_middleware(store, endpoint), name='recording', layer=0)
+
+
+# Records responses of requests made via "session" (requests.Session)
+def record_session(session, store):
+    def on_response(response, *args, **kwargs):
+        store.add_api(response.url, response.text)
+    session.hooks['response'].append(on_response)
+
+
+# --- Replaying ---
+
+class _ReplayRequestHandler(BaseHTTPRequestHandler):
+    # JSON-RPC: POST /rpc/<endpoint>
+    def do_POST(self):
+        self.server.inject_latency()
+        endpoint = self.path[len('/rpc/'):]
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        response = self.server.store.next_rpc(endpoint, request['method'], request['params'])
+        if response is None:
+            response = {'jsonrpc': '2.0', 'error': {'code': NOT_RECORDED_ERROR_CODE, 'message': "call was not recorded"}}
+        self._send(200, json.dumps({**response, 'id': request['id']}), 'application/json')
+
+    # Price API: GET /api/<host>/<path>?<query>
+    def do_GET(self):
+        self.server.inject_latency()
+        text = self.server.store.next_api("https://" + self.path[len('/api/'):])
+        if text is None:
+            self._send(404, json.dumps({'error': "call was not recorded"}), 'application/json')
+        else:
+            self._send(200, text, 'application/json')
+
+    def _send(self, status, body, content_type):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Local stand-in for JSON-RPC endpoints and price APIs, serving recorded calls with injected latency
+class ReplayServer:
+    def __init__(self, store, latency_ms=0, jitter_ms=0, host="127.0.0.1", port=0, seed=None):
+        self.server = ThreadingHTTPServer((host, port), _ReplayRequestHandler)
+        self.server.daemon_threads = True
+        self.server.store = store
+        self.server.inject_latency = self.inject_latency
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.random = random.Random(seed)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="ReplayServer", daemon=True)
+
+    @property
+    def url(self):
+        (host, port) = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def get_rpc_url(self, endpoint):
+        return f"{self.url}/rpc/{endpoint}"
+
+    def inject_latency(self):
+        latency_ms = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency_ms > 0:
+            time.sleep(latency_ms / 1000)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def get_percentile(values, percentile):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(len(values) * percentile / 100 + 0.5) - 1))]
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+
+# Histogram precision: each power of two range is split into this many linear sub-buckets (~3% relative error)
+HISTOGRAM_SUB_BUCKET_BITS = 5
+HISTOGRAM_SUB_BUCKET_COUNT = 1 << HISTOGRAM_SUB_BUCKET_BITS
+
+SUMMARY_PERCENTILES = [50, 90, 99]
+
+
+# Log-linear (HDR style) histogram of non-negative integer values (e.g. latencies in microseconds)
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = {}  # bucket index -> count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _bucket_index(value):
+        if value < 2 * HISTOGRAM_SUB_BUCKET_COUNT:
+            return value
+        shift = value.bit_length() - HISTOGRAM_SUB_BUCKET_BITS - 1
+        return HISTOGRAM_SUB_BUCKET_COUNT * shift + (value >> shift)
+
+    # Returns highest value which falls into bucket with "index"
+    @staticmethod
+    def _bucket_max_value(index):
+        if index < 2 * HISTOGRAM_SUB_BUCKET_COUNT:
+            return index
+        shift = index // HISTOGRAM_SUB_BUCKET_COUNT - 1
+        sub_bucket = index - HISTOGRAM_SUB_BUCKET_COUNT * shift
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, value):
+        value = max(int(value), 0)
+        index = self._bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for (index, count) in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def get_percentile(self, percentile):
+        if self.count == 0:
+            return None
+        target_count = max(1, int(self.count * percentile / 100 + 0.5))
+        seen_count = 0
+        for index in sorted(self.counts):
+            seen_count += self.counts[index]
+            if seen_count >= target_count:
+                return min(self._bucket_max_value(index), self.max)
+        return self.max
+
+    def get_mean(self):
+        return self.total / self.count if self.count else None
+
+
+class CallMetrics:
+    def __init__(self):
+        self.latency_us = LatencyHistogram()
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.errors = {}  # error class -> count
+
+    def merge(self, other):
+        self.latency_us.merge(other.latency_us)
+        self.request_bytes += other.request_bytes
+        self.response_bytes += other.response_bytes
+        for (error_class, count) in other.errors.items():
+            self.errors[error_class] = self.errors.get(error_class, 0) + count
+
+    def to_dict(self):
+        return {
+            'count': self.latency_us.count,
+            'errors': dict(self.errors),
+            'latency_ms': {
+                'mean': _us_to_ms(self.latency_us.get_mean()),
+                'min': _us_to_ms(self.latency_us.min),
+                'max': _us_to_ms(self.latency_us.max),
+                **{f"p{p}": _us_to_ms(self.latency_us.get_percentile(p)) for p in SUMMARY_PERCENTILES},
+            },
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+        }
+
+
+def _us_to_ms(value):
+    return None if value is None else round(value / 1000, 3)
+
+
+# Collects per (endpoint, call) metrics, both since start and since last iteration summary
+class RpcMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = {}      # (endpoint, call) -> CallMetrics
+        self.iteration = {}  # (endpoint, call) -> CallMetrics
+
+    def record(self, endpoint, call, latency_us, request_bytes, response_bytes, error_class=None):
+        with self.lock:
+            metrics = self.iteration.get((endpoint, call))
+            if metrics is None:
+                metrics = self.iteration[(endpoint, call)] = CallMetrics()
+            metrics.latency_us.record(latency_us)
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+            if error_class is not None:
+                metrics.errors[error_class] = metrics.errors.get(error_class, 0) + 1
+
+    # Moves iteration metrics into totals and returns them
+    def finish_iteration(self):
+        with self.lock:
+            (iteration, self.iteration) = (self.iteration, {})
+            for (key, metrics) in iteration.items():
+                self.total.setdefault(key, CallMetrics()).merge(metrics)
+            return iteration
+
+    def get_total(self):
+        with self.lock:
+            total = {}
+            for calls in [self.total, self.iteration]:
+                for (key, metrics) in calls.items():
+                    total.setdefault(key, CallMetrics()).merge(metrics)
+            return total
+
+    def to_dict(self):
+        return [
+            {'endpoint': endpoint, 'call': call, **metrics.to_dict()}
+            for ((endpoint, call), metrics) in sorted(self.get_total().items())
+        ]
+
+
+# Returns summary lines sorted by total time spent in call
+def format_metrics_summary(calls):
+    lines = []
+    for ((endpoint, call), metrics) in sorted(calls.items(), key=lambda item: -item[1].latency_us.total):
+        latency_us = metrics.latency_us
+        percentiles = ', '.join(f"p{p}={_us_to_ms(latency_us.get_percentile(p))}ms" for p in SUMMARY_PERCENTILES)
+        errors = f", errors={metrics.errors}" if metrics.errors else ""
+        lines.append(
+            f"[{endpoint}] {call}: count={latency_us.count}, total={_us_to_ms(latency_us.total)}ms, {percentiles}, " + \
+            f"max={_us_to_ms(latency_us.max)}ms, bytes={metrics.request_bytes}/{metrics.response_bytes}{errors}"
+        )
+    return lines
+
+
+# Returns call label: JSON-RPC method, extended with 4-byte function selector for contract calls
+def get_call_label(method, params):
+    if method in ('eth_call', 'eth_estimateGas') and params and isinstance(params[0], dict):
+        data = params[0].get('data') or params[0].get('input')
+        if isinstance(data, str) and len(data) >= 10:
+            return f"{method}:{data[:10]}"
+    return method
+
+
+# Builds web3 middleware recording every request sent via its w3 instance as "endpoint"
+def build_rpc_metrics_middleware(rpc_metrics, endpoint):
+    def rpc_metrics_middleware(make_request, w3):
+        def middleware(method, params):
+            call = get_call_label(method, params)
+            request_bytes = len(json.dumps(params, default=str))
+            start_ts = time.perf_counter()
+            try:
+                response = make_request(method, params)
+            except Exception as e:
+                latency_us = (time.perf_counter() - start_ts) * 1e6
+                rpc_metrics.record(endpoint, call, latency_us, request_bytes, 0, type(e).__name__)
+                raise
+            latency_us = (time.perf_counter() - start_ts) * 1e6
+            response_bytes = len(json.dumps(response, default=str))
+            error_class = None
+            if isinstance(response, dict) and 'error' in response:
+                error = response['error']
+                error_class = f"rpc_error:{error.get('code')}" if isinstance(error, dict) else "rpc_error"
+            rpc_metrics.record(endpoint, call, latency_us, request_bytes, response_bytes, error_class)
+            return response
+        return middleware
+    return rpc_metrics_middleware
+
+
+# Installs middleware as the innermost layer (measures raw provider round trips)
+def instrument_web3(w3, rpc_metrics, endpoint):
+    w3.middleware_onion.inject(build_rpc_metrics_middleware(rpc_metrics, endpoint), name='rpc_metrics', layer=0)
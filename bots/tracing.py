@@ -0,0 +1,110 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+
+from rpc_metrics import get_call_label
+
+TRACE_MAX_TRACES = 20
+
+
+# Collects spans of sampled traces (e.g. run iterations) and exports them in Chrome trace-event format
+# (viewable in Perfetto / chrome://tracing). Spans are no-ops while current trace is not sampled.
+class Tracer:
+    def __init__(self, sample_rate=0.0, max_traces=TRACE_MAX_TRACES):
+        self.sample_rate = sample_rate
+        self.traces = deque(maxlen=max_traces)
+        self.events = None  # events of current trace (None if not sampled)
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def is_sampling(self):
+        return self.events is not None
+
+    def start_trace(self, force=False):
+        self.events = [] if (force or random.random() < self.sample_rate) else None
+        return self.is_sampling()
+
+    # Returns True if finished trace was sampled
+    def finish_trace(self):
+        with self.lock:
+            (events, self.events) = (self.events, None)
+            if events is None:
+                return False
+            self.traces.append(events)
+            return True
+
+    @contextmanager
+    def span(self, name, category="bot", **args):
+        if self.events is None:
+            yield
+            return
+        start_ts = time.time()
+        try:
+            yield
+        except BaseException as e:
+            args['error'] = type(e).__name__
+            raise
+        finally:
+            self._add_event(name, category, start_ts, time.time(), args)
+
+    def _add_event(self, name, category, start_ts, end_ts, args):
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': int(start_ts * 1e6),
+            'dur': int((end_ts - start_ts) * 1e6),
+            'pid': self.pid,
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = {k: str(v) for (k, v) in args.items()}
+        with self.lock:
+            if self.events is not None:
+                self.events.append(event)
+
+    def export(self, path):
+        with self.lock:
+            events = [event for events in self.traces for event in events]
+        with open(path + ".tmp", 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        os.replace(path + ".tmp", path)
+
+
+tracer = Tracer()
+
+
+# Decorator wrapping function calls in spans of the global tracer
+def traced(name=None):
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.is_sampling():
+                return fn(*args, **kwargs)
+            with tracer.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Builds web3 middleware adding a span for every request sent via its w3 instance as "endpoint"
+def build_tracing_middleware(endpoint, tracer=tracer):
+    def tracing_middleware(make_request, w3):
+        def middleware(method, params):
+            if not tracer.is_sampling():
+                return make_request(method, params)
+            with tracer.span(get_call_label(method, params), category="rpc", endpoint=endpoint):
+                return make_request(method, params)
+        return middleware
+    return tracing_middleware
+
+
+def trace_web3(w3, endpoint, tracer=tracer):
+    w3.middleware_onion.inject(build_tracing_middleware(endpoint, tracer), name='tracing', layer=0)
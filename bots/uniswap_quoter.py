@@ -1,23 +1,41 @@
-import json
 from web3 import Web3
 
+from contract_registry import get_contract
+
 UNISWAP_V2_ROUTER_ADDRESS = "0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D"
 UNISWAP_V3_QUOTER_ADDRESS = "0xb27308f9F90D607463bb33eA1BeBb41C27CE5AB6"
-UNISWAP_V2_ROUTER_ABI = json.loads(open(f"abi/UniswapV2Router.json", "r").read())
-UNISWAP_V3_QUOTER_ABI = json.loads(open(f"abi/UniswapV3Quoter.json", "r").read())
 
 
 class UniswapQuoter:
     def __init__(self, w3):
         self.w3 = w3
-        self.v2_router = w3.eth.contract(address=UNISWAP_V2_ROUTER_ADDRESS, abi=UNISWAP_V2_ROUTER_ABI)
-        self.v3_quoter = w3.eth.contract(address=UNISWAP_V3_QUOTER_ADDRESS, abi=UNISWAP_V3_QUOTER_ABI)
+        self.v2_router = get_contract(w3, "UniswapV2Router", UNISWAP_V2_ROUTER_ADDRESS)
+        self.v3_quoter = get_contract(w3, "UniswapV3Quoter", UNISWAP_V3_QUOTER_ADDRESS)
+        # Quotes are reused until a new block is seen (only if "on_new_block" is registered as block listener):
+        self.quote_cache = None  # (amount_in, path) -> amount_out
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def on_new_block(self, block):
+        self.quote_cache = {}
 
     # "amount_in" is int: amount of "token_in" in "token_in" decimals (i.e. 10^18 for 1 DAI, 10^6 for 1 USDC)
     # "path" is list:
     #   for V2: [token_in, token1, token2, ..., token_out]
     #   for V3: [token_in, fee1, token1, fee2, token2, ..., token_out]
     def estimate_amount_out(self, amount_in, path):
+        if self.quote_cache is None:
+            return self._estimate_amount_out(amount_in, path)
+        key = (amount_in, tuple(path))
+        amount_out = self.quote_cache.get(key)
+        if amount_out is None:
+            self.cache_misses += 1
+            amount_out = self.quote_cache[key] = self._estimate_amount_out(amount_in, path)
+        else:
+            self.cache_hits += 1
+        return amount_out
+
+    def _estimate_amount_out(self, amount_in, path):
         if self.is_valid_v2_path(path):
             return self.estimate_amount_out_v2(amount_in, path)
         elif self.is_valid_v3_path(path):
@@ -3,6 +3,7 @@ from decimal import Decimal
 
 from brownie import accounts, network, Contract, TestPriceFeed
 from brownie._config import CONFIG
+from bots.dec_math import dec_pow
 from scripts.contracts import deploy_test_price_feed
 from scripts.tokens import token_contract, LUSD_ADDRESS
 
@@ -143,25 +144,6 @@ def replace_price_feed(trove_manager, custom_price_feed):
     )
 
 
-# Returns a^n for 18-digit decimal base "a" and integer "n"
-def dec_pow(a, n):
-    def dec_mul(x, y):
-        return (x * y + E18 // 2) // E18
-    if n == 0:
-        return E18
-    y = E18
-    x = a
-    while n > 1:
-        if n % 2 == 0:
-            x = dec_mul(x, x)
-            n = n // 2
-        else:
-            y = dec_mul(x, y)
-            x = dec_mul(x, x)
-            n = (n - 1) // 2
-    return dec_mul(x, y)
-
-
 # Estimate R and F parameters, given Q, T, Q1, T1, eT for reward distribution:
 #   q(n) := R * eT * (1 - F^n) / (1 - F),
 # where:
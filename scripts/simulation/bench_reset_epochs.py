@@ -0,0 +1,30 @@
+import timeit
+
+from gamma_farm_py import GammaFarmPythonSimulator, E18
+from structs import EpochData, Event, EventType
+
+DAY_SECS = 24 * 60 * 60
+NUM_READS = 2000
+
+
+# Loses whole staked LUSD every epoch (i.e. resets profit factor "num_resets" times) while "stale" account keeps
+# its first epoch deposit untouched
+def simulate_resets(num_resets):
+    sim = GammaFarmPythonSimulator(6000 * E18, 4 * 365 * DAY_SECS, 6000 * E18 // (4 * 365 * DAY_SECS), E18)
+    ts = 1
+    sim.simulate_event(Event(ts, EventType.DEPOSIT, amount=100 * E18, user="stale"))
+    for i in range(num_resets + 1):
+        ts += DAY_SECS
+        sim.simulate_event(Event(ts, EventType.DEPOSIT, amount=E18, user=f"user{i % 10}"))
+        loss = sim.lusdStabilityPool.getCompoundedLUSDDeposit()
+        sim.simulate_event(Event(ts, EventType.NEW_EPOCH, data=EpochData(reward=0, loss=loss)))
+    return sim
+
+
+# Benchmark of stale account reads (account last touched before all resets), which must not depend on number of
+# resets (see "resetEpochs"): `PYTHONPATH=../../bots python bench_reset_epochs.py` from "scripts/simulation" directory
+if __name__ == '__main__':
+    for num_resets in [30, 300, 3000]:
+        sim = simulate_resets(num_resets)
+        read_secs = min(timeit.repeat(lambda: sim.getAccountBalances("stale"), number=NUM_READS, repeat=5)) / NUM_READS
+        print(f"resets={num_resets}: stale account read={read_secs * 1e6:.1f}us")
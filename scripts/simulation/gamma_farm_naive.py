@@ -3,8 +3,10 @@ import os
 
 try:
     from scripts.common import DEBUG
+    from bots.dec_math import dec_pow
     from scripts.simulation.structs import EventType, SimulationState
 except:
+    from dec_math import dec_pow
     from structs import EventType, SimulationState
     from decimal import getcontext
     getcontext().prec = 77
@@ -16,24 +18,6 @@ E18d = Decimal(10 ** 18)
 UINT256_MAX = pow(2, 256) - 1
 
 
-def dec_pow(a, n):
-    def dec_mul(x, y):
-        return (x * y + E18 // 2) // E18
-    if n == 0:
-        return E18
-    y = E18
-    x = a
-    while n > 1:
-        if n % 2 == 0:
-            x = dec_mul(x, x)
-            n = n // 2
-        else:
-            y = dec_mul(x, y)
-            x = dec_mul(x, x)
-            n = (n - 1) // 2
-    return dec_mul(x, y)
-
-
 def calculate_reward(R, F, eT, t):
     if F == E18:
         return R * t
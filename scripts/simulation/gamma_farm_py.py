@@ -1,11 +1,15 @@
-from collections import defaultdict
+from bisect import bisect_left, bisect_right
 from decimal import Decimal
+import itertools
+import multiprocessing
 import os
 
 try:
     from scripts.common import DEBUG
+    from bots.dec_math import DecPowCache, dec_pow
     from scripts.simulation.structs import EventType, SimulationState
 except:
+    from dec_math import DecPowCache, dec_pow
     from structs import EventType, SimulationState
     DEBUG = False
 
@@ -13,26 +17,7 @@ except:
 E18 = 10 ** 18
 E18d = Decimal(E18)
 UINT256_MAX = pow(2, 256) - 1
-
-
-class GammaMath:
-    @staticmethod
-    def decPow(a, n):
-        def decMul(x, y):
-            return (x * y + E18 // 2) // E18
-        if n == 0:
-            return E18
-        y = E18
-        x = a
-        while n > 1:
-            if n % 2 == 0:
-                x = decMul(x, x)
-                n = n // 2
-            else:
-                y = decMul(x, y)
-                x = decMul(x, x)
-                n = (n - 1) // 2
-        return decMul(x, y)
+GATHER_CHUNK_SIZE = 10000  # accounts per task of parallel gather
 
 
 class TestStabilityPool:
@@ -73,22 +58,199 @@ class Snapshot:
         return f"(P={self.lusdProfitFactorCumP}, S1={self.malRewardPerStakedCumS}, S2={self.malRewardPerAvailableCumS})"
 
 
+# Epoch snapshots kept only while balances can still be calculated from them: epoch 0 (zero balances), the current
+# epoch, pinned epochs (resets) and epochs "e" and "e + 1" for every epoch "e" referenced by a stored account
+# ("retain"/"release" count references), other snapshots are compacted away and their slots in P/S1/S2 reused
+class EpochSnapshotStore:
+    def __init__(self, initialSnapshot):
+        self.slots = {}  # epoch -> index in P/S1/S2
+        self.P = []
+        self.S1 = []
+        self.S2 = []
+        self.freeSlots = []
+        self.refCounts = {}  # epoch -> number of accounts referencing it
+        self.pinned = {0}
+        self.currentEpoch = 0
+        self[0] = initialSnapshot
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, epoch):
+        return epoch in self.slots
+
+    # (raises KeyError for compacted epochs)
+    def __getitem__(self, epoch):
+        slot = self.slots[epoch]
+        return Snapshot(self.P[slot], self.S1[slot], self.S2[slot])
+
+    # (saving snapshot of a later epoch advances current epoch)
+    def __setitem__(self, epoch, snapshot):
+        slot = self.slots.get(epoch)
+        if slot is None:
+            if self.freeSlots:
+                slot = self.freeSlots.pop()
+            else:
+                slot = len(self.P)
+                self.P.append(0)
+                self.S1.append(0)
+                self.S2.append(0)
+            self.slots[epoch] = slot
+        self.P[slot] = snapshot.lusdProfitFactorCumP
+        self.S1[slot] = snapshot.malRewardPerStakedCumS
+        self.S2[slot] = snapshot.malRewardPerAvailableCumS
+        if epoch > self.currentEpoch:
+            previousEpoch = self.currentEpoch
+            self.currentEpoch = epoch
+            self._compact(previousEpoch)
+
+    def pin(self, epoch):
+        self.pinned.add(epoch)
+
+    def retain(self, epoch):
+        self.refCounts[epoch] = self.refCounts.get(epoch, 0) + 1
+
+    def release(self, epoch):
+        count = self.refCounts[epoch] - 1
+        if count != 0:
+            self.refCounts[epoch] = count
+            return
+        del self.refCounts[epoch]
+        self._compact(epoch)
+        self._compact(epoch + 1)
+
+    def isLive(self, epoch):
+        return epoch == self.currentEpoch or epoch in self.pinned or epoch in self.refCounts or (epoch - 1) in self.refCounts
+
+    def _compact(self, epoch):
+        if epoch in self.slots and not self.isLive(epoch):
+            self.freeSlots.append(self.slots.pop(epoch))
+
+    def copy(self):
+        store = EpochSnapshotStore.__new__(EpochSnapshotStore)
+        store.__dict__ = {name: (value.copy() if hasattr(value, 'copy') else value) for (name, value) in self.__dict__.items()}
+        return store
+
+
 class AccountBalances:
     def __init__(self, lusdStakeData=0, malRewards=0, malRewardPerAvailableCumS=0, lusdUnstaked=0):
         self.lusdStakeData = lusdStakeData
         self.malRewards = malRewards
         self.malRewardPerAvailableCumS = malRewardPerAvailableCumS
         self.lusdUnstaked = lusdUnstaked
+    def to_tuple(self):
+        return (self.lusdStakeData, self.malRewards, self.malRewardPerAvailableCumS, self.lusdUnstaked)
     def __str__(self):
         (lusdToStake, lusdStaked, _, shouldUnstake) = _unpackAccountStakeData(self.lusdStakeData)
         lusdAvailable = lusdToStake + self.lusdUnstaked
         return f"(a={lusdAvailable}, s={lusdStaked}, m={self.malRewards}, S2={self.malRewardPerAvailableCumS}, s_in={lusdToStake}, s_out={shouldUnstake})"
 
 
+# Returns epoch whose snapshots stored "_balances" are calculated from (None for zero balances, which need none
+# but epoch 0)
+def _getReferencedEpoch(_balances):
+    if _balances.lusdStakeData == 0 and _balances.malRewards == 0 and _balances.malRewardPerAvailableCumS == 0 and _balances.lusdUnstaked == 0:
+        return None
+    return _unpackAccountStakeData(_balances.lusdStakeData)[2]
+
+
+ACCOUNT_BALANCES_COLUMNS = ('lusdStakeData', 'malRewards', 'malRewardPerAvailableCumS', 'lusdUnstaked')
+ACCOUNT_DEBUG_COLUMNS = ('lusdIn', 'lusdOut', 'malOut')
+
+
+# Columnar per-account storage: accounts get dense integer ids and every field is a list indexed by id
+# (of Python ints, since values exceed 64 bits), reading an unknown account returns zeros and allocates nothing
+# (debug columns are only allocated if "debug_columns" is set, adding to untracked debug column does nothing)
+class AccountStore:
+    def __init__(self, debug_columns=True):
+        self.ids = {}        # account -> id
+        self.accounts = []   # id -> account
+        self.names = ACCOUNT_BALANCES_COLUMNS + (ACCOUNT_DEBUG_COLUMNS if debug_columns else ())
+        self.columns = {name: [] for name in self.names}
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def __contains__(self, account):
+        return account in self.ids
+
+    # Adds account with zero balances (no-op for known accounts)
+    def register(self, account):
+        self._get_or_add_id(account)
+
+    def _get_or_add_id(self, account):
+        id = self.ids.get(account)
+        if id is None:
+            id = self.ids[account] = len(self.accounts)
+            self.accounts.append(account)
+            for column in self.columns.values():
+                column.append(0)
+        return id
+
+    def get(self, account, name):
+        id = self.ids.get(account)
+        column = self.columns.get(name)
+        return 0 if id is None or column is None else column[id]
+
+    def add(self, account, name, amount):
+        id = self._get_or_add_id(account)
+        column = self.columns.get(name)
+        if column is not None:
+            column[id] += amount
+
+    def get_balances_tuple(self, account):
+        id = self.ids.get(account)
+        if id is None:
+            return (0, 0, 0, 0)
+        return tuple(self.columns[name][id] for name in ACCOUNT_BALANCES_COLUMNS)
+
+    def get_balances(self, account):
+        return AccountBalances(*self.get_balances_tuple(account))
+
+    def set_balances(self, account, balances):
+        id = self._get_or_add_id(account)
+        for (name, value) in zip(ACCOUNT_BALANCES_COLUMNS, balances.to_tuple()):
+            self.columns[name][id] = value
+
+    # (debug columns are kept)
+    def clear_balances(self, account):
+        id = self.ids.get(account)
+        if id is not None:
+            for name in ACCOUNT_BALANCES_COLUMNS:
+                self.columns[name][id] = 0
+
+    # Returns (accounts, {column name -> values}) ordered by id (copies)
+    def export_columns(self):
+        return (list(self.accounts), {name: list(column) for (name, column) in self.columns.items()})
+
+    # Sets given columns of "accounts" (missing columns of new accounts are zeros), new accounts are appended in bulk
+    def import_columns(self, accounts, columns):
+        assert all(len(values) == len(accounts) for values in columns.values()), "columns must match accounts"
+        assert set(columns).issubset(self.names), f"unknown columns: {set(columns) - set(self.names)}"
+        ids = [self.ids.get(account) for account in accounts]
+        new_indexes = [i for (i, id) in enumerate(ids) if id is None]
+        next_id = len(self.accounts)
+        for (offset, i) in enumerate(new_indexes):
+            assert accounts[i] not in self.ids, f"duplicate account: {accounts[i]}"
+            ids[i] = self.ids[accounts[i]] = next_id + offset
+        self.accounts.extend(accounts[i] for i in new_indexes)
+        for (name, column) in self.columns.items():
+            values = columns.get(name)
+            if values is None:
+                column.extend([0] * len(new_indexes))
+                continue
+            column.extend([0] * len(new_indexes))
+            for (id, value) in zip(ids, values):
+                column[id] = value
+
+
 class GammaFarmPythonSimulator:
     DECIMAL_PRECISION = E18
 
-    def __init__(self, malToDistribute, malDistributionPeriodSeconds, malRewardPerSecond, malDecayFactor, malDecayPeriodSeconds=86400, debug=False):
+    # ("account_debug_columns=False" keeps only totals of account LUSD in/out and MAL out, which saves memory
+    # with many accounts, but then gathered state has no per account debug values to compare)
+    def __init__(self, malToDistribute, malDistributionPeriodSeconds, malRewardPerSecond, malDecayFactor, malDecayPeriodSeconds=86400, debug=False,
+                 account_debug_columns=True):
         self.lusdStabilityPool = TestStabilityPool()
         self.blockTimestamp = 0
         # --- Global MAL parameters ---
@@ -98,6 +260,7 @@ class GammaFarmPythonSimulator:
         self.malDecayFactor = malDecayFactor
         self.malToDistribute = malToDistribute
         self.malRewardPerSecond = malRewardPerSecond
+        self.malDecayPowers = DecPowCache(malDecayFactor)
         # --- Total balances and state variables ---
         self.totalLusd = 0
         self.totalLusdStaked = 0
@@ -105,12 +268,12 @@ class GammaFarmPythonSimulator:
         self.totalLusdToUnstake = 0
         self.lastTotalMalRewards = 0
         self.lastMalRewardPerAvailableCumS = 0
+        self.lastMalRewardUpdateTimestamp = None  # (simulation only: MAL cumulative sum is up to date at it)
         # --- Per account variables ---
-        self.accountBalances = defaultdict(lambda: AccountBalances(0, 0, 0, 0))
+        self.accounts = AccountStore(account_debug_columns)  # (also holds per account debug LUSD in/out and MAL out)
         # --- Epoch variables ---
-        self.epochSnapshots = defaultdict(lambda: Snapshot(0, 0, 0))
-        self.previousResetEpoch = defaultdict(lambda: 0)
-        self.epochSnapshots[0].lusdProfitFactorCumP = self.DECIMAL_PRECISION
+        self.epochSnapshots = EpochSnapshotStore(Snapshot(self.DECIMAL_PRECISION, 0, 0))
+        self.resetEpochs = []  # sorted reset epochs (stand in for GammaFarm's previousResetEpoch, see _hasPreviousResetEpoch)
         self.epochStartTime = 0
         self.epoch = 0
         self.lastResetEpoch = 0
@@ -118,10 +281,7 @@ class GammaFarmPythonSimulator:
         self.isEmergencyState = False
         # --- Debug ---
         self.events_history = []
-        self.users = set()
-        self.userLusdIn = defaultdict(lambda: 0)  # debug
-        self.userLusdOut = defaultdict(lambda: 0)  # debug
-        self.userMalOut = defaultdict(lambda: 0)  # debug
+        self.accountDebugTotals = {name: 0 for name in ACCOUNT_DEBUG_COLUMNS}
         self.totalLusdReward = 0  # debug
         self.totalLusdSpLoss = 0  # debug
         self.debug = debug or DEBUG  # debug
@@ -131,16 +291,21 @@ class GammaFarmPythonSimulator:
             self.fout = open(f"{dir}/log_py.txt", "w")
 
 
+    # Accounts (of all events so far, including those with zero balances)
+    @property
+    def users(self):
+        return self.accounts.ids.keys()
+
     # --- Account methods ---
 
     def deposit(self, e):
         (self.blockTimestamp, msgSender, _lusdAmount) = (e.ts, e.user, e.amount)
         assert _lusdAmount >= E18
         newLastMalRewardPerAvailableCumS = self._updateMalRewardCumulativeSum()
-        oldBalances = self.accountBalances[msgSender]
+        oldBalances = self.accounts.get_balances(msgSender)
         newBalances = self._calculateAccountBalances(oldBalances, newLastMalRewardPerAvailableCumS)
         # Transfer LUSD:
-        self.userLusdIn[msgSender] += _lusdAmount
+        self._addAccountDebugValue(msgSender, 'lusdIn', _lusdAmount)
         # Update total balances:
         self.totalLusd += _lusdAmount
         self.totalLusdToStake += _lusdAmount
@@ -153,7 +318,7 @@ class GammaFarmPythonSimulator:
         (self.blockTimestamp, msgSender) = (e.ts, e.user)
         assert not self.isEmergencyState
         newLastMalRewardPerAvailableCumS = self._updateMalRewardCumulativeSum()
-        oldBalances = self.accountBalances[msgSender]
+        oldBalances = self.accounts.get_balances(msgSender)
         newBalances = self._calculateAccountBalances(oldBalances, newLastMalRewardPerAvailableCumS)
         (lusdToStake, lusdStaked, accountEpoch, shouldUnstake) = _unpackAccountStakeData(newBalances.lusdStakeData)
         assert lusdStaked != 0
@@ -167,7 +332,7 @@ class GammaFarmPythonSimulator:
     def withdraw(self, e):
         (self.blockTimestamp, msgSender) = (e.ts, e.user)
         newLastMalRewardPerAvailableCumS = self._updateMalRewardCumulativeSum()
-        oldBalances = self.accountBalances[msgSender]
+        oldBalances = self.accounts.get_balances(msgSender)
         newBalances = self._calculateAccountBalances(oldBalances, newLastMalRewardPerAvailableCumS)
         (lusdToStake, lusdStaked, accountEpoch, shouldUnstake) = _unpackAccountStakeData(newBalances.lusdStakeData)
         isEmergencyState_ = self.isEmergencyState
@@ -175,10 +340,10 @@ class GammaFarmPythonSimulator:
         _lusdAmountWithdrawn = lusdToStake + newBalances.lusdUnstaked + (lusdStaked if isEmergencyState_ else 0)
         assert _lusdAmountWithdrawn != 0
         # Transfer LUSD:
-        self.userLusdOut[msgSender] += _lusdAmountWithdrawn
+        self._addAccountDebugValue(msgSender, 'lusdOut', _lusdAmountWithdrawn)
         # Transfer MAL:
         if (newBalances.malRewards != 0):
-            self.userMalOut[msgSender] += newBalances.malRewards
+            self._addAccountDebugValue(msgSender, 'malOut', newBalances.malRewards)
             newBalances.malRewards = 0
         # Update total balances:
         self.totalLusd -= _lusdAmountWithdrawn
@@ -199,7 +364,7 @@ class GammaFarmPythonSimulator:
         (lusdReward, totalLusdStakedAfter) = self._mock_epoch_reward_and_loss(e)
         assert not self.isEmergencyState and lusdReward == 0
         newLastMalRewardPerAvailableCumS = self._updateMalRewardCumulativeSum()
-        oldBalances = self.accountBalances[msgSender]
+        oldBalances = self.accounts.get_balances(msgSender)
         newBalances = self._calculateAccountBalances(oldBalances, newLastMalRewardPerAvailableCumS)
         (lusdToStake, lusdStaked, _, shouldUnstake) = _unpackAccountStakeData(newBalances.lusdStakeData)
         assert lusdStaked != 0
@@ -215,10 +380,10 @@ class GammaFarmPythonSimulator:
         # Withdraw from available balance:
         _lusdAmountWithdrawn += lusdToStake + newBalances.lusdUnstaked
         # Transfer LUSD:
-        self.userLusdOut[msgSender] += _lusdAmountWithdrawn
+        self._addAccountDebugValue(msgSender, 'lusdOut', _lusdAmountWithdrawn)
         # Transfer MAL:
         if (newBalances.malRewards != 0):
-            self.userMalOut[msgSender] += newBalances.malRewards
+            self._addAccountDebugValue(msgSender, 'malOut', newBalances.malRewards)
         # Update total balances:
         self.totalLusd -= lusdStaked + lusdToStake + newBalances.lusdUnstaked
         self.totalLusdStaked = totalLusdStakedBefore - lusdStaked
@@ -227,17 +392,17 @@ class GammaFarmPythonSimulator:
         if (shouldUnstake):
             self.totalLusdToUnstake -= lusdStaked
         # Update account balances:
-        self.accountBalances[msgSender] = AccountBalances()
+        self._updateAccountBalances(msgSender, oldBalances, AccountBalances())
 
     def claim(self, e):
         (self.blockTimestamp, msgSender) = (e.ts, e.user)
         newLastMalRewardPerAvailableCumS = self._updateMalRewardCumulativeSum()
-        oldBalances = self.accountBalances[msgSender]
+        oldBalances = self.accounts.get_balances(msgSender)
         newBalances = self._calculateAccountBalances(oldBalances, newLastMalRewardPerAvailableCumS)
         assert newBalances.malRewards != 0
         # Transfer MAL:
         if newBalances.malRewards != 0:
-            self.userMalOut[msgSender] += newBalances.malRewards
+            self._addAccountDebugValue(msgSender, 'malOut', newBalances.malRewards)
             newBalances.malRewards = 0
         # Update account balances:
         self._updateAccountBalances(msgSender, oldBalances, newBalances)
@@ -246,7 +411,10 @@ class GammaFarmPythonSimulator:
 
     def getAccountBalances(self, _account):
         (_, newLastMalRewardPerAvailableCumS) = self._calculateMalRewardCumulativeSum(self.lastTotalMalRewards, self.lastMalRewardPerAvailableCumS)
-        newBalances = self._calculateAccountBalances(self.accountBalances[_account], newLastMalRewardPerAvailableCumS)
+        return self._getAccountBalances(self.accounts.get_balances(_account), newLastMalRewardPerAvailableCumS)
+
+    def _getAccountBalances(self, _balances, _newLastMalRewardPerAvailableCumS):
+        newBalances = self._calculateAccountBalances(_balances, _newLastMalRewardPerAvailableCumS)
         (lusdToStake, lusdStaked, _, shouldUnstake) = _unpackAccountStakeData(newBalances.lusdStakeData)
         lusdAvailable = lusdToStake + newBalances.lusdUnstaked
         malRewards = newBalances.malRewards
@@ -346,8 +514,10 @@ class GammaFarmPythonSimulator:
         if _totalLusdStakedBefore != 0:
             newLusdProfitFactorCumP = newLusdProfitFactorCumP * (_lusdReward + _totalLusdStakedAfter) // _totalLusdStakedBefore
         if newLusdProfitFactorCumP == 0:
-            self.previousResetEpoch[epoch_ + 1] = self.lastResetEpoch
+            newLusdProfitFactorCumP = self.DECIMAL_PRECISION
             self.lastResetEpoch = epoch_ + 1
+            self.resetEpochs.append(epoch_ + 1)
+            self.epochSnapshots.pin(epoch_ + 1)
         # Save epoch snapshot:
         self.epochSnapshots[epoch_ + 1] = Snapshot(
             newLusdProfitFactorCumP,
@@ -362,18 +532,28 @@ class GammaFarmPythonSimulator:
 
     def _updateAccountBalances(self, _account, _oldBalances, _newBalances):
         if (_newBalances.lusdStakeData >> 32) == 0 and _newBalances.malRewards == 0 and _newBalances.lusdUnstaked == 0:
-            self.accountBalances[_account] = AccountBalances()
-            return
-        if _oldBalances.lusdStakeData != _newBalances.lusdStakeData:
-            self.accountBalances[_account].lusdStakeData = _newBalances.lusdStakeData
-        if _oldBalances.malRewardPerAvailableCumS != _newBalances.malRewardPerAvailableCumS:
-            self.accountBalances[_account].malRewardPerAvailableCumS = _newBalances.malRewardPerAvailableCumS
-        if _oldBalances.malRewards != _newBalances.malRewards:
-            self.accountBalances[_account].malRewards = _newBalances.malRewards
-        if _oldBalances.lusdUnstaked != _newBalances.lusdUnstaked:
-            self.accountBalances[_account].lusdUnstaked = _newBalances.lusdUnstaked
+            self.accounts.clear_balances(_account)
+            _newBalances = AccountBalances()
+        else:
+            self.accounts.set_balances(_account, _newBalances)
+        # Move account's reference to its new epoch (new one first, so shared snapshots are not compacted):
+        (oldEpoch, newEpoch) = (_getReferencedEpoch(_oldBalances), _getReferencedEpoch(_newBalances))
+        if oldEpoch != newEpoch:
+            if newEpoch is not None:
+                self.epochSnapshots.retain(newEpoch)
+            if oldEpoch is not None:
+                self.epochSnapshots.release(oldEpoch)
+
+    # (debug: account LUSD in/out or MAL out, totals are kept even without per account debug columns)
+    def _addAccountDebugValue(self, _account, _name, _amount):
+        self.accountDebugTotals[_name] += _amount
+        self.accounts.add(_account, _name, _amount)
 
     def _updateMalRewardCumulativeSum(self):
+        # Later updates within a block find no new MAL reward, i.e. leave cumulative sum as is:
+        if self.lastMalRewardUpdateTimestamp == self.blockTimestamp:
+            return self.lastMalRewardPerAvailableCumS
+        self.lastMalRewardUpdateTimestamp = self.blockTimestamp
         lastTotalMalRewards_ = self.lastTotalMalRewards
         lastMalRewardPerAvailableCumS_ = self.lastMalRewardPerAvailableCumS
         (newLastTotalMalRewards, newLastMalRewardPerAvailableCumS) = self._calculateMalRewardCumulativeSum(
@@ -410,6 +590,11 @@ class GammaFarmPythonSimulator:
             _newLastMalRewardsPerAvailableCumS += malRewardSinceLastUpdate * self.DECIMAL_PRECISION // totalLusd_
         return (_newLastTotalMalRewards, _newLastMalRewardsPerAvailableCumS)
 
+    # Whether "_epoch" is a reset epoch which has a previous one (GammaFarm: previousResetEpoch[_epoch] != 0)
+    def _hasPreviousResetEpoch(self, _epoch):
+        i = bisect_left(self.resetEpochs, _epoch)
+        return 0 < i < len(self.resetEpochs) and self.resetEpochs[i] == _epoch
+
     def _calculateAccountBalances(self, _oldBalances, _newLastMalRewardPerAvailableCumS):
         epoch_ = self.epoch
         lastResetEpoch_ = self.lastResetEpoch
@@ -423,7 +608,7 @@ class GammaFarmPythonSimulator:
             (newLusdStaked, newMalRewards) = self._calculateAccountBalancesFromToSnapshots(
                 newLusdUnstaked + newLusdToStake, newLusdStaked, newMalRewards, fromSnapshot, accountEpochSnapshot
             )
-            if (lastResetEpoch_ != 0 and (accountEpoch + 1 == lastResetEpoch_ or self.previousResetEpoch[accountEpoch + 1] != 0)):
+            if (lastResetEpoch_ != 0 and (accountEpoch + 1 == lastResetEpoch_ or self._hasPreviousResetEpoch(accountEpoch + 1))):
                 newLusdStaked = 0
             # Perform adjustment:
             if (shouldUnstake):
@@ -436,9 +621,8 @@ class GammaFarmPythonSimulator:
             fromSnapshot = accountEpochSnapshot
         # Check practically impossible event of epoch reset:
         if (lastResetEpoch_ != 0 and lastResetEpoch_ > accountEpoch + 1):
-            resetEpoch = lastResetEpoch_
-            while (self.previousResetEpoch[resetEpoch] > accountEpoch + 1):
-                resetEpoch = self.previousResetEpoch[resetEpoch]
+            # (first reset after "accountEpoch + 1", same as walking GammaFarm's previousResetEpoch back from lastResetEpoch)
+            resetEpoch = self.resetEpochs[bisect_right(self.resetEpochs, accountEpoch + 1)]
             resetEpochSnapshot = self.epochSnapshots[resetEpoch]
             (newLusdStaked, newMalRewards) = self._calculateAccountBalancesFromToSnapshots(
                 newLusdUnstaked + newLusdToStake, newLusdStaked, newMalRewards, fromSnapshot, resetEpochSnapshot
@@ -481,21 +665,31 @@ class GammaFarmPythonSimulator:
         return _totalMalRewards
 
     def _calculateDecayPower(self, _f, _n):
-        return GammaMath.decPow(_f, _n)
+        return self.malDecayPowers.pow(_n) if _f == self.malDecayPowers.base else dec_pow(_f, _n)
 
     # --- END OF GammaFarm logic ---
 
-    def simulate_events(self, events):
+    def simulate_events(self, events, processes=1):
+        for (ts, block_events) in itertools.groupby(events, key=lambda e: e.ts):
+            self.simulate_block(ts, block_events)
+        return self.gather_state(processes)
+
+    # Simulates "events" of one block (all at "ts") in order: MAL cumulative sum is brought up to "ts" once for the
+    # whole block (results are identical to simulating events one by one)
+    def simulate_block(self, ts, events):
+        assert ts >= self.blockTimestamp, "blocks must be simulated in order"
+        self.blockTimestamp = ts
+        self._updateMalRewardCumulativeSum()
         for e in events:
+            assert e.ts == ts, f"event {e} is not at block timestamp {ts}"
             self.simulate_event(e)
-        return self.gather_state()
 
     def simulate_event(self, e):
         self.events_history.append(e)
         if self.debug:
             self.fout.write(f"=========\n* {e}\n")
         if e.user is not None:
-            self.users.add(e.user)
+            self.accounts.register(e.user)
         if e.type == EventType.DEPOSIT:
             self.deposit(e)
         elif e.type == EventType.WITHDRAW:
@@ -531,27 +725,29 @@ class GammaFarmPythonSimulator:
         self.fout.write(f"  GLOBAL: {', '.join(v)}\n")
         for u in sorted(list(self.users)):
             (A, S, M, lusdToStake, shouldUnstake) = self.getAccountBalances(u)
-            state_str = f"a={A / E18d}, s={S / E18d}, m={M / E18d}, s_in={lusdToStake / E18d}, s_out={shouldUnstake}, LUSD_in={self.userLusdIn[u] / E18d}, LUSD_out={self.userLusdOut[u] / E18d}, MAL_out={self.userMalOut[u] / E18d}"
+            state_str = f"a={A / E18d}, s={S / E18d}, m={M / E18d}, s_in={lusdToStake / E18d}, s_out={shouldUnstake}, LUSD_in={self.accounts.get(u, 'lusdIn') / E18d}, LUSD_out={self.accounts.get(u, 'lusdOut') / E18d}, MAL_out={self.accounts.get(u, 'malOut') / E18d}"
             self.fout.write(f"  {u}: {state_str}\n")
 
-    def gather_state(self):
+    # "processes" other than 1 gathers account balances in parallel (None for CPU count), see _gather_account_balances
+    def gather_state(self, processes=1, chunk_size=GATHER_CHUNK_SIZE):
         s = SimulationState()
-        s.users = self.users
-        for user in self.users:
-            s.userLusdIn[user] = self.userLusdIn[user]
-            s.userLusdOut[user] = self.userLusdOut[user]
-            s.userMalOut[user] = self.userMalOut[user]
-            (s.lusdAvailable[user], s.lusdStaked[user], s.malRewards[user], _, _) = self.getAccountBalances(user)
+        s.users = set(self.users)
+        users = list(self.users)
+        for (user, balances) in zip(users, self._gather_account_balances(users, processes, chunk_size)):
+            s.userLusdIn[user] = self.accounts.get(user, 'lusdIn')
+            s.userLusdOut[user] = self.accounts.get(user, 'lusdOut')
+            s.userMalOut[user] = self.accounts.get(user, 'malOut')
+            (s.lusdAvailable[user], s.lusdStaked[user], s.malRewards[user], _, _) = balances
         (s.totalLusd, s.totalLusdStaked) = self.getTotalBalances()
         lastSnapshot = self.getLastSnapshot()
         s.P = lastSnapshot.lusdProfitFactorCumP
         s.S1 = lastSnapshot.malRewardPerStakedCumS
         s.S2 = lastSnapshot.malRewardPerAvailableCumS
         s.epoch = self.epoch
-        s.totalUserLusdIn = sum(s.userLusdIn.values())
-        s.totalUserLusdOut = sum(s.userLusdOut.values())
+        s.totalUserLusdIn = self.accountDebugTotals['lusdIn']
+        s.totalUserLusdOut = self.accountDebugTotals['lusdOut']
         s.totalMalSupply = self.malToDistribute
-        s.totalMalOut = sum(s.userMalOut.values())
+        s.totalMalOut = self.accountDebugTotals['malOut']
         s.totalLusdReward = self.totalLusdReward
         s.totalLusdSpLoss = self.totalLusdSpLoss
         s.spCompoundedDeposit = self.lusdStabilityPool.getCompoundedLUSDDeposit()
@@ -564,6 +760,20 @@ class GammaFarmPythonSimulator:
         assert sum(s.lusdStaked.values()) <= s.totalLusdStaked
         return s
 
+    # Returns getAccountBalances() of "users" (in order):
+    # - serially, if "processes" is 1 or all accounts fit into a single chunk
+    # - otherwise global state is frozen (see FrozenEpochState) and chunks of "chunk_size" accounts are
+    #   calculated by a pool of worker processes (integer results are identical to serial ones)
+    def _gather_account_balances(self, users, processes=1, chunk_size=GATHER_CHUNK_SIZE):
+        if processes == 1 or len(users) <= chunk_size:
+            return [self.getAccountBalances(user) for user in users]
+        frozen_state = FrozenEpochState(self)
+        chunks = []
+        for i in range(0, len(users), chunk_size):
+            chunks.append([self.accounts.get_balances_tuple(user) for user in users[i:i + chunk_size]])
+        with multiprocessing.Pool(processes, initializer=_init_gather_worker, initargs=(frozen_state,)) as pool:
+            return [balances for chunk_balances in pool.imap(_gather_accounts_chunk, chunks) for balances in chunk_balances]
+
     def get_total_balances(self):
         return self.getTotalBalances()
 
@@ -580,3 +790,42 @@ class GammaFarmPythonSimulator:
         self.totalLusdReward += lusdReward
         self.totalLusdSpLoss += (totalLusdStakedBefore - totalLusdStakedAfter)
         return (lusdReward, totalLusdStakedAfter)
+
+
+# Read-only copy of global state which account balances are calculated from (epoch snapshots, resets and
+# the latest MAL cumulative sum): accounts are independent given it, so their balances can be calculated
+# in worker processes (account calculations are the simulator's own methods, so results are identical)
+class FrozenEpochState:
+    DECIMAL_PRECISION = GammaFarmPythonSimulator.DECIMAL_PRECISION
+
+    def __init__(self, sim):
+        self.epoch = sim.epoch
+        self.lastResetEpoch = sim.lastResetEpoch
+        self.isEmergencyState = sim.isEmergencyState
+        self.epochSnapshots = sim.epochSnapshots.copy()
+        self.resetEpochs = list(sim.resetEpochs)
+        (_, self.newLastMalRewardPerAvailableCumS) = sim._calculateMalRewardCumulativeSum(
+            sim.lastTotalMalRewards, sim.lastMalRewardPerAvailableCumS
+        )
+
+    def getAccountBalances(self, _balances):
+        return self._getAccountBalances(_balances, self.newLastMalRewardPerAvailableCumS)
+
+    _getAccountBalances = GammaFarmPythonSimulator._getAccountBalances
+    _hasPreviousResetEpoch = GammaFarmPythonSimulator._hasPreviousResetEpoch
+    _calculateAccountBalances = GammaFarmPythonSimulator._calculateAccountBalances
+    _calculateAccountBalancesFromToSnapshots = GammaFarmPythonSimulator._calculateAccountBalancesFromToSnapshots
+    _buildSnapshot = GammaFarmPythonSimulator._buildSnapshot
+
+
+_frozen_state = None
+
+
+def _init_gather_worker(frozen_state):
+    global _frozen_state
+    _frozen_state = frozen_state
+
+
+def _gather_accounts_chunk(balances_chunk):
+    return [_frozen_state.getAccountBalances(AccountBalances(*balances)) for balances in balances_chunk]
+
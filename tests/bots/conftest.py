@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# Bot modules import each other as top-level modules (bots are run from "bots" directory):
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "bots"))
+# (bot simulation drives Python farm simulator, whose modules are top-level modules of "scripts/simulation")
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "simulation"))
+
+
+# Bot tests don't use chain, so override chain isolation fixture from tests/conftest.py:
+@pytest.fixture(autouse=True)
+def isolation():
+    pass
+
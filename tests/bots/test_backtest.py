@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+import backtest
+import bot_simulation
+import farm_policy
+import numpy as np
+
+from cadence import MonitoringCadence
+
+import pytest
+
+NUM_STEPS = 30000
+
+
+class Call:
+    def __init__(self, value):
+        self.value = value
+
+    def call(self):
+        return self.value
+
+
+# Stand-in for price provider, Liquity helper and farm contract reading the current series row
+class SeriesRow:
+    def __init__(self, series):
+        self.series = series
+        self.row = 0
+        self.is_emergency_state = False
+        self.functions = self
+
+    def __getitem__(self, name):
+        return self.series[name][self.row]
+
+    def get_eth_price(self):
+        return self['eth_price']
+
+    def get_lusd_price(self, max_age_secs=0):
+        return self['lusd_price']
+
+    def calculate_emergency_signals(self, eth_price):
+        (coll, debt, oracle_price) = (self['lowest_trove_coll'], self['lowest_trove_debt'], self['oracle_eth_price'])
+        system_ratio = self['total_coll'] / self['total_debt']
+        return (1.1 * debt / coll, oracle_price, coll * oracle_price / debt, system_ratio * oracle_price,
+                coll * eth_price / debt, system_ratio * eth_price)
+
+    def isEmergencyState(self):
+        return Call(self.is_emergency_state)
+
+    def epochStartTime(self):
+        return Call(0)
+
+    def getTotalBalances(self):
+        return Call((0, 0))
+
+
+@pytest.fixture
+def series():
+    market = bot_simulation.SyntheticMarket(seed=3, crashes_per_year=200)
+    rows = []
+    for _ in range(NUM_STEPS):
+        market.step()
+        (coll, debt) = market.get_lowest_trove_amounts()
+        rows.append((market.ts, market.eth_price, market.oracle_price, market.lusd_price,
+                     market.total_coll, market.total_debt, coll, debt))
+    columns = np.array(rows).T
+    names = ('ts', 'eth_price', 'oracle_eth_price', 'lusd_price', 'total_coll', 'total_debt', 'lowest_trove_coll', 'lowest_trove_debt')
+    return dict(zip(names, columns))
+
+
+# Runs FarmPolicy at every series row
+def run_policy(series, min_period_before_emergency_recover):
+    row = SeriesRow(series)
+    now_time = lambda: row['ts']
+    policy = farm_policy.FarmPolicy(
+        row, row, row, MonitoringCadence(clock=now_time), now_time,
+        timedelta(days=2), min_period_before_emergency_recover, log=lambda *args, **fields: None,
+    )
+    (withdraws, recovers, in_emergency) = (0, 0, np.zeros(NUM_STEPS, dtype=bool))
+    for i in range(NUM_STEPS):
+        row.row = i
+        action = policy.decide_action()
+        if action == farm_policy.ACTION_EMERGENCY_WITHDRAW:
+            (row.is_emergency_state, withdraws) = (True, withdraws + 1)
+        elif action == farm_policy.ACTION_EMERGENCY_RECOVER:
+            (row.is_emergency_state, recovers) = (False, recovers + 1)
+        in_emergency[i] = row.is_emergency_state
+    return (withdraws, recovers, in_emergency)
+
+
+@pytest.mark.parametrize("recover_delay", [timedelta(hours=1), timedelta(hours=6)])
+def test_backtest_matches_policy(series, recover_delay):
+    (withdraws, recovers, in_emergency) = run_policy(series, recover_delay)
+    result = backtest.backtest(series, backtest.PolicyParams(min_period_before_emergency_recover_secs=recover_delay.total_seconds()))
+    assert withdraws > 0
+    assert (result['emergency_withdraws'], result['emergency_recovers']) == (withdraws, recovers)
+    dt = np.diff(series['ts'], append=series['ts'][-1])
+    expected_pct = 100 * dt[in_emergency].sum() / (series['ts'][-1] - series['ts'][0])
+    assert result['emergency_time_pct'] == pytest.approx(expected_pct)
+
+
+def test_sweep_and_csv_loading(series, tmp_path):
+    prices_path = tmp_path / "prices.csv"
+    np.savetxt(prices_path, np.column_stack([series[name] for name in backtest.PRICE_COLUMNS]),
+               delimiter=",", header=",".join(backtest.PRICE_COLUMNS), comments="")
+    # (snapshots every 10 steps)
+    snapshots_path = str(tmp_path / "snapshots.npz")
+    backtest.save_columns(snapshots_path, {name: series[name][::10] for name in backtest.SNAPSHOT_COLUMNS})
+    loaded = backtest.load_series(str(prices_path), snapshots_path)
+    assert np.array_equal(loaded['total_debt'][:20], np.repeat(series['total_debt'][:20:10], 10))
+    params_grid = backtest.build_param_grid(lusd_min_emergency_price=[1.02, 1.06, 2.0])
+    results = backtest.sweep(loaded, params_grid, processes=2)
+    assert results == [backtest.backtest(loaded, params) for params in params_grid]
+    assert results[-1]['emergency_withdraws'] == 0
+    assert results[-1]['missed_liquidations'] == results[-1]['liquidations']
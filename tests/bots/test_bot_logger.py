@@ -0,0 +1,68 @@
+import json
+import threading
+
+from bot_logger import BotLogger
+
+
+# Logger whose writer thread can be held inside a write (so that records pile up in the queue)
+def build_blocked_logger(path, **kwargs):
+    logger = BotLogger(path, echo=False, flush_interval=0.01, **kwargs)
+    (is_writing, may_write, batch_sizes) = (threading.Event(), threading.Event(), [])
+    write_records = logger._write_records
+    def blocked_write_records(records):
+        batch_sizes.append(len(records))
+        is_writing.set()
+        may_write.wait(5)
+        write_records(records)
+    logger._write_records = blocked_write_records
+    # Writer takes the first record and waits:
+    logger.log("first")
+    assert is_writing.wait(5)
+    return (logger, may_write, batch_sizes)
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_full_queue_drops_records(tmp_path):
+    path = str(tmp_path / "bot.log")
+    (logger, may_write, batch_sizes) = build_blocked_logger(path, max_queue_size=2)
+    for i in range(5):
+        logger.log(f"record {i}")
+    assert logger.dropped_records == 3
+    may_write.set()
+    logger.close()
+    # (drop count is reported ahead of the next batch written)
+    assert [record['msg'] for record in read_records(path)] == ["Dropped 3 log records", "first", "record 0", "record 1"]
+    assert batch_sizes == [1, 2]
+
+
+def test_records_are_written_in_batches_and_flushed_on_close(tmp_path):
+    path = str(tmp_path / "bot.log")
+    (logger, may_write, batch_sizes) = build_blocked_logger(path, batch_size=4)
+    for i in range(9):
+        logger.log(f"record {i}")
+    may_write.set()
+    logger.close()
+    assert not logger.thread.is_alive()
+    assert batch_sizes == [1, 4, 4, 1]
+    assert [record['msg'] for record in read_records(path)] == ["first"] + [f"record {i}" for i in range(9)]
+
+
+def test_context_and_fields(tmp_path):
+    path = str(tmp_path / "bot.log")
+    logger = BotLogger(path, echo=False, flush_interval=0.01)
+    logger.set_context(block=100, iteration=1)
+    logger.log("Emergency evaluation", lusd=1.1)
+    logger.set_context(farm="0xfarm")
+    logger.log(ts="ignored")
+    logger.close()
+    records = read_records(path)
+    assert {k: records[0][k] for k in ['block', 'iteration', 'msg', 'lusd']} == \
+        {'block': 100, 'iteration': 1, 'msg': "Emergency evaluation | lusd=1.1", 'lusd': 1.1}
+    assert 'farm' not in records[0]
+    # Fields never override record keys:
+    assert (records[1]['farm'], records[1]['msg']) == ("0xfarm", "ts=ignored")
+    assert records[1]['ts'] != "ignored"
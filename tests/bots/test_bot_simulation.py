@@ -0,0 +1,54 @@
+import bot_simulation
+
+import pytest
+
+
+# Market without noise or random crashes, whose ETH price halves at "drop_ts" (LUSD jumps to its cap at once)
+class ScriptedDropMarket(bot_simulation.SyntheticMarket):
+    def __init__(self, drop_ts, seed=0):
+        super().__init__(seed, volatility=0, crashes_per_year=0)
+        self.drop_ts = drop_ts
+
+    def step(self):
+        is_dropped = self.ts + self.step_secs >= self.drop_ts
+        self.eth_price = 1000.0 if is_dropped else 2000.0
+        liquidations = super().step()
+        self.lusd_price = bot_simulation.LUSD_MAX_PRICE if is_dropped else 1.0
+        return liquidations
+
+
+def test_simulation_starts_epochs_and_reacts_to_emergencies():
+    simulation = bot_simulation.BotSimulation(seed=1, crashes_per_year=12)
+    stats = simulation.run(bot_simulation.YEAR_SECS // 4)
+    assert stats['epochs'] > 30
+    assert stats['epoch_duration_days_max'] == pytest.approx(2, abs=0.01)
+    assert stats['emergency_withdraws'] >= 1
+    assert stats['emergency_withdraws'] - stats['emergency_recovers'] in (0, 1)
+    assert stats['emergency_episodes_missed'] < stats['emergency_episodes']
+    # Farm simulator invariants hold after all actions:
+    simulation.farm.sim.gather_state()
+
+
+def test_simulation_crosses_emergency_boundary():
+    # Drop between oracle heartbeats, so oracle only catches up after ORACLE_UPDATE_LAG_SECS:
+    drop_ts = 3 * bot_simulation.DAY_SECS + 30 * 60
+    simulation = bot_simulation.BotSimulation(market=ScriptedDropMarket(drop_ts))
+    simulation.run(4 * bot_simulation.DAY_SECS)
+    assert [action for (_, action) in simulation.actions] == \
+        [bot_simulation.ACTION_START_NEW_EPOCH, bot_simulation.ACTION_EMERGENCY_WITHDRAW, bot_simulation.ACTION_EMERGENCY_RECOVER]
+    ((_, withdraw_ts), (_, recover_ts)) = [(action, ts) for (ts, action) in simulation.actions[1:]]
+    # Withdraw happens before oracle catches up with the drop (and liquidates undercollateralized troves):
+    assert drop_ts <= withdraw_ts < drop_ts + bot_simulation.ORACLE_UPDATE_LAG_SECS
+    assert simulation.market.liquidations[0][0] == drop_ts + bot_simulation.ORACLE_UPDATE_LAG_SECS
+    # Emergency condition ends with liquidations, recover follows after "min_period_before_emergency_recover":
+    (recover_min_delay_secs, max_interval_secs) = (6 * 60 * 60, 5 * 60)
+    expected_recover_ts = drop_ts + bot_simulation.ORACLE_UPDATE_LAG_SECS + recover_min_delay_secs
+    assert expected_recover_ts - max_interval_secs <= recover_ts <= expected_recover_ts + max_interval_secs
+    assert not simulation.farm.sim.isEmergencyState
+    assert simulation.emergency_episodes == [(drop_ts, withdraw_ts)]
+    simulation.farm.sim.gather_state()
+
+
+def test_simulation_is_deterministic():
+    stats = [bot_simulation.BotSimulation(seed=7).run(30 * bot_simulation.DAY_SECS) for _ in range(2)]
+    assert stats[0] == stats[1]
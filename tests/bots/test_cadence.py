@@ -0,0 +1,68 @@
+from cadence import MonitoringCadence, CLOSE_TO_EMERGENCY_DISTANCE
+
+import pytest
+
+CCR = 1.5
+
+
+def feed_prices(cadence, prices, interval_secs=60):
+    for (i, price) in enumerate(prices):
+        cadence.on_eth_price(price, ts=(i + 1) * interval_secs)
+    return len(prices) * interval_secs
+
+
+def test_polls_rarely_far_from_emergency():
+    cadence = MonitoringCadence(min_interval_secs=12, max_interval_secs=300)
+    ts = feed_prices(cadence, [2000, 2001, 1999, 2000])
+    cadence.update_signals(2000, undercoll_eth_price=1200, TCR=2.5, CCR=CCR, ts=ts + 60)
+    assert cadence.distance_to_emergency == pytest.approx(0.4)
+    assert not cadence.is_close_to_emergency()
+    assert cadence.get_next_interval_secs() == 300
+    assert cadence.get_cache_max_age_secs(600) == 600
+
+
+@pytest.mark.parametrize("undercoll_eth_price,TCR", [(1990, 2.5), (1000, 1.51), (2100, 2.5)])
+def test_polls_every_block_close_to_emergency(undercoll_eth_price, TCR):
+    cadence = MonitoringCadence(min_interval_secs=12, max_interval_secs=300)
+    cadence.update_signals(2000, undercoll_eth_price=undercoll_eth_price, TCR=TCR, CCR=CCR, ts=60)
+    assert cadence.distance_to_emergency <= CLOSE_TO_EMERGENCY_DISTANCE
+    assert cadence.is_close_to_emergency()
+    assert cadence.get_next_interval_secs() == 12
+    assert cadence.get_cache_max_age_secs(600) == 0
+
+
+def test_polls_calmly_during_ongoing_emergency():
+    cadence = MonitoringCadence(min_interval_secs=12, max_interval_secs=300)
+    cadence.update_signals(2000, undercoll_eth_price=2100, TCR=1.4, CCR=CCR, ts=60)
+    assert cadence.distance_to_emergency < 0
+    # Past the boundary, but some farm has not withdrawn yet:
+    (farm_a, farm_b) = (object(), object())
+    cadence.on_farm_emergency_state(farm_a, True)
+    cadence.on_farm_emergency_state(farm_b, False)
+    assert cadence.get_next_interval_secs() == 12
+    assert cadence.get_cache_max_age_secs(600) == 0
+    # Every farm is in emergency state:
+    cadence.on_farm_emergency_state(farm_b, True)
+    assert not cadence.is_close_to_emergency()
+    assert cadence.get_next_interval_secs() == 300
+    assert cadence.get_cache_max_age_secs(600) == 600
+    # Once back above the boundary, system close to it is polled every block again:
+    cadence.update_signals(2000, undercoll_eth_price=1990, TCR=2.5, CCR=CCR, ts=120)
+    assert cadence.get_next_interval_secs() == 12
+
+
+def test_volatility_shortens_interval():
+    (calm, stressed) = (MonitoringCadence(12, 300), MonitoringCadence(12, 300))
+    ts = feed_prices(calm, [2000, 2002, 1998, 2001, 2000])
+    feed_prices(stressed, [2000, 2100, 1950, 2050, 2000])
+    calm.update_signals(2000, undercoll_eth_price=1700, TCR=2.0, CCR=CCR, ts=ts + 60)
+    stressed.update_signals(2000, undercoll_eth_price=1700, TCR=2.0, CCR=CCR, ts=ts + 60)
+    assert stressed.get_volatility() > calm.get_volatility()
+    assert stressed.get_next_interval_secs() < calm.get_next_interval_secs()
+    assert 12 <= stressed.get_next_interval_secs() < 300
+
+
+def test_polls_every_block_without_signals():
+    cadence = MonitoringCadence(min_interval_secs=12, max_interval_secs=300)
+    assert cadence.get_next_interval_secs() == 12
+    assert cadence.get_cache_max_age_secs(600) == 0
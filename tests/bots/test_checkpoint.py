@@ -0,0 +1,118 @@
+import json
+import time
+
+from datetime import timedelta
+from types import SimpleNamespace
+
+from cadence import MonitoringCadence
+from checkpoint import Checkpointer, load_checkpoint, save_checkpoint
+from farm_policy import FarmPolicy
+from nonce_manager import NonceManager
+from price_provider import PriceProvider
+
+import pytest
+
+IDENTITY = {'chain_id': 1, 'gamma_farm': "0xfarm", 'owner': "0xowner"}
+
+
+class FakeEth:
+    def __init__(self, pending_nonce, latest_nonce):
+        self.nonces = {'pending': pending_nonce, 'latest': latest_nonce}
+
+    def get_transaction_count(self, address, block_identifier):
+        return self.nonces.get(block_identifier, self.nonces['latest'])
+
+
+def build_nonce_manager(pending_nonce, latest_nonce):
+    return NonceManager(SimpleNamespace(eth=FakeEth(pending_nonce, latest_nonce)), "0xowner", log=lambda *args: None)
+
+
+def build_tx(nonce, priority_fee):
+    return {'nonce': nonce, 'to': "0xfarm", 'data': "0x1234", 'maxPriorityFeePerGas': priority_fee, 'maxFeePerGas': 10 * priority_fee}
+
+
+def test_load_rejects_unusable_checkpoints(tmp_path):
+    path = str(tmp_path / "bot.checkpoint.json")
+    assert load_checkpoint(path, IDENTITY, 60) is None
+    save_checkpoint(path, IDENTITY, {'cadence': {'distance_to_emergency': 0.1}})
+    assert load_checkpoint(path, IDENTITY, 60) == {'cadence': {'distance_to_emergency': 0.1}}
+    assert load_checkpoint(path, {**IDENTITY, 'chain_id': 5}, 60, log=lambda *args: None) is None
+    assert load_checkpoint(path, IDENTITY, -1, log=lambda *args: None) is None
+    with open(path, 'w') as f:
+        f.write('{"version": 1, "saved_')
+    assert load_checkpoint(path, IDENTITY, 60, log=lambda *args: None) is None
+
+
+def test_components_round_trip(tmp_path):
+    path = str(tmp_path / "bot.checkpoint.json")
+    (cadence, price_provider) = (MonitoringCadence(), PriceProvider())
+    for (ts, eth_price) in [(100, 2000.0), (160, 1990.0)]:
+        cadence.on_eth_price(eth_price, ts)
+    cadence.distance_to_emergency = 0.05
+    (price_provider.lusd_price, price_provider.lusd_price_ts, price_provider.lusd_price_fetch_ts) = (1.01, 150, time.time())
+    components = {'cadence': cadence, 'price_provider': price_provider}
+    assert Checkpointer(path, IDENTITY, components, interval_secs=60, max_age_secs=60).save()
+    (new_cadence, new_price_provider) = (MonitoringCadence(), PriceProvider())
+    checkpointer = Checkpointer(path, IDENTITY, {'cadence': new_cadence, 'price_provider': new_price_provider}, 60, 60)
+    assert checkpointer.restore() == ['cadence', 'price_provider']
+    assert list(new_cadence.eth_prices) == list(cadence.eth_prices)
+    assert new_cadence.get_volatility() == cadence.get_volatility()
+    # Cached LUSD price is served without refetching:
+    assert new_price_provider.get_lusd_price(max_age_secs=600) == 1.01
+    assert new_price_provider.cache_hits == 1
+
+
+def test_restore_skips_stale_and_invalid_components(tmp_path):
+    path = str(tmp_path / "bot.checkpoint.json")
+    save_checkpoint(path, IDENTITY, {'cadence': {'eth_prices': [], 'distance_to_emergency': 0.5}, 'price_provider': {}})
+    (cadence, price_provider) = (MonitoringCadence(), PriceProvider())
+    checkpointer = Checkpointer(path, IDENTITY, {'cadence': cadence, 'price_provider': price_provider}, 60, 60, log=lambda *args: None)
+    assert checkpointer.restore() == ['cadence']
+    assert checkpointer.restore(get_stale=lambda states: ('cadence',)) == []
+
+
+def test_pending_txs_are_replaced_after_restart():
+    nonce_manager = build_nonce_manager(pending_nonce=7, latest_nonce=5)
+    nonce_manager.sync()
+    for nonce in [nonce_manager.reserve(), nonce_manager.reserve()]:
+        nonce_manager.mark_sent(build_tx(nonce, priority_fee=100), tx_hash=f"0xhash{nonce}")
+    state = json.loads(json.dumps(nonce_manager.to_checkpoint()))
+    # After restart nonce 7 was mined, nonce 8 is still pending:
+    restarted = build_nonce_manager(pending_nonce=9, latest_nonce=8)
+    restarted.sync()
+    restarted.restore_checkpoint(state)
+    assert restarted.sent_tx_hashes == {8: ["0xhash8"]}
+    assert restarted.reserve() == 8
+    assert restarted.get_replacement_fees(8) == (112, 1125)
+    # (orphaned tx is still cancelled, even though the nonce was not sent since restart)
+    assert restarted.build_cancel_tx(8, chain_id=1)['maxFeePerGas'] == 1125
+    assert restarted.reserve() == 9
+    assert restarted.get_oldest_pending_tx_age() is not None
+
+
+def test_reserved_unsent_nonces_are_reused_after_restart():
+    nonce_manager = build_nonce_manager(pending_nonce=5, latest_nonce=5)
+    nonce_manager.sync()
+    assert [nonce_manager.reserve(), nonce_manager.reserve()] == [5, 6]
+    state = json.loads(json.dumps(nonce_manager.to_checkpoint()))
+    # Neither tx was sent before restart, so there must be no gap:
+    restarted = build_nonce_manager(pending_nonce=5, latest_nonce=5)
+    restarted.sync()
+    restarted.restore_checkpoint(state)
+    assert [restarted.reserve(), restarted.reserve()] == [5, 6]
+
+
+@pytest.mark.parametrize("downtime_secs,expected_last_emergency_condition_ts", [(60, 1000), (3600, 5100)])
+def test_policy_counts_long_downtime_as_emergency(downtime_secs, expected_last_emergency_condition_ts):
+    clock = SimpleNamespace(ts=1500)
+    build_policy = lambda: FarmPolicy(
+        None, None, None, MonitoringCadence(max_interval_secs=300), lambda: clock.ts,
+        timedelta(days=2), timedelta(hours=6), log=lambda *args, **fields: None,
+    )
+    policy = build_policy()
+    policy.last_emergency_condition_ts = 1000
+    state = policy.to_checkpoint()
+    clock.ts += downtime_secs
+    restarted = build_policy()
+    restarted.restore_checkpoint(state)
+    assert restarted.last_emergency_condition_ts == expected_last_emergency_condition_ts
@@ -0,0 +1,62 @@
+import json
+import os
+
+from web3 import Web3
+
+from contract_registry import AbiStore, abi_store, get_contract
+
+ADDRESS = "0xa39739ef8b0231dbfa0dcda07d7e29faabcf4bb2"
+ABI = [
+    {'type': 'function', 'name': 'getTCR', 'inputs': [{'name': '_price', 'type': 'uint256'}],
+     'outputs': [{'name': '', 'type': 'uint256'}], 'stateMutability': 'view'},
+    {'type': 'function', 'name': 'Troves', 'inputs': [{'name': '', 'type': 'address'}],
+     'outputs': [{'name': 'debt', 'type': 'uint256'}, {'name': 'coll', 'type': 'uint256'}], 'stateMutability': 'view'},
+    {'type': 'event', 'name': 'TroveUpdated', 'inputs': [], 'anonymous': False},
+]
+
+
+def write_abi(path, abi):
+    with open(path, 'w') as f:
+        json.dump(abi, f)
+
+
+def test_contracts_are_lazy_singletons():
+    w3 = Web3(Web3.HTTPProvider("http://127.0.0.1:1"))
+    trove_manager = get_contract(w3, "TroveManager", ADDRESS)
+    assert trove_manager.contract is None
+    assert get_contract(w3, "TroveManager", Web3.toChecksumAddress(ADDRESS)) is trove_manager
+    assert trove_manager.address == Web3.toChecksumAddress(ADDRESS)
+    assert trove_manager.functions.getTCR(10**18)._encode_transaction_data()[:10] == "0xb82f263d"
+    assert trove_manager.contract is not None
+    assert get_contract(Web3(Web3.HTTPProvider("http://127.0.0.1:1")), "TroveManager", ADDRESS) is not trove_manager
+
+
+def test_compiled_functions_are_cached_on_disk(tmp_path):
+    (abi_path, cache_path) = (str(tmp_path / "TroveManager.json"), str(tmp_path / "cache" / "compiled.json"))
+    write_abi(abi_path, ABI)
+    functions = AbiStore(cache_path).get_functions(abi_path)
+    assert sorted(functions) == ['Troves', 'getTCR']
+    assert functions['getTCR'][0].selector == bytes.fromhex("b82f263d")
+    assert functions['Troves'][0].output_types == ('uint256', 'uint256')
+    # Another process reads compiled functions from cache without parsing ABI:
+    store = AbiStore(cache_path)
+    assert store.get_function(abi_path, 'getTCR') == functions['getTCR'][0]
+    assert store.abis == {}
+    # Cache is plain JSON:
+    with open(cache_path) as f:
+        cache = json.load(f)
+    (_, cached_functions) = cache['compiled'][os.path.normpath(abi_path)]
+    assert cached_functions['getTCR'] == [['getTCR', "b82f263d", ['uint256'], ['uint256']]]
+    # Unreadable cache is ignored:
+    with open(cache_path, 'w') as f:
+        f.write("not json")
+    assert AbiStore(cache_path).get_function(abi_path, 'getTCR') == functions['getTCR'][0]
+    # Modified ABI file is recompiled:
+    write_abi(abi_path, ABI[1:])
+    os.utime(abi_path, ns=(0, 0))
+    assert sorted(AbiStore(cache_path).get_functions(abi_path)) == ['Troves']
+
+
+def test_bot_abis_compile():
+    for name in ["CommunityIssuance", "LUSDStabilityPool", "PriceFeed", "SortedTroves", "TroveManager", "ERC20", "GammaFarm"]:
+        assert abi_store.get_functions(name)
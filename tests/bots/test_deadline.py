@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import block_watcher
+import deadline
+from block_watcher import BlockWatcher
+from deadline import Deadline, DeadlineExceeded, DeadlineHTTPProvider, check_deadline, deadline_scope, get_deadline, get_timeout
+
+import pytest
+
+
+# Stands in for "time" module: sleeping advances the clock
+class FakeClock:
+    def __init__(self, ts=100.0):
+        self.ts = ts
+
+    def monotonic(self):
+        return self.ts
+
+    def time(self):
+        return self.ts
+
+    def sleep(self, secs):
+        self.ts += secs
+
+
+# Chain whose head never moves (every wait times out), counts polls
+class StuckEth:
+    def __init__(self, block_number=10):
+        self.block_number_value = block_number
+        self.polls = 0
+
+    @property
+    def block_number(self):
+        self.polls += 1
+        return self.block_number_value
+
+    def get_block(self, number):
+        return SimpleNamespace(number=number)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(deadline, "time", clock)
+    monkeypatch.setattr(block_watcher, "time", clock)
+    return clock
+
+
+def test_deadline_expires(clock):
+    budget = Deadline(10)
+    assert budget.get_remaining() == 10
+    assert budget.get_timeout(30) == 10
+    assert budget.get_timeout(4) == 4
+    clock.ts += 7
+    budget.check()
+    assert budget.get_timeout(30) == 3
+    clock.ts += 3
+    with pytest.raises(DeadlineExceeded):
+        budget.check()
+    with pytest.raises(DeadlineExceeded):
+        budget.get_timeout(30)
+
+
+def test_deadline_scope_shields_block(clock):
+    assert get_deadline() is None
+    assert get_timeout(30) == 30
+    outer = Deadline(5)
+    with deadline_scope(outer):
+        assert get_deadline() is outer
+        clock.ts += 6
+        with pytest.raises(DeadlineExceeded):
+            check_deadline()
+        # None shields the block from the expired outer deadline:
+        with deadline_scope(None):
+            check_deadline()
+            assert get_timeout(30) == 30
+        # ...and the outer deadline applies again once the block is left:
+        with pytest.raises(DeadlineExceeded):
+            get_timeout(30)
+    assert get_deadline() is None
+
+
+def test_http_provider_caps_request_timeout(clock):
+    provider = DeadlineHTTPProvider("http://127.0.0.1:1", request_kwargs={'timeout': 30})
+    assert provider.get_request_kwargs()['timeout'] == 30
+    with deadline_scope(Deadline(20)):
+        clock.ts += 12
+        assert provider.get_request_kwargs()['timeout'] == 8
+        clock.ts += 8
+        with pytest.raises(DeadlineExceeded):
+            provider.get_request_kwargs()
+
+
+def test_block_watcher_wait_is_capped_by_deadline(clock):
+    eth = StuckEth()
+    watcher = BlockWatcher(SimpleNamespace(eth=eth), poll_interval=1, log=lambda message: None)
+    assert [block.number for block in watcher.poll()] == [10]
+    # Without deadline the whole timeout is waited:
+    start_ts = clock.ts
+    assert watcher.wait_for_new_blocks(10) == []
+    assert clock.ts - start_ts == 10
+    # With deadline only the time remaining:
+    with deadline_scope(Deadline(3)):
+        start_ts = clock.ts
+        assert watcher.wait_for_new_blocks(10) == []
+        assert clock.ts - start_ts == 3
+        # Expired deadline fails the wait without polling:
+        polls = eth.polls
+        with pytest.raises(DeadlineExceeded):
+            watcher.wait_for_new_blocks(10)
+        assert eth.polls == polls
+
+
+def test_block_listener_deadline_propagates(clock):
+    eth = StuckEth()
+    (messages, notified) = ([], [])
+    watcher = BlockWatcher(SimpleNamespace(eth=eth), log=messages.append)
+    watcher.add_listener(lambda block: 1 / 0)
+    watcher.add_listener(notified.append)
+    watcher.poll()
+    # Failing listener is logged and does not stop the others:
+    assert len(messages) == 1 and len(notified) == 1
+    def expired_listener(block):
+        raise DeadlineExceeded()
+    watcher.add_listener(expired_listener)
+    eth.block_number_value += 1
+    with pytest.raises(DeadlineExceeded):
+        watcher.poll()
@@ -0,0 +1,52 @@
+import random
+
+from dec_math import DecPowCache, dec_pow, E18
+
+UINT256_MAX = 2 ** 256 - 1
+LQTY_ISSUANCE_FACTOR = 999998681227695000
+
+
+# Line by line GammaLib.decPow (SafeMath reverts raise OverflowError)
+def gamma_lib_dec_pow(_a, _n):
+    def _dec_mul(x, y):
+        prod_xy = x * y
+        if prod_xy > UINT256_MAX or prod_xy + E18 // 2 > UINT256_MAX:
+            raise OverflowError()
+        return (prod_xy + E18 // 2) // E18
+    if _n == 0:
+        return E18
+    (y, x, n) = (E18, _a, _n)
+    while n > 1:
+        if n & 1 == 0:
+            x = _dec_mul(x, x)
+            n = n // 2
+        else:
+            y = _dec_mul(x, y)
+            x = _dec_mul(x, x)
+            n = (n - 1) // 2
+    return _dec_mul(x, y)
+
+
+def test_dec_pow_fixtures():
+    assert dec_pow(5 * 10**17, 0) == E18
+    assert dec_pow(5 * 10**17, 1) == 5 * 10**17
+    assert dec_pow(5 * 10**17, 3) == 125 * 10**15
+    assert dec_pow(E18, 10**9) == E18
+    assert dec_pow(0, 5) == 0
+    assert dec_pow(1, 2) == 0  # (1e-18 ^ 2 rounds down)
+    assert dec_pow(7 * 10**17, 2) == 49 * 10**16
+
+
+def test_dec_pow_cache_is_bit_exact():
+    rng = random.Random(1)
+    bases = [E18, E18 - 1, 999 * 10**15, LQTY_ISSUANCE_FACTOR, 5 * 10**17, 1] + [rng.randint(1, E18) for _ in range(5)]
+    for base in bases:
+        exponents = [0, 1, 2, 3, 4, 1023, 1024, 525600000] + [rng.randint(0, 10**6) for _ in range(50)]
+        expected = [gamma_lib_dec_pow(base, n) for n in exponents]
+        assert [dec_pow(base, n) for n in exponents] == expected
+        cache = DecPowCache(base, max_results=16)
+        assert cache.pow_many(exponents) == expected
+        assert [cache.pow(n) for n in reversed(exponents)] == expected[::-1]
+    cache = DecPowCache(LQTY_ISSUANCE_FACTOR)
+    assert [cache.pow(n // 7) for n in range(700)] == [gamma_lib_dec_pow(LQTY_ISSUANCE_FACTOR, n // 7) for n in range(700)]
+    assert (cache.misses, cache.hits) == (100, 600)
@@ -0,0 +1,90 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from cadence import MonitoringCadence
+from deadline import Deadline, DeadlineExceeded, check_deadline, deadline_scope, get_deadline
+from farm_policy import (
+    EmergencyEvaluator, FarmPolicy, ACTION_EMERGENCY_RECOVER, ACTION_EMERGENCY_WITHDRAW, ACTION_START_NEW_EPOCH,
+    LUSD_PRICE_CACHE_MAX_AGE_SECS, get_action_deadline,
+)
+from fast_call import pinned_reads_scope
+
+import pytest
+
+
+class FakeLiquityHelper:
+    def __init__(self):
+        self.calls = 0
+
+    # ETH price of 2000 is above emergency as of oracle price and below it as of new price of 1000:
+    def calculate_emergency_signals(self, eth_price):
+        self.calls += 1
+        return (1100.0, 2000.0, 2.0, 3.0, eth_price / 1000, eth_price / 1000 * 1.5)
+
+
+class FakePriceProvider:
+    def __init__(self, eth_price):
+        self.eth_price = eth_price
+        self.calls = 0
+        self.lusd_max_ages = []
+
+    def get_eth_price(self):
+        self.calls += 1
+        return self.eth_price
+
+    def get_lusd_price(self, max_age_secs=0):
+        self.lusd_max_ages.append(max_age_secs)
+        return 1.1
+
+
+class FakeGammaFarm:
+    def __init__(self, is_emergency_state, epoch_start_time):
+        self.functions = SimpleNamespace(
+            isEmergencyState=lambda: SimpleNamespace(call=lambda: is_emergency_state),
+            epochStartTime=lambda: SimpleNamespace(call=lambda: epoch_start_time),
+            getTotalBalances=lambda: SimpleNamespace(call=lambda: (100, 0)),
+        )
+
+
+def test_farms_share_emergency_evaluation_per_pinned_block():
+    (liquity_helper, price_provider, cadence) = (FakeLiquityHelper(), FakePriceProvider(eth_price=3000.0), MonitoringCadence())
+    evaluator = EmergencyEvaluator(liquity_helper, price_provider, cadence, log=lambda *args, **fields: None)
+    now_time = lambda: 10 * 24 * 60 * 60
+    policies = [
+        FarmPolicy(FakeGammaFarm(False, epoch_start_time), liquity_helper, price_provider, cadence, now_time,
+                   timedelta(days=2), timedelta(hours=6), log=lambda *args, **fields: None, emergency_evaluator=evaluator)
+        for epoch_start_time in [0, now_time()]
+    ]
+    with pinned_reads_scope(100):
+        assert [policy.decide_action() for policy in policies] == [ACTION_START_NEW_EPOCH, None]
+    assert (liquity_helper.calls, price_provider.calls) == (1, 1)
+    # Next block is evaluated again:
+    price_provider.eth_price = 1000.0
+    with pinned_reads_scope(101):
+        assert [policy.decide_action() for policy in policies] == [ACTION_EMERGENCY_WITHDRAW, ACTION_EMERGENCY_WITHDRAW]
+    assert (liquity_helper.calls, price_provider.calls) == (2, 2)
+    # Unpinned evaluations are never shared:
+    policies[0].decide_action()
+    policies[1].decide_action()
+    assert (liquity_helper.calls, price_provider.calls) == (4, 4)
+
+
+def test_emergency_action_survives_expired_iteration_budget():
+    iteration_deadline = Deadline(0)
+    with deadline_scope(iteration_deadline):
+        for action in [ACTION_EMERGENCY_WITHDRAW, ACTION_EMERGENCY_RECOVER]:
+            with deadline_scope(get_action_deadline(action, get_deadline())):
+                check_deadline()
+        with deadline_scope(get_action_deadline(ACTION_START_NEW_EPOCH, get_deadline())):
+            with pytest.raises(DeadlineExceeded):
+                check_deadline()
+
+
+def test_lusd_price_is_fresh_as_soon_as_system_gets_close_to_emergency():
+    (liquity_helper, price_provider, cadence) = (FakeLiquityHelper(), FakePriceProvider(eth_price=3000.0), MonitoringCadence())
+    evaluator = EmergencyEvaluator(liquity_helper, price_provider, cadence, log=lambda *args, **fields: None)
+    evaluator.evaluate()
+    # Liquidation price of 1100 is 1.8% away:
+    price_provider.eth_price = 1120.0
+    evaluator.evaluate()
+    assert price_provider.lusd_max_ages == [LUSD_PRICE_CACHE_MAX_AGE_SECS, 0]
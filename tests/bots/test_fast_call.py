@@ -0,0 +1,99 @@
+from eth_abi import encode_abi
+from web3 import Web3
+from web3.exceptions import ContractLogicError
+from web3.providers.base import JSONBaseProvider
+
+from contract_registry import abi_store, get_contract
+from fast_call import get_fast_contract, pinned_reads_scope
+from rpc_metrics import RpcMetrics, instrument_web3
+
+import pytest
+
+TROVE_MANAGER_ADDRESS = "0xA39739EF8b0231DbFA0DcdA07d7e29faAbCf4bb2"
+SORTED_TROVES_ADDRESS = "0x8FdD3fbFEb32b28fb73555518f8b361bCeA741A6"
+BORROWER = "0x5Dc58f812b2e244DABA2fabd33f399cD699D7Ddc"
+REVERT_DATA = "0x08c379a0" + encode_abi(['string'], ["nope"]).hex()
+
+
+# Answers eth_call by selector, records calls as they were sent
+class FakeProvider(JSONBaseProvider):
+    def __init__(self, results):
+        super().__init__()
+        self.results = results
+        self.calls = []
+
+    def make_request(self, method, params):
+        if method == 'eth_chainId':
+            return {'jsonrpc': '2.0', 'id': 1, 'result': '0x1'}
+        self.calls.append(params)
+        result = self.results[params[0]['data'][:10]]
+        if result == REVERT_DATA:
+            return {'jsonrpc': '2.0', 'id': 1, 'error': {'code': 3, 'message': "execution reverted: nope", 'data': result}}
+        return {'jsonrpc': '2.0', 'id': 1, 'result': result}
+
+    def isConnected(self):
+        return True
+
+
+def get_selector(abi_name, fn_name):
+    return "0x" + abi_store.get_function(abi_name, fn_name).selector.hex()
+
+
+@pytest.fixture
+def provider():
+    return FakeProvider({
+        get_selector("TroveManager", "getTCR"): "0x" + encode_abi(['uint256'], [2 * 10**18]).hex(),
+        get_selector("TroveManager", "getEntireSystemColl"): "0x" + encode_abi(['uint256'], [7]).hex(),
+        get_selector("TroveManager", "Troves"): "0x" + encode_abi(['uint256'] * 4 + ['uint128'], [1, 2, 3, 1, 5]).hex(),
+        get_selector("SortedTroves", "getLast"): "0x" + encode_abi(['address'], [BORROWER.lower()]).hex(),
+        get_selector("TroveManager", "getEntireSystemDebt"): REVERT_DATA,
+    })
+
+
+@pytest.mark.parametrize("abi_name,address,fn_name,args", [
+    ("TroveManager", TROVE_MANAGER_ADDRESS, "getEntireSystemColl", ()),
+    ("TroveManager", TROVE_MANAGER_ADDRESS, "getTCR", (2000 * 10**18,)),
+    ("TroveManager", TROVE_MANAGER_ADDRESS, "Troves", (BORROWER,)),
+    ("SortedTroves", SORTED_TROVES_ADDRESS, "getLast", ()),
+])
+def test_fast_call_matches_web3_call(provider, abi_name, address, fn_name, args):
+    w3 = Web3(provider)
+    web3_result = getattr(get_contract(w3, abi_name, address).functions, fn_name)(*args).call()
+    fast_result = getattr(get_fast_contract(w3, abi_name, address).functions, fn_name)(*args).call()
+    assert fast_result == web3_result
+    assert type(fast_result) == type(web3_result)
+    # Same request is sent over the wire:
+    assert provider.calls[-1][0]['data'] == provider.calls[-2][0]['data']
+
+
+def test_fast_call_goes_through_added_middlewares(provider):
+    (w3, rpc_metrics) = (Web3(provider), RpcMetrics())
+    instrument_web3(w3, rpc_metrics, "main")
+    trove_manager = get_fast_contract(w3, "TroveManager", TROVE_MANAGER_ADDRESS)
+    assert trove_manager.functions.getEntireSystemColl().call(block_identifier=123) == 7
+    assert provider.calls[-1][1] == "0x7b"
+    assert rpc_metrics.get_total()[("main", "eth_call:" + get_selector("TroveManager", "getEntireSystemColl"))].latency_us.count == 1
+    with pytest.raises(ContractLogicError):
+        trove_manager.call("getEntireSystemDebt")
+
+
+def test_pinned_reads_are_memoized_per_block(provider):
+    w3 = Web3(provider)
+    trove_manager = get_fast_contract(w3, "TroveManager", TROVE_MANAGER_ADDRESS)
+    with pinned_reads_scope(100) as pinned_reads:
+        for _ in range(3):
+            assert trove_manager.functions.getTCR(2000 * 10**18).call() == 2 * 10**18
+            assert trove_manager.functions.getEntireSystemColl().call() == 7
+        # (explicit block is not pinned)
+        assert trove_manager.functions.getEntireSystemColl().call(block_identifier=99) == 7
+    assert [params[1] for params in provider.calls] == ["0x64", "0x64", "0x63"]
+    assert (pinned_reads.hits, pinned_reads.misses) == (4, 2)
+    # Reverted calls are not memoized:
+    with pinned_reads_scope(100):
+        for _ in range(2):
+            with pytest.raises(ContractLogicError):
+                trove_manager.call("getEntireSystemDebt")
+    assert len(provider.calls) == 5
+    # Outside of scope reads follow chain head:
+    trove_manager.functions.getEntireSystemColl().call()
+    assert provider.calls[-1][1] == "latest"
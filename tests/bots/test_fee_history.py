@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+from fee_history import FeeHistory, FeeHistoryGasStrategy, calculate_next_base_fee
+
+import pytest
+
+GWEI = 10**9
+
+
+# Serves eth_feeHistory from per block (base fee, gas used ratio, rewards) of blocks 1..N
+class FakeEth:
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.requests = []
+
+    def fee_history(self, block_count, newest_block, reward_percentiles):
+        self.requests.append((block_count, newest_block))
+        newest_block = len(self.blocks) if newest_block == 'latest' else newest_block
+        oldest_block = newest_block - block_count + 1
+        blocks = self.blocks[oldest_block - 1:newest_block]
+        next_base_fee = calculate_next_base_fee(blocks[-1][0], blocks[-1][1])
+        return {
+            'oldestBlock': oldest_block,
+            'baseFeePerGas': [base_fee for (base_fee, _, _) in blocks] + [next_base_fee],
+            'gasUsedRatio': [gas_used_ratio for (_, gas_used_ratio, _) in blocks],
+            'reward': [rewards for (_, _, rewards) in blocks],
+        }
+
+
+def build_fee_history(blocks, window_size=4, reward_percentiles=(50, 99)):
+    eth = FakeEth(blocks)
+    return (FeeHistory(SimpleNamespace(eth=eth), window_size, list(reward_percentiles)), eth)
+
+
+def test_window_follows_new_blocks():
+    blocks = [(100 * GWEI, 0.5, [1 * GWEI, 2 * GWEI]) for _ in range(10)]
+    (fee_history, eth) = build_fee_history(blocks[:6])
+    fee_history.on_new_block(SimpleNamespace(number=6))
+    assert (fee_history.newest_block_number, len(fee_history.base_fees)) == (6, 4)
+    eth.blocks = blocks
+    fee_history.on_new_block(SimpleNamespace(number=8))
+    assert eth.requests[-1] == (2, 8)
+    assert (fee_history.newest_block_number, len(fee_history.rewards)) == (8, 4)
+    assert fee_history.next_base_fee == 100 * GWEI
+
+
+def test_forecast_base_fees():
+    (fee_history, _) = build_fee_history([(100 * GWEI, 1.0, [GWEI, GWEI]), (100 * GWEI, 0.0, [GWEI, GWEI])])
+    fee_history.load()
+    assert fee_history.next_base_fee == 87.5 * GWEI
+    assert fee_history.forecast_base_fees(3, gas_used_ratio=1.0) == [87.5 * GWEI, 98437500000, 110742187500]
+    assert fee_history.forecast_max_base_fee(3) == 110742187500
+
+
+def test_priority_fee_estimate():
+    # Half of blocks include 1 gwei at p50, all blocks include 3 gwei at p99:
+    blocks = [(100 * GWEI, 0.5, [1 * GWEI, 3 * GWEI]), (100 * GWEI, 0.5, [2 * GWEI, 3 * GWEI])] * 2
+    (fee_history, _) = build_fee_history(blocks)
+    fee_history.load()
+    assert fee_history.estimate_block_inclusion_probability(1 * GWEI) == 0.25
+    assert fee_history.estimate_block_inclusion_probability(2 * GWEI) == 0.5
+    assert fee_history.estimate_priority_fee(0.5, num_blocks=1) == 2 * GWEI
+    assert fee_history.estimate_priority_fee(0.5, num_blocks=3) == 1 * GWEI
+    assert fee_history.estimate_priority_fee(0.99, num_blocks=1) == 3 * GWEI
+
+
+def test_gas_strategy_keeps_priority_fee_within_bounds():
+    # Stressed window: p99 reward is far above the cap
+    blocks = [(100 * GWEI, 0.5, [1 * GWEI, 50 * GWEI])] * 4
+    (fee_history, _) = build_fee_history(blocks)
+    fee_history.load()
+    tx = {}
+    FeeHistoryGasStrategy(fee_history, 0.99, 1, max_priority_fee_per_gas=10 * GWEI).fill_initial_gas_fees(tx)
+    assert tx == {'maxPriorityFeePerGas': 10 * GWEI, 'maxFeePerGas': 110 * GWEI}
+    # Floor applies when estimate is below it:
+    FeeHistoryGasStrategy(fee_history, 0.1, 5, min_priority_fee_per_gas=2 * GWEI, max_priority_fee_per_gas=10 * GWEI).fill_initial_gas_fees(tx)
+    assert tx['maxPriorityFeePerGas'] == 2 * GWEI
+    with pytest.raises(AssertionError):
+        FeeHistoryGasStrategy(fee_history, 0.5, 1, min_priority_fee_per_gas=2 * GWEI, max_priority_fee_per_gas=GWEI)
+
+
+def test_gas_strategy_replacement_is_accepted_by_nodes():
+    (fee_history, _) = build_fee_history([(100 * GWEI, 0.5, [1 * GWEI, 1 * GWEI])] * 4)
+    fee_history.load()
+    strategy = FeeHistoryGasStrategy(fee_history, 0.9, 3)
+    tx = {}
+    strategy.fill_initial_gas_fees(tx)
+    (priority_fee, max_fee) = (tx['maxPriorityFeePerGas'], tx['maxFeePerGas'])
+    strategy.fill_next_gas_fees(tx)
+    assert strategy.target_blocks == 2
+    assert tx['maxPriorityFeePerGas'] >= priority_fee * 1.125 and tx['maxFeePerGas'] >= max_fee * 1.125
@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+
+from web3.exceptions import TransactionNotFound
+
+from inclusion_tracker import InclusionTracker
+from nonce_manager import NonceManager
+
+import pytest
+
+
+class FakeEth:
+    def __init__(self, nonce):
+        self.nonce = nonce
+        self.receipts = {}
+
+    def get_transaction_count(self, address, block_identifier):
+        return self.nonce
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+
+# Mines scripted blocks: every call of "wait_for_new_blocks" returns next list of (included tx hashes, account nonce)
+class FakeBlockWatcher:
+    def __init__(self, eth, nonce_manager, blocks):
+        self.eth = eth
+        self.nonce_manager = nonce_manager
+        self.blocks = list(blocks)
+        self.number = 100
+
+    def wait_for_new_blocks(self, timeout):
+        new_blocks = []
+        for (tx_hashes, nonce) in self.blocks.pop(0):
+            self.number += 1
+            self.eth.nonce = nonce
+            block = SimpleNamespace(number=self.number, transactions=tx_hashes)
+            self.nonce_manager.on_new_block(block)
+            new_blocks.append(block)
+        return new_blocks
+
+
+# Doubles priority fee on every re-price
+class FakeGasStrategy:
+    def fill_next_gas_fees(self, tx):
+        tx['maxPriorityFeePerGas'] *= 2
+        tx['maxFeePerGas'] *= 2
+
+
+# Returns (receipt, sent txs, nonce manager), only txs in "mined_tx_hashes" have receipts
+def send_and_track(blocks, mined_tx_hashes, bump_interval_blocks=2, max_pending_blocks=10, max_priority_fee_per_gas=1000):
+    eth = FakeEth(nonce=5)
+    eth.receipts = {tx_hash: {'transactionHash': tx_hash, 'status': 1} for tx_hash in mined_tx_hashes}
+    w3 = SimpleNamespace(eth=eth, toHex=lambda tx_hash: tx_hash)
+    nonce_manager = NonceManager(w3, "0xowner", log=lambda *args: None)
+    nonce_manager.sync()
+    tracker = InclusionTracker(w3, FakeBlockWatcher(eth, nonce_manager, blocks), nonce_manager, log=lambda *args: None)
+    tx = {'nonce': nonce_manager.reserve(), 'maxPriorityFeePerGas': 100, 'maxFeePerGas': 1000}
+    sent_txs = []
+    def send_tx(tx):
+        sent_txs.append(dict(tx))
+        return f"0xhash{len(sent_txs) - 1}"
+    receipt = tracker.send_and_track(tx, send_tx, FakeGasStrategy(), bump_interval_blocks, max_pending_blocks, max_priority_fee_per_gas)
+    return (receipt, sent_txs, nonce_manager)
+
+
+def test_replacement_is_included():
+    (receipt, sent_txs, nonce_manager) = send_and_track([[([], 5)], [([], 5)], [(["0xhash1"], 6)]], ["0xhash1"])
+    assert receipt['transactionHash'] == "0xhash1"
+    assert [tx['maxPriorityFeePerGas'] for tx in sent_txs] == [100, 200]
+    # Mined nonce is forgotten:
+    assert (nonce_manager.get_pending_txs(), nonce_manager.sent_tx_hashes) == ({}, {})
+
+
+def test_missed_block_resolves_by_nonce():
+    # Block including tx was not seen, but account nonce moved past it:
+    (receipt, sent_txs, _) = send_and_track([[([], 5)], [([], 6)]], ["0xhash0"])
+    assert (receipt['transactionHash'], len(sent_txs)) == ("0xhash0", 1)
+
+
+def test_nonce_used_by_unknown_tx():
+    (receipt, sent_txs, _) = send_and_track([[(["0xother"], 6)]], ["0xother"])
+    assert (receipt, len(sent_txs)) == (None, 1)
+
+
+def test_empty_waits_are_not_counted_as_blocks():
+    # Re-priced only after 2 blocks were actually mined (not after 2 waits without blocks):
+    blocks = [[], [], [([], 5)], [], [([], 5)], [(["0xhash1"], 6)]]
+    (receipt, sent_txs, _) = send_and_track(blocks, ["0xhash1"], bump_interval_blocks=2)
+    assert receipt['transactionHash'] == "0xhash1"
+    assert [tx['maxPriorityFeePerGas'] for tx in sent_txs] == [100, 200]
+    # ...but it gives up if no blocks come at all:
+    (receipt, sent_txs, _) = send_and_track([[]] * 10, [], max_pending_blocks=10)
+    assert (receipt, len(sent_txs)) == (None, 1)
+
+
+@pytest.mark.parametrize("max_priority_fee_per_gas,expected_priority_fees", [
+    # Last replacement is clamped to maximum priority fee, no bumps follow it (12 blocks would allow 5 bumps):
+    (800, [100, 200, 400, 800]),
+    (500, [100, 200, 400, 500]),
+    # ...unless clamped fee would not replace pending tx (420 < 1.125 * 400):
+    (420, [100, 200, 400]),
+])
+def test_gives_up_after_max_pending_blocks(max_priority_fee_per_gas, expected_priority_fees):
+    blocks = [[([], 5)] * 2] * 6
+    (receipt, sent_txs, nonce_manager) = send_and_track(
+        blocks, [], bump_interval_blocks=2, max_pending_blocks=12, max_priority_fee_per_gas=max_priority_fee_per_gas,
+    )
+    assert receipt is None
+    assert [tx['maxPriorityFeePerGas'] for tx in sent_txs] == expected_priority_fees
+    assert nonce_manager.get_pending_txs()[5]['maxPriorityFeePerGas'] == expected_priority_fees[-1]
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from leader_election import FileLeaseStore, LeaderElector, MemoryLeaseStore, NotLeader
+
+import pytest
+
+LEASE_SECS = 5
+RENEW_INTERVAL_SECS = 1
+
+
+def build_elector(store, holder, clock, changes=None):
+    return LeaderElector(
+        store, holder, LEASE_SECS, RENEW_INTERVAL_SECS, clock=lambda: clock.ts, log=lambda *args: None,
+        on_change=(lambda is_leader: changes.append((holder, is_leader))) if changes is not None else None,
+    )
+
+
+def test_standby_takes_over_when_leader_goes_silent():
+    (clock, changes) = (SimpleNamespace(ts=0.0), [])
+    store = MemoryLeaseStore(clock=lambda: clock.ts)
+    (a, b) = (build_elector(store, "a", clock, changes), build_elector(store, "b", clock, changes))
+    assert a.renew() and not b.renew()
+    # Leader renews, standby keeps trying:
+    for _ in range(10):
+        clock.ts += RENEW_INTERVAL_SECS
+        assert a.renew() and not b.renew()
+    with pytest.raises(NotLeader):
+        b.check_leader()
+    # Leader goes silent: at no point both replicas consider themselves leaders, standby takes over within lease
+    silent_ts = clock.ts
+    while not b.renew():
+        clock.ts += 0.25
+        assert not (a.is_leader() and b.is_leader())
+    assert clock.ts - silent_ts <= LEASE_SECS
+    assert not a.is_leader()
+    # Old leader coming back stays standby:
+    assert not a.renew()
+    assert changes == [("a", True), ("b", True), ("a", False)]
+
+
+def test_leader_hands_lease_over_on_stop():
+    clock = SimpleNamespace(ts=0.0)
+    store = MemoryLeaseStore(clock=lambda: clock.ts)
+    (a, b) = (build_elector(store, "a", clock), build_elector(store, "b", clock))
+    assert a.renew()
+    a.stop()
+    assert not a.is_leader()
+    assert b.renew()
+
+
+def test_leader_steps_down_when_store_is_unreachable():
+    clock = SimpleNamespace(ts=0.0)
+    store = MemoryLeaseStore(clock=lambda: clock.ts)
+    a = build_elector(store, "a", clock)
+    assert a.renew()
+    def fail(holder, lease_secs):
+        raise OSError("store is unreachable")
+    store.try_acquire = fail
+    clock.ts += LEASE_SECS - 2 * RENEW_INTERVAL_SECS
+    assert a.renew()
+    clock.ts += RENEW_INTERVAL_SECS
+    assert not a.renew()
+
+
+def test_file_lease_store(tmp_path):
+    clock = SimpleNamespace(ts=100.0)
+    path = str(tmp_path / "bot.lease")
+    (store_a, store_b) = (FileLeaseStore(path, clock=lambda: clock.ts), FileLeaseStore(path, clock=lambda: clock.ts))
+    assert store_a.get_holder() is None
+    assert store_a.try_acquire("a", LEASE_SECS)
+    assert not store_b.try_acquire("b", LEASE_SECS)
+    assert store_b.get_holder() == "a"
+    clock.ts += LEASE_SECS
+    assert store_b.try_acquire("b", LEASE_SECS)
+    assert not store_a.try_acquire("a", LEASE_SECS)
+    store_a.release("a")
+    assert store_a.get_holder() == "b"
+    store_b.release("b")
+    assert store_a.try_acquire("a", LEASE_SECS)
@@ -0,0 +1,77 @@
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from metrics_server import MetricsRegistry, MetricsServer
+
+import pytest
+
+
+@pytest.fixture
+def registry():
+    yield MetricsRegistry(prefix="test_bot")
+
+
+@pytest.fixture
+def metrics_server(registry):
+    metrics_server = MetricsServer(registry, port=0).start()
+    yield metrics_server
+    metrics_server.stop()
+
+
+def scrape(metrics_server, path="/metrics"):
+    with urlopen(f"http://127.0.0.1:{metrics_server.port}{path}", timeout=5) as response:
+        return (response.headers['Content-Type'], response.read().decode())
+
+
+def parse_samples(body):
+    samples = {}
+    for line in body.splitlines():
+        if line and not line.startswith('#'):
+            (name, value) = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_scrape_gauges_and_counters(registry, metrics_server):
+    duration = registry.gauge("iteration_duration_seconds", "Duration of the last run iteration")
+    signal = registry.gauge("emergency_signal", "Emergency signals")
+    errors = registry.counter("rpc_errors_total", "RPC errors")
+    duration.set(1.5)
+    signal.set(1.25, signal="new_TCR")
+    signal.set(1.02, signal="lusd_price")
+    errors.inc(endpoint="main", error="Timeout")
+    errors.inc(2, endpoint="main", error="Timeout")
+    (content_type, body) = scrape(metrics_server)
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert "# TYPE test_bot_iteration_duration_seconds gauge" in body
+    assert "# TYPE test_bot_rpc_errors_total counter" in body
+    samples = parse_samples(body)
+    assert samples['test_bot_iteration_duration_seconds'] == 1.5
+    assert samples['test_bot_emergency_signal{signal="new_TCR"}'] == 1.25
+    assert samples['test_bot_emergency_signal{signal="lusd_price"}'] == 1.02
+    assert samples['test_bot_rpc_errors_total{endpoint="main",error="Timeout"}'] == 3
+
+
+def test_scrape_runs_collectors(registry, metrics_server):
+    age = registry.gauge("pending_tx_age_seconds", "Pending tx age")
+    registry.add_collector(lambda: age.set(age.values.get((), 0) + 1))
+    assert parse_samples(scrape(metrics_server)[1])['test_bot_pending_tx_age_seconds'] == 1
+    assert parse_samples(scrape(metrics_server)[1])['test_bot_pending_tx_age_seconds'] == 2
+
+
+def test_scrape_survives_failing_collector(registry, metrics_server):
+    gauge = registry.gauge("last_block_number", "Last block")
+    gauge.set(100)
+    registry.add_collector(lambda: 1 / 0)
+    assert parse_samples(scrape(metrics_server)[1])['test_bot_last_block_number'] == 100
+
+
+def test_label_values_are_escaped(registry, metrics_server):
+    registry.counter("rpc_requests_total", "RPC requests").inc(call='a"b\\c')
+    assert 'test_bot_rpc_requests_total{call="a\\"b\\\\c"} 1' in scrape(metrics_server)[1]
+
+
+def test_unknown_path_is_not_found(metrics_server):
+    with pytest.raises(HTTPError) as e:
+        scrape(metrics_server, "/other")
+    assert e.value.code == 404
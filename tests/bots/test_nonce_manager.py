@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+from nonce_manager import NonceManager
+
+import pytest
+
+
+# Account nonce as of "pending"/"latest" (and any block number, which is treated as latest)
+class FakeEth:
+    def __init__(self, pending_nonce, latest_nonce):
+        self.nonces = {'pending': pending_nonce, 'latest': latest_nonce}
+
+    def get_transaction_count(self, address, block_identifier):
+        return self.nonces.get(block_identifier, self.nonces['latest'])
+
+
+def build_nonce_manager(pending_nonce, latest_nonce):
+    eth = FakeEth(pending_nonce, latest_nonce)
+    return (NonceManager(SimpleNamespace(eth=eth), "0xowner", log=lambda *args: None), eth)
+
+
+def build_tx(nonce, priority_fee):
+    return {'nonce': nonce, 'to': "0xfarm", 'data': "0x1234", 'maxPriorityFeePerGas': priority_fee, 'maxFeePerGas': 10 * priority_fee}
+
+
+def test_reserve_and_release():
+    (nonce_manager, _) = build_nonce_manager(pending_nonce=5, latest_nonce=5)
+    assert [nonce_manager.reserve() for _ in range(3)] == [5, 6, 7]
+    # Released nonces are reused lowest first, releasing the last one moves next nonce back:
+    nonce_manager.release(6)
+    nonce_manager.release(7)
+    assert (nonce_manager.released, nonce_manager.next_nonce) == ({6}, 7)
+    assert [nonce_manager.reserve(), nonce_manager.reserve()] == [6, 7]
+    # Sent txs keep their nonce:
+    nonce_manager.mark_sent(build_tx(7, priority_fee=100), tx_hash="0xhash7")
+    nonce_manager.release(7)
+    assert nonce_manager.reserve() == 8
+    assert nonce_manager.get_pending_txs() == {7: build_tx(7, priority_fee=100)}
+    assert nonce_manager.sent_tx_hashes == {7: ["0xhash7"]}
+
+
+def test_replacement_fees():
+    (nonce_manager, _) = build_nonce_manager(pending_nonce=5, latest_nonce=5)
+    nonce = nonce_manager.reserve()
+    assert nonce_manager.get_replacement_fees(nonce) == (0, 0)
+    # Nonce which was never sent is released instead of being cancelled:
+    assert nonce_manager.build_cancel_tx(nonce, chain_id=1) is None
+    assert nonce_manager.reserve() == nonce
+    nonce_manager.mark_sent(build_tx(nonce, priority_fee=100))
+    assert nonce_manager.get_replacement_fees(nonce) == (112, 1125)
+    assert nonce_manager.build_cancel_tx(nonce, chain_id=1) == {
+        'from': "0xowner", 'to': "0xowner", 'value': 0, 'gas': 21000, 'nonce': 5, 'chainId': 1,
+        'maxPriorityFeePerGas': 112, 'maxFeePerGas': 1125,
+    }
+    # Nothing to cancel for unknown nonces:
+    assert nonce_manager.build_cancel_tx(nonce + 1, chain_id=1) is None
+
+
+def test_on_new_block_forgets_mined_nonces():
+    (nonce_manager, eth) = build_nonce_manager(pending_nonce=5, latest_nonce=5)
+    nonce_manager.sync()
+    for nonce in [nonce_manager.reserve(), nonce_manager.reserve()]:
+        nonce_manager.mark_sent(build_tx(nonce, priority_fee=100), tx_hash=f"0xhash{nonce}")
+    nonce_manager.release(nonce_manager.reserve())
+    eth.nonces['latest'] = 6
+    nonce_manager.on_new_block(SimpleNamespace(number=100))
+    assert (nonce_manager.is_used(5), nonce_manager.is_used(6)) == (True, False)
+    assert list(nonce_manager.get_pending_txs()) == [6]
+    assert nonce_manager.sent_tx_hashes == {6: ["0xhash6"]}
+    assert nonce_manager.build_cancel_tx(5, chain_id=1) is None
+    # Nonces used outside of nonce manager are skipped:
+    eth.nonces['latest'] = 10
+    nonce_manager.on_new_block(SimpleNamespace(number=101))
+    assert (nonce_manager.get_pending_txs(), nonce_manager.get_oldest_pending_tx_age()) == ({}, None)
+    assert nonce_manager.reserve() == 10
+
+
+@pytest.mark.parametrize("confirmed_nonce", [5, 6])
+def test_mark_sent_ignores_mined_nonces(confirmed_nonce):
+    (nonce_manager, _) = build_nonce_manager(pending_nonce=6, latest_nonce=confirmed_nonce)
+    nonce_manager.sync()
+    nonce_manager.mark_sent(build_tx(5, priority_fee=100))
+    assert list(nonce_manager.get_pending_txs()) == ([5] if confirmed_nonce == 5 else [])
@@ -0,0 +1,148 @@
+from types import SimpleNamespace
+
+from epoch_trade_helper import DAI_ADDRESS, LUSD_ADDRESS, USDC_ADDRESS, WETH_ADDRESS, EpochTradeHelper
+from pool_activity_watcher import (
+    CURVE_LUSD_POOL, LQTY_WETH_3000_POOL, USDC_LUSD_500_POOL, WETH_DAI_500_POOL, WETH_LUSD_3000_POOL,
+    WETH_MAL_3000_POOL, WETH_USDC_500_POOL, WETH_USDC_3000_POOL, PoolActivityWatcher, get_trade_data_pools,
+)
+
+import pytest
+
+WETH_LUSD_PATH = [WETH_ADDRESS, 3000, LUSD_ADDRESS]
+WETH_USDC_LUSD_PATH = [WETH_ADDRESS, 3000, USDC_ADDRESS, 500, LUSD_ADDRESS]
+WETH_DAI_LUSD_PATH = [WETH_ADDRESS, 500, DAI_ADDRESS, 500, LUSD_ADDRESS]
+
+
+# Serves eth_getLogs from per block lists of active pools (and "pending" pools)
+class FakeEth:
+    def __init__(self, active_pools_per_block, pending_active_pools=()):
+        self.active_pools_per_block = active_pools_per_block
+        self.pending_active_pools = pending_active_pools
+        self.requests = []
+
+    def get_logs(self, filter_params):
+        (from_block, to_block) = (filter_params['fromBlock'], filter_params['toBlock'])
+        self.requests.append((from_block, to_block))
+        if from_block == 'pending':
+            return [{'blockNumber': None, 'address': pool} for pool in self.pending_active_pools]
+        return [
+            {'blockNumber': number, 'address': pool}
+            for number in range(from_block, to_block + 1)
+            for pool in self.active_pools_per_block.get(number, ())
+        ]
+
+
+class FakeW3:
+    def __init__(self, eth):
+        self.eth = eth
+
+    @staticmethod
+    def toChecksumAddress(address):
+        return address
+
+
+class FakeQuoter:
+    def __init__(self, amounts_out):
+        self.amounts_out = amounts_out
+
+    def estimate_amount_out(self, amount_in, path):
+        return self.amounts_out[tuple(path)]
+
+
+# Serves GammaFarm default trade params (and counts how many times they were read)
+class FakeGammaFarm:
+    def __init__(self, address, stable_token, weth_to_stable_token_fee, use_curve_for_stable_token_to_lusd):
+        self.address = address
+        self.reads = 0
+        values = {
+            'defaultWethToStableToken': stable_token,
+            'defaultWethToStableTokenFee': weth_to_stable_token_fee,
+            'defaultUseCurveForStableTokenToLusd': use_curve_for_stable_token_to_lusd,
+        }
+        self.functions = SimpleNamespace(**{name: self._build_function(value) for (name, value) in values.items()})
+
+    def _build_function(self, value):
+        def call():
+            self.reads += 1
+            return value
+        return lambda: SimpleNamespace(call=call)
+
+
+def build_watcher(active_pools_per_block, pending_active_pools=(), window_blocks=4):
+    eth = FakeEth(active_pools_per_block, pending_active_pools)
+    return (PoolActivityWatcher(FakeW3(eth), window_blocks), eth)
+
+
+def build_trade_helper(pool_activity_watcher, amounts_out):
+    trade_helper = EpochTradeHelper(FakeW3(None), pool_activity_watcher)
+    trade_helper.uniswap_quoter = FakeQuoter({tuple(path): amount_out for (path, amount_out) in amounts_out})
+    return trade_helper
+
+
+def test_get_trade_data_pools():
+    encode = EpochTradeHelper.encode_trade_data
+    # Empty trade data uses farm's default trade params:
+    assert get_trade_data_pools(b'', (USDC_ADDRESS, 500, True)) == \
+        [LQTY_WETH_3000_POOL, WETH_MAL_3000_POOL, WETH_USDC_500_POOL, CURVE_LUSD_POOL]
+    with pytest.raises(AssertionError):
+        get_trade_data_pools(b'')
+    assert get_trade_data_pools(encode(WETH_LUSD_PATH))[2:] == [WETH_LUSD_3000_POOL]
+    assert get_trade_data_pools(encode(WETH_USDC_LUSD_PATH))[2:] == [WETH_USDC_3000_POOL, USDC_LUSD_500_POOL]
+    assert get_trade_data_pools(encode([WETH_ADDRESS, 500, DAI_ADDRESS]))[2:] == [WETH_DAI_500_POOL, CURVE_LUSD_POOL]
+
+
+def test_window_follows_new_blocks():
+    (watcher, eth) = build_watcher({1: [WETH_LUSD_3000_POOL], 5: [WETH_LUSD_3000_POOL], 6: [CURVE_LUSD_POOL]})
+    assert not watcher.is_loaded()
+    watcher.on_new_block(SimpleNamespace(number=5))
+    assert eth.requests == [(2, 5)]
+    assert list(watcher.active_pools_per_block) == [set(), set(), set(), {WETH_LUSD_3000_POOL.lower()}]
+    # Already seen blocks are ignored, new blocks only fetch logs which are not in the window:
+    watcher.on_new_block(SimpleNamespace(number=5))
+    watcher.on_new_block(SimpleNamespace(number=6))
+    assert eth.requests == [(2, 5), (6, 6)]
+    assert list(watcher.active_pools_per_block) == [set(), set(), {WETH_LUSD_3000_POOL.lower()}, {CURVE_LUSD_POOL.lower()}]
+
+
+def test_collision_probabilities():
+    (watcher, _) = build_watcher({3: [WETH_LUSD_3000_POOL], 4: [WETH_LUSD_3000_POOL]}, [CURVE_LUSD_POOL])
+    watcher.on_new_block(SimpleNamespace(number=4))
+    # Smoothed share of active blocks:
+    assert watcher.estimate_pool_collision_probability(WETH_LUSD_3000_POOL) == pytest.approx(3 / 6)
+    assert watcher.estimate_pool_collision_probability(LQTY_WETH_3000_POOL) == pytest.approx(1 / 6)
+    # Pools touched by pending block will collide:
+    assert watcher.estimate_pool_collision_probability(CURVE_LUSD_POOL) == pytest.approx(1 / 6)
+    watcher.update_pending_activity()
+    assert watcher.estimate_pool_collision_probability(CURVE_LUSD_POOL) == 1.0
+    # Trade data collides if any of its pools does:
+    trade_data = EpochTradeHelper.encode_trade_data(WETH_LUSD_PATH)
+    expected_probability = 1 - (1 - 1 / 6) * (1 - 1 / 6) * (1 - 3 / 6)
+    assert watcher.estimate_trade_data_collision_probability(trade_data) == pytest.approx(expected_probability)
+    # Pending activity is dropped once its block is mined:
+    watcher.on_new_block(SimpleNamespace(number=5))
+    assert watcher.pending_active_pools == set()
+
+
+def test_empty_trade_data_uses_farm_defaults():
+    (watcher, _) = build_watcher({4: [WETH_USDC_500_POOL], 3: [WETH_LUSD_3000_POOL]})
+    watcher.on_new_block(SimpleNamespace(number=4))
+    (usdc_farm, lusd_farm) = (FakeGammaFarm("0x01", USDC_ADDRESS, 500, True), FakeGammaFarm("0x02", LUSD_ADDRESS, 3000, False))
+    for (gamma_farm, path) in [(usdc_farm, [WETH_ADDRESS, 500, USDC_ADDRESS]), (lusd_farm, WETH_LUSD_PATH)]:
+        expected_probability = watcher.estimate_trade_data_collision_probability(EpochTradeHelper.encode_trade_data(path))
+        assert watcher.estimate_trade_data_collision_probability(b'', gamma_farm) == pytest.approx(expected_probability)
+        # (busy default pools count, not only LQTY/WETH and WETH/MAL pools):
+        assert watcher.estimate_trade_data_collision_probability(b'', gamma_farm) > 1 - (1 - 1 / 6) ** 2
+    # Defaults are read once per farm:
+    assert (usdc_farm.reads, lusd_farm.reads) == (3, 3)
+
+
+def test_pick_quiet_path():
+    (watcher, _) = build_watcher({number: [WETH_LUSD_3000_POOL] for number in range(1, 5)})
+    watcher.on_new_block(SimpleNamespace(number=4))
+    options = [WETH_LUSD_PATH, WETH_USDC_LUSD_PATH, WETH_DAI_LUSD_PATH]
+    # Busy pool of the best path is avoided if a quiet path is almost as good:
+    trade_helper = build_trade_helper(watcher, [(WETH_LUSD_PATH, 10000), (WETH_USDC_LUSD_PATH, 9995), (WETH_DAI_LUSD_PATH, 9990)])
+    assert trade_helper._pick_quiet_path(1, options) == (WETH_USDC_LUSD_PATH, 9995)
+    # ...but not if the quiet path is much worse:
+    trade_helper = build_trade_helper(watcher, [(WETH_LUSD_PATH, 10000), (WETH_USDC_LUSD_PATH, 9900), (WETH_DAI_LUSD_PATH, 9800)])
+    assert trade_helper._pick_quiet_path(1, options) == (WETH_LUSD_PATH, 10000)
@@ -0,0 +1,59 @@
+from web3.exceptions import ContractLogicError
+
+from preflight import (
+    PREFLIGHT_ABORT, PREFLIGHT_OK, PREFLIGHT_REBUILD_TRADE_DATA, PREFLIGHT_RETRY_NEXT_BLOCK,
+    classify_revert_reason, parse_error_message, simulate_tx,
+)
+
+import pytest
+
+
+class FakeEth:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def call(self, tx, block_identifier):
+        self.calls.append((tx, block_identifier))
+        if self.error is not None:
+            raise self.error
+        return b''
+
+
+class FakeW3:
+    def __init__(self, error=None):
+        self.eth = FakeEth(error)
+
+
+@pytest.mark.parametrize("error_message,expected_action", [
+    ("execution reverted: GammaFarm: frontrun protection", PREFLIGHT_RETRY_NEXT_BLOCK),
+    ("execution reverted: Too little received", PREFLIGHT_REBUILD_TRADE_DATA),
+    ("execution reverted: Exchange resulted in fewer coins than expected", PREFLIGHT_REBUILD_TRADE_DATA),
+    ("execution reverted: GammaFarm: invalid trade data", PREFLIGHT_REBUILD_TRADE_DATA),
+    ("execution reverted: Ownable: caller is not the owner", PREFLIGHT_ABORT),
+    (None, PREFLIGHT_ABORT),
+])
+def test_classify_revert_reason(error_message, expected_action):
+    assert classify_revert_reason(error_message) == expected_action
+
+
+def test_parse_error_message():
+    assert parse_error_message(ContractLogicError("execution reverted: frontrun protection")) == "execution reverted: frontrun protection"
+    assert parse_error_message(ValueError("insufficient funds")) == "insufficient funds"
+    assert parse_error_message(ValueError({'code': -32000, 'message': "execution reverted: received too little"})) == \
+        "execution reverted: received too little"
+    assert parse_error_message(ValueError("a", "b")) is None
+    assert parse_error_message(TimeoutError("timeout")) is None
+
+
+def test_simulate_tx():
+    tx = {'from': "0xowner", 'to': "0xfarm", 'data': "0x1234", 'gas': 100000, 'nonce': 5, 'maxFeePerGas': 1}
+    w3 = FakeW3()
+    assert simulate_tx(w3, tx) == (PREFLIGHT_OK, None)
+    # Only call fields are sent (fees and nonce don't matter for eth_call):
+    assert w3.eth.calls == [({'from': "0xowner", 'to': "0xfarm", 'data': "0x1234", 'gas': 100000}, 'pending')]
+    error = ValueError({'code': 3, 'message': "execution reverted: GammaFarm: frontrun protection"})
+    assert simulate_tx(FakeW3(error), tx, 'latest') == (PREFLIGHT_RETRY_NEXT_BLOCK, "execution reverted: GammaFarm: frontrun protection")
+    # Errors other than reverts are not caught:
+    with pytest.raises(TimeoutError):
+        simulate_tx(FakeW3(TimeoutError()), tx)
@@ -0,0 +1,83 @@
+import requests
+import time
+
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from replay import CallStore, ReplayServer, get_replay_api_url, record_web3
+
+import pytest
+
+
+class FakeProvider(JSONBaseProvider):
+    def __init__(self):
+        super().__init__()
+        self.block_number = 100
+
+    def make_request(self, method, params):
+        if method == 'eth_blockNumber':
+            self.block_number += 1
+            return {'jsonrpc': '2.0', 'id': 1, 'result': hex(self.block_number)}
+        if method == 'eth_chainId':
+            return {'jsonrpc': '2.0', 'id': 1, 'result': '0x1'}
+        if method == 'eth_getBalance':
+            return {'jsonrpc': '2.0', 'id': 1, 'result': hex(10**18)}
+        return {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32601, 'message': 'method not found'}}
+
+    def isConnected(self):
+        return True
+
+
+ADDRESS = "0x5Dc58f812b2e244DABA2fabd33f399cD699D7Ddc"
+
+
+@pytest.fixture
+def recorded_store(tmp_path):
+    store = CallStore()
+    w3 = Web3(FakeProvider())
+    record_web3(w3, store, "main")
+    assert [w3.eth.block_number, w3.eth.block_number] == [101, 102]
+    assert w3.eth.get_balance(ADDRESS) == 10**18
+    store.add_api("https://api.coingecko.com/api/v3/simple/price?vs_currencies=usd&ids=liquity-usd", '{"liquity-usd":{"usd":1.01}}')
+    store.save(tmp_path / "calls.json.gz")
+    yield CallStore.load(tmp_path / "calls.json.gz")
+
+
+@pytest.fixture
+def replay_server(recorded_store):
+    replay_server = ReplayServer(recorded_store, latency_ms=20, jitter_ms=5, seed=1).start()
+    yield replay_server
+    replay_server.stop()
+
+
+def test_replays_rpc_calls_in_recorded_order(replay_server):
+    w3 = Web3(Web3.HTTPProvider(replay_server.get_rpc_url("main")))
+    assert w3.eth.block_number == 101
+    assert w3.eth.block_number == 102
+    assert w3.eth.block_number == 102  # last response is repeated
+    assert w3.eth.get_balance(ADDRESS) == 10**18
+    replay_server.server.store.rewind()
+    assert w3.eth.block_number == 101
+    assert replay_server.server.store.served[('rpc', 'eth_blockNumber')] == 4
+
+
+def test_reports_calls_missing_from_recording(replay_server):
+    w3 = Web3(Web3.HTTPProvider(replay_server.get_rpc_url("main")))
+    with pytest.raises(ValueError):
+        w3.eth.get_transaction_count(ADDRESS)
+    assert replay_server.server.store.misses[('rpc', 'eth_getTransactionCount')] == 1
+
+
+def test_replays_price_api_calls(replay_server):
+    url = get_replay_api_url("https://api.coingecko.com/api/v3/simple/price", replay_server.url)
+    r = requests.get(url, {'ids': 'liquity-usd', 'vs_currencies': 'usd'})
+    assert r.json() == {'liquity-usd': {'usd': 1.01}}
+    assert requests.get(url, {'ids': 'ethereum', 'vs_currencies': 'usd'}).status_code == 404
+
+
+def test_injects_latency(replay_server):
+    w3 = Web3(Web3.HTTPProvider(replay_server.get_rpc_url("main")))
+    start_ts = time.perf_counter()
+    for _ in range(5):
+        w3.eth.get_balance(ADDRESS)
+    assert time.perf_counter() - start_ts >= 5 * 0.015
@@ -0,0 +1,110 @@
+from rpc_metrics import (
+    HISTOGRAM_SUB_BUCKET_COUNT, LatencyHistogram, RpcMetrics, build_rpc_metrics_middleware, format_metrics_summary,
+    get_call_label,
+)
+
+import pytest
+
+CALL_DATA = "0x70a08231" + "00" * 32
+
+
+def build_histogram(values):
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    return histogram
+
+
+def test_histogram_bucket_boundaries():
+    # Small values have buckets of their own:
+    for value in range(2 * HISTOGRAM_SUB_BUCKET_COUNT):
+        assert LatencyHistogram._bucket_index(value) == value
+    # Larger ones share buckets, which cover consecutive ranges of ~3% relative width:
+    assert LatencyHistogram._bucket_index(64) == LatencyHistogram._bucket_index(65) != LatencyHistogram._bucket_index(66)
+    assert LatencyHistogram._bucket_max_value(LatencyHistogram._bucket_index(127)) == 127
+    assert LatencyHistogram._bucket_max_value(LatencyHistogram._bucket_index(128)) == 131
+    for value in range(1, 100_000):
+        index = LatencyHistogram._bucket_index(value)
+        assert LatencyHistogram._bucket_max_value(index - 1) < value <= LatencyHistogram._bucket_max_value(index)
+        assert LatencyHistogram._bucket_max_value(index) - value <= value / HISTOGRAM_SUB_BUCKET_COUNT
+
+
+def test_histogram_percentiles():
+    assert LatencyHistogram().get_percentile(50) is None
+    histogram = build_histogram(range(1, 101))
+    assert (histogram.count, histogram.min, histogram.max, histogram.get_mean()) == (100, 1, 100, 50.5)
+    # Exact below 64, upper bound of the bucket (capped by maximum) above:
+    assert [histogram.get_percentile(p) for p in [1, 50, 90, 99, 100]] == [1, 50, 91, 99, 100]
+    # Negative and fractional values are recorded as integers:
+    assert build_histogram([-5, 2.7]).counts == {0: 1, 2: 1}
+
+
+def test_histogram_merge():
+    (first, second) = (build_histogram([5, 1000, 70]), build_histogram([3, 100_000]))
+    first.merge(second)
+    expected = build_histogram([5, 1000, 70, 3, 100_000])
+    assert (first.counts, first.count, first.total, first.min, first.max) == \
+        (expected.counts, expected.count, expected.total, expected.min, expected.max)
+    # Empty histograms are neutral:
+    first.merge(LatencyHistogram())
+    assert (first.count, first.min, first.max) == (5, 3, 100_000)
+    empty = LatencyHistogram()
+    empty.merge(second)
+    assert (empty.count, empty.min, empty.max) == (2, 3, 100_000)
+
+
+def test_rpc_metrics_iterations_and_totals():
+    metrics = RpcMetrics()
+    metrics.record("main", "eth_blockNumber", 1000, 10, 20)
+    metrics.record("main", "eth_blockNumber", 3000, 10, 20, "Timeout")
+    iteration = metrics.finish_iteration()
+    assert list(iteration) == [("main", "eth_blockNumber")]
+    # (p50 is the upper bound of the bucket 1000us falls into)
+    assert iteration[("main", "eth_blockNumber")].to_dict() == {
+        'count': 2, 'errors': {"Timeout": 1},
+        'latency_ms': {'mean': 2.0, 'min': 1.0, 'max': 3.0, 'p50': 1.007, 'p90': 3.0, 'p99': 3.0},
+        'request_bytes': 20, 'response_bytes': 40,
+    }
+    metrics.record("main", "eth_blockNumber", 2000, 10, 20)
+    metrics.record("backup", "eth_call", 50_000, 100, 200)
+    assert metrics.finish_iteration()[("main", "eth_blockNumber")].latency_us.count == 1
+    # Totals include both finished and current iteration:
+    metrics.record("backup", "eth_call", 10_000, 100, 200)
+    assert [(entry['endpoint'], entry['call'], entry['count']) for entry in metrics.to_dict()] == \
+        [("backup", "eth_call", 2), ("main", "eth_blockNumber", 3)]
+    # Summary puts calls with the most time spent first:
+    lines = format_metrics_summary(metrics.get_total())
+    assert lines[0].startswith("[backup] eth_call: count=2, total=60.0ms")
+    assert lines[1].endswith("errors={'Timeout': 1}")
+
+
+def test_call_label():
+    assert get_call_label("eth_call", [{'to': "0x01", 'data': CALL_DATA}, "latest"]) == "eth_call:0x70a08231"
+    assert get_call_label("eth_estimateGas", [{'input': CALL_DATA}]) == "eth_estimateGas:0x70a08231"
+    assert get_call_label("eth_call", [{'to': "0x01"}]) == "eth_call"
+    assert get_call_label("eth_getBalance", ["0x01", "latest"]) == "eth_getBalance"
+
+
+def test_middleware_records_calls_and_errors():
+    responses = {
+        'eth_blockNumber': {'jsonrpc': "2.0", 'id': 1, 'result': "0x10"},
+        'eth_call': {'jsonrpc': "2.0", 'id': 2, 'error': {'code': -32000, 'message': "execution reverted"}},
+    }
+    def make_request(method, params):
+        if method not in responses:
+            raise TimeoutError(method)
+        return responses[method]
+    metrics = RpcMetrics()
+    middleware = build_rpc_metrics_middleware(metrics, "main")(make_request, None)
+    assert middleware("eth_blockNumber", []) == responses['eth_blockNumber']
+    assert middleware("eth_call", [{'data': CALL_DATA}, "latest"]) == responses['eth_call']
+    with pytest.raises(TimeoutError):
+        middleware("eth_getLogs", [{}])
+    calls = metrics.finish_iteration()
+    assert sorted(calls) == [("main", "eth_blockNumber"), ("main", "eth_call:0x70a08231"), ("main", "eth_getLogs")]
+    assert calls[("main", "eth_blockNumber")].errors == {}
+    assert calls[("main", "eth_blockNumber")].response_bytes > 0
+    assert calls[("main", "eth_call:0x70a08231")].errors == {"rpc_error:-32000": 1}
+    assert calls[("main", "eth_getLogs")].errors == {"TimeoutError": 1}
+    assert calls[("main", "eth_getLogs")].response_bytes == 0
+    assert calls[("main", "eth_getLogs")].request_bytes == len("[{}]")
@@ -0,0 +1,116 @@
+import json
+import threading
+
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+import tracing
+from tracing import Tracer, trace_web3
+
+import pytest
+
+
+class FakeTime:
+    def __init__(self, ts=1000.0):
+        self.ts = ts
+
+    def time(self):
+        return self.ts
+
+
+class FakeProvider(JSONBaseProvider):
+    def __init__(self, fake_time):
+        super().__init__()
+        self.fake_time = fake_time
+
+    def make_request(self, method, params):
+        self.fake_time.ts += 0.25
+        return {'jsonrpc': '2.0', 'id': 1, 'result': '0x10'}
+
+    def isConnected(self):
+        return True
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    fake_time = FakeTime()
+    monkeypatch.setattr(tracing, "time", fake_time)
+    return fake_time
+
+
+def test_sampling_rates():
+    never = Tracer(sample_rate=0.0)
+    for _ in range(100):
+        assert not never.start_trace()
+        with never.span("ignored"):
+            pass
+        assert not never.finish_trace()
+    assert list(never.traces) == []
+    # Forced trace is sampled regardless of rate:
+    assert never.start_trace(force=True)
+    assert never.finish_trace()
+    always = Tracer(sample_rate=1.0, max_traces=3)
+    for _ in range(5):
+        assert always.start_trace()
+        with always.span("kept"):
+            pass
+        assert always.finish_trace()
+    # Only the last "max_traces" traces are kept:
+    assert [len(events) for events in always.traces] == [1, 1, 1]
+
+
+def test_nested_span_timing(fake_time):
+    tracer = Tracer()
+    tracer.start_trace(force=True)
+    with tracer.span("outer", farm="0x01"):
+        fake_time.ts += 0.5
+        with tracer.span("inner", category="rpc"):
+            fake_time.ts += 0.25
+        fake_time.ts += 0.125
+        with pytest.raises(ValueError):
+            with tracer.span("failing"):
+                raise ValueError()
+    tracer.finish_trace()
+    # Spans are added as they finish:
+    (inner, failing, outer) = tracer.traces[0]
+    assert (outer['name'], outer['ts'], outer['dur'], outer['args']) == ("outer", 1000_000_000, 875_000, {'farm': "0x01"})
+    assert (inner['name'], inner['cat'], inner['ts'], inner['dur']) == ("inner", "rpc", 1000_500_000, 250_000)
+    assert outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+    assert (failing['dur'], failing['args']) == (0, {'error': "ValueError"})
+
+
+def test_export_chrome_trace_events(fake_time, tmp_path):
+    tracer = Tracer()
+    for name in ["first", "second"]:
+        tracer.start_trace(force=True)
+        with tracer.span(name):
+            fake_time.ts += 0.5
+        tracer.finish_trace()
+    path = str(tmp_path / "trace.json")
+    tracer.export(path)
+    with open(path) as f:
+        exported = json.load(f)
+    assert exported['displayTimeUnit'] == 'ms'
+    assert exported['traceEvents'] == [event for events in tracer.traces for event in events]
+    for (event, name) in zip(exported['traceEvents'], ["first", "second"]):
+        assert (event['name'], event['ph'], event['dur']) == (name, 'X', 500_000)
+        assert (event['pid'], event['tid']) == (tracer.pid, threading.get_ident())
+        assert isinstance(event['ts'], int)
+    # Exported again, file round-trips to the same events:
+    tracer.export(path)
+    with open(path) as f:
+        assert json.load(f) == exported
+
+
+def test_trace_web3(fake_time):
+    tracer = Tracer()
+    w3 = Web3(FakeProvider(fake_time))
+    trace_web3(w3, "main", tracer)
+    # Requests outside of sampled traces are not recorded:
+    assert w3.eth.block_number == 16
+    tracer.start_trace(force=True)
+    assert w3.eth.block_number == 16
+    tracer.finish_trace()
+    ([event],) = tracer.traces
+    assert (event['name'], event['cat'], event['dur'], event['args']) == \
+        ("eth_blockNumber", "rpc", 250_000, {'endpoint': "main"})
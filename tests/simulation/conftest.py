@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# Simulator modules import each other as top-level modules when "scripts" package (brownie) is not available:
+# (and shared fixed-point math from "bots" directory)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "scripts", "simulation"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "bots"))
+
+
+# Simulator tests don't use chain, so override chain isolation fixture from tests/conftest.py:
+@pytest.fixture(autouse=True)
+def isolation():
+    pass
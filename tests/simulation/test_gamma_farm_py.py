@@ -0,0 +1,142 @@
+import math
+import random
+
+from bench_reset_epochs import simulate_resets
+from gamma_farm_py import ACCOUNT_BALANCES_COLUMNS, AccountStore, EpochSnapshotStore, GammaFarmPythonSimulator, E18
+from structs import Event, EventType, EpochData
+
+import pytest
+
+DAY_SECS = 24 * 60 * 60
+(Q, T, R, F) = (6000 * E18, 4 * 365 * DAY_SECS, 6000 * E18 // (4 * 365 * DAY_SECS), E18)
+
+
+# Simulates random account actions over "num_epochs" epochs (with an emergency on the way)
+def simulate_random_events(sim, num_users, num_epochs, seed):
+    rng = random.Random(seed)
+    ts = 0
+    for epoch in range(num_epochs):
+        for _ in range(num_users):
+            ts += rng.randint(1, 60)
+            user = f"user{rng.randrange(num_users)}"
+            (lusd_available, lusd_staked, mal_rewards, _, should_unstake) = sim.getAccountBalances(user)
+            r = rng.random()
+            if r < 0.5:
+                sim.simulate_event(Event(ts, EventType.DEPOSIT, amount=rng.randint(E18, 1000 * E18), user=user))
+            elif r < 0.7 and lusd_staked != 0 and not should_unstake and not sim.isEmergencyState:
+                sim.simulate_event(Event(ts, EventType.UNSTAKE, user=user))
+            elif r < 0.85 and lusd_available + (lusd_staked if sim.isEmergencyState else 0) != 0:
+                sim.simulate_event(Event(ts, EventType.WITHDRAW, user=user))
+            elif mal_rewards != 0:
+                sim.simulate_event(Event(ts, EventType.CLAIM, user=user))
+        ts += DAY_SECS
+        staked = sim.lusdStabilityPool.getCompoundedLUSDDeposit()
+        if epoch == num_epochs // 3:
+            sim.simulate_event(Event(ts, EventType.EMERGENCY_WITHDRAW, data=EpochData(reward=rng.randint(0, 10 * E18), loss=staked // 10)))
+        elif sim.isEmergencyState:
+            sim.simulate_event(Event(ts, EventType.EMERGENCY_RECOVER))
+        else:
+            loss = rng.randint(0, staked // 20) if rng.random() < 0.3 else 0
+            sim.simulate_event(Event(ts, EventType.NEW_EPOCH, data=EpochData(reward=rng.randint(0, 10 * E18), loss=loss)))
+    return sim
+
+
+@pytest.fixture(scope="module")
+def sim():
+    return simulate_random_events(GammaFarmPythonSimulator(Q, T, R, F), num_users=200, num_epochs=12, seed=3)
+
+
+def test_parallel_gather_is_identical_to_serial(sim):
+    serial_state = sim.gather_state()
+    parallel_state = sim.gather_state(processes=3, chunk_size=16)
+    for name in ['lusdAvailable', 'lusdStaked', 'malRewards', 'userLusdIn', 'userLusdOut', 'userMalOut']:
+        assert dict(getattr(parallel_state, name)) == dict(getattr(serial_state, name))
+    assert (parallel_state.totalLusd, parallel_state.totalLusdStaked, parallel_state.S2) == \
+        (serial_state.totalLusd, serial_state.totalLusdStaked, serial_state.S2)
+    assert sum(serial_state.lusdStaked.values()) != 0
+
+
+def test_account_store_round_trip(sim):
+    num_accounts = len(sim.accounts)
+    assert sim.getAccountBalances("unknown user") == (0, 0, 0, 0, False)
+    assert sim.accounts.get("unknown user", 'lusdIn') == 0 and "unknown user" not in sim.accounts
+    assert len(sim.accounts) == num_accounts
+    (accounts, columns) = sim.accounts.export_columns()
+    store = AccountStore()
+    store.import_columns(accounts[::2], {name: values[::2] for (name, values) in columns.items()})
+    store.import_columns(accounts, columns)
+    assert store.export_columns() != (accounts, columns)  # (ids follow import order)
+    assert all(store.get_balances_tuple(a) == sim.accounts.get_balances_tuple(a) for a in accounts)
+    assert all(store.get(a, 'malOut') == sim.accounts.get(a, 'malOut') for a in accounts)
+    store.import_columns(accounts[:1], {'lusdIn': [7]})
+    assert store.get(accounts[0], 'lusdIn') == 7 and store.get(accounts[0], 'malOut') == columns['malOut'][0]
+
+
+def test_account_debug_columns_are_optional(sim):
+    lean_sim = simulate_random_events(GammaFarmPythonSimulator(Q, T, R, F, account_debug_columns=False), num_users=200, num_epochs=12, seed=3)
+    assert set(lean_sim.accounts.columns) == set(lean_sim.accounts.names) == set(ACCOUNT_BALANCES_COLUMNS)
+    (state, lean_state) = (sim.gather_state(), lean_sim.gather_state())
+    assert dict(lean_state.userLusdIn) == {user: 0 for user in state.users} and lean_state.users == state.users
+    for name in ['totalUserLusdIn', 'totalUserLusdOut', 'totalMalOut', 'farmLusdBalance', 'farmMalBalance', 'totalLusd', 'S2']:
+        assert getattr(lean_state, name) == getattr(state, name)
+    assert dict(lean_state.malRewards) == dict(state.malRewards) and state.totalMalOut != 0
+
+
+# Keeps every epoch snapshot (reference for compaction)
+class UncompactedSnapshotStore(EpochSnapshotStore):
+    def _compact(self, epoch):
+        pass
+
+
+def test_epoch_snapshots_are_compacted():
+    sim = simulate_random_events(GammaFarmPythonSimulator(Q, T, R, F), num_users=10, num_epochs=400, seed=5)
+    reference_sim = GammaFarmPythonSimulator(Q, T, R, F)
+    reference_sim.epochSnapshots = UncompactedSnapshotStore(reference_sim.epochSnapshots[0])
+    simulate_random_events(reference_sim, num_users=10, num_epochs=400, seed=5)
+    assert vars(sim.gather_state()) == vars(reference_sim.gather_state())
+    snapshots = sim.epochSnapshots
+    assert len(reference_sim.epochSnapshots) == sim.epoch + 1 > 300
+    assert len(snapshots) <= 2 * len(snapshots.refCounts) + len(snapshots.pinned) + 1
+    assert len(snapshots.P) <= len(snapshots) + len(snapshots.freeSlots)
+    assert sum(snapshots.refCounts.values()) == sum(1 for a in sim.accounts.accounts if sim.accounts.get_balances_tuple(a) != (0, 0, 0, 0))
+
+
+class CountingList(list):
+    lookups = 0
+
+    def __getitem__(self, index):
+        self.lookups += 1
+        return super().__getitem__(index)
+
+
+def test_reset_epoch_index():
+    sim = simulate_resets(num_resets=3000)
+    assert len(sim.resetEpochs) == 3000 and sim.epochSnapshots[sim.lastResetEpoch].lusdProfitFactorCumP == E18
+    # Reset epochs stand in for GammaFarm's previousResetEpoch mapping:
+    previous_reset_epoch = dict(zip(sim.resetEpochs, [0] + sim.resetEpochs[:-1]))
+    for epoch in range(sim.epoch + 2):
+        assert sim._hasPreviousResetEpoch(epoch) == (previous_reset_epoch.get(epoch, 0) != 0)
+    (lusd_available, lusd_staked, mal_rewards, _, _) = sim.getAccountBalances("stale")
+    assert (lusd_available, lusd_staked) == (0, 0) and mal_rewards != 0
+    # Stale account read doesn't walk reset epochs, it only bisects them (twice at most, benchmark: bench_reset_epochs.py):
+    sim.resetEpochs = CountingList(sim.resetEpochs)
+    sim.getAccountBalances("stale")
+    assert 0 < sim.resetEpochs.lookups <= 2 * (math.ceil(math.log2(len(sim.resetEpochs))) + 1)
+
+
+def test_simulate_block_is_identical_to_sequential():
+    rng = random.Random(7)
+    (events, ts) = ([], 0)
+    for block in range(200):
+        ts += rng.choice([12, 12 * 300, DAY_SECS])
+        events += [Event(ts, EventType.DEPOSIT, amount=rng.randint(E18, 100 * E18), user=f"user{rng.randrange(50)}") for _ in range(20)]
+        if block % 5 == 4:
+            events.append(Event(ts, EventType.NEW_EPOCH, data=EpochData(reward=rng.randint(0, E18))))
+    decaying_F = 999 * E18 // 1000
+    block_state = GammaFarmPythonSimulator(Q, T, R, decaying_F).simulate_events(events)
+    reference_sim = GammaFarmPythonSimulator(Q, T, R, decaying_F)
+    for e in events:
+        reference_sim.lastMalRewardUpdateTimestamp = None  # (updates MAL cumulative sum on every event)
+        reference_sim.simulate_event(e)
+    assert vars(block_state) == vars(reference_sim.gather_state())
+    assert block_state.S2 != 0 and block_state.totalMalOut == 0